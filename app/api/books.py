@@ -1,78 +1,106 @@
-from fastapi import APIRouter, Depends, status, Query, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, Query, Request, UploadFile, File
 
 from app.schemas.book import BookCreate, BookUpdate, BookResponse
 
-from app.core.database import get_db
-from app.core.rate_limiter import limiter
-from app.core.response import success_response
-from app.core.dependencies import require_roles
+from app.core.rate_limiter import limiter, catalog_quota
+from app.core.response import success_response, list_response
 from app.core.roles import Roles
+from app.core.book_import import detect_format
+from app.core.etag import conditional_headers, catalog_etag, book_etag
 
-from app.controllers.book_controller import(
-    create_book_admin,
-    search_books,
-    get_specific_book,
-    update_book_by_id_admin,
-    delete_book_admin
-)
+def build_router(backend):
+    controllers = backend.controllers("book_controller")
+    router = APIRouter(prefix="/books", tags=["Books"])
 
-router = APIRouter(prefix="/books", tags=["Books"])
+    # the versions are read once per request (FastAPI caches a dependency's
+    # result) and make both the ETag and the catalog cache key
+    async def catalog_version(db = Depends(backend.get_db)):
+        return await controllers.get_catalog_version(db)
 
-@router.post("/", 
-            response_model=BookResponse, 
-            status_code=status.HTTP_201_CREATED
-            )
-def create_book(book: BookCreate, db: Session = Depends(get_db), user= Depends(require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
-    new_book = create_book_admin(book = book, db = db)
-    return success_response(
-        data = BookResponse.model_validate(new_book).model_dump(mode="json")
-    )
-
-
-@router.get("/", response_model=list[BookResponse], 
-            status_code=status.HTTP_200_OK)
-@limiter.limit("5/minute")
-def get_books(
-    request: Request
-    ,search: str | None = Query(None, description = "Search a book with book name or ISBN")
-    ,in_stock: bool | None = Query(None, description = "Filter books by stock > 0")
-    ,sort_by: str = Query("name", description="Sort by name or stock") 
-    ,order: str = Query("asc", description="asc or desc")
-    ,page: int = Query(1, ge=1)
-    ,limit: int = Query(10, ge=1, le=100)
-    ,db: Session = Depends(get_db)
-    ):    
-    books = search_books(db = db, search = search, in_stock = in_stock, sort_by = sort_by, order = order, page = page, limit = limit)
-    return success_response(
-        data = 
-        [ BookResponse.model_validate(i).model_dump(mode="json") for i in books ]
-    )
-
-@router.get("/{book_id}",response_model=BookResponse, 
-            status_code = status.HTTP_200_OK)
-@limiter.limit("5/minute")
-def get_book_by_id(request: Request, bookid : int, db: Session = Depends(get_db)):
-    book = get_specific_book(bookid = bookid, db = db)
-    return success_response(
-            data = BookResponse.model_validate(book).model_dump(mode="json")
+    async def book_version(bookid: int, db = Depends(backend.get_db)):
+        return await controllers.get_book_version(bookid = bookid, db = db)
+
+    # conditional GET: the ETag is worked out before the rate limiter and the
+    # route run, a matching If-None-Match ends the request with a 304 right here
+    async def books_cache_headers(request: Request, version: int = Depends(catalog_version)):
+        return conditional_headers(request, catalog_etag(version, request), "books")
+
+    async def book_cache_headers(request: Request, bookid: int, version: int | None = Depends(book_version)):
+        if version is None:
+            return None
+        return conditional_headers(request, book_etag(bookid, version), "book")
+
+    @router.post("/",
+                response_model=BookResponse,
+                status_code=status.HTTP_201_CREATED
+                )
+    async def create_book(book: BookCreate, db = Depends(backend.get_db), user= Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
+        new_book = await controllers.create_book_admin(book = book, db = db)
+        return success_response(
+            data = BookResponse.model_validate(new_book).model_dump(mode="json")
         )
-    
-@router.put("/{book_id}", 
-            response_model=BookUpdate )
-def update_book_by_id(bookid : int,
-                      bookobj : BookUpdate,
-                      db: Session = Depends(get_db),
-                      user= Depends(require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
-    book = update_book_by_id_admin(bookid = bookid, bookobj = bookobj, db = db)
-    
-    return success_response(
-            data = BookResponse.model_validate(book).model_dump(mode="json")
+
+
+    @router.post("/import", status_code=status.HTTP_200_OK)
+    async def import_books_bulk(file: UploadFile = File(..., description = "CSV with name,isbn,stock columns or NDJSON"),
+                                format: str | None = Query(None, pattern="^(csv|ndjson)$", description="csv or ndjson, taken from the file name when omitted"),
+                                db = Depends(backend.get_db),
+                                user= Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
+        report = await controllers.import_books_admin(file = file.file, data_format = format or detect_format(file.filename), db = db)
+        return success_response(data = report)
+
+    @router.get("/", response_model=list[BookResponse],
+                status_code=status.HTTP_200_OK)
+    @limiter.limit(catalog_quota)
+    async def get_books(
+        request: Request
+        ,search: str | None = Query(None, description = "Search a book with book name or ISBN")
+        ,in_stock: bool | None = Query(None, description = "Filter books by stock > 0")
+        ,sort_by: str | None = Query(None, description="Sort by relevance, name or stock (relevance when searching, name otherwise)")
+        ,order: str = Query("asc", description="asc or desc")
+        ,page: int = Query(1, ge=1)
+        ,limit: int = Query(10, ge=1, le=100)
+        ,cursor: str | None = Query(None, description="Opaque cursor from a previous next_cursor, overrides page")
+        ,db = Depends(backend.get_db)
+        ,cache_headers: dict = Depends(books_cache_headers)
+        ,version: int = Depends(catalog_version)
+        ):
+        books, next_cursor = await controllers.search_books_cached(db = db, search = search, in_stock = in_stock, sort_by = sort_by, order = order, page = page, limit = limit, cursor = cursor, version = version)
+        return list_response(
+            BookResponse, books,
+            next_cursor = next_cursor,
+            headers = cache_headers
         )
 
-@router.delete("/{book_id}")
-def delete_book(bookid : int,
-                db: Session = Depends(get_db),
-                user= Depends(require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
-    delete_book_admin(bookid = bookid, db = db)
-    return success_response(message="Book Deleted!")
+    @router.get("/{book_id}",response_model=BookResponse,
+                status_code = status.HTTP_200_OK)
+    @limiter.limit(catalog_quota)
+    async def get_book_by_id(request: Request, bookid : int, db = Depends(backend.get_db),
+                             cache_headers: dict | None = Depends(book_cache_headers),
+                             version: int | None = Depends(book_version)):
+        book = await controllers.get_specific_book_cached(bookid = bookid, db = db, version = version)
+        return success_response(
+                data = BookResponse.model_validate(book).model_dump(mode="json"),
+                headers = cache_headers
+            )
+
+    @router.put("/{book_id}",
+                response_model=BookUpdate )
+    async def update_book_by_id(bookid : int,
+                                bookobj : BookUpdate,
+                                db = Depends(backend.get_db),
+                                user= Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
+        book = await controllers.update_book_by_id_admin(bookid = bookid, bookobj = bookobj, db = db)
+
+        return success_response(
+                data = BookResponse.model_validate(book).model_dump(mode="json")
+            )
+
+    @router.delete("/{book_id}")
+    async def delete_book(bookid : int,
+                          db = Depends(backend.get_db),
+                          user= Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
+        await controllers.delete_book_admin(bookid = bookid, db = db)
+        return success_response(message="Book Deleted!")
+
+    return router
@@ -1,66 +1,93 @@
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, Query
 from typing import List
 
-from app.schemas.loan import LoanCreate, LoanResponse
+from app.schemas.loan import LoanCreate, LoanResponse, LoanBatchCreate, LoanBatchReturn, LoanBatchItem, OverdueLoanResponse
 
-from app.controllers.auth_controller import get_current_user
+from app.core.roles import Roles
+from app.core.response import success_response, list_response
 
-from app.core.database import get_db
-from app.core.dependencies import require_roles
-from app.core.roles import Roles 
-from app.core.response import success_response
+from app.core.principal_cache import Principal
 
-from app.models.user import User
+def build_router(backend):
+    controllers = backend.controllers("loan_controller")
+    router = APIRouter(prefix = '/loans', tags = ["Loans"])
 
-from app.controllers.loan_controller import (
-    borrow_book_user,
-    return_book_user,
-    active_loans_users,
-    my_loan_history_user,
-    user_loan_history_admin)
+    @router.post("/borrow",
+                 response_model= LoanResponse,
+                 status_code=status.HTTP_201_CREATED)
+    async def borrow_book(loan: LoanCreate,
+                    current_user: Principal = Depends(backend.get_current_user),
+                    db = Depends(backend.get_db)):
+        new_loan = await controllers.borrow_book_user(loan = loan, current_user = current_user, db = db )
+        return success_response(
+            data = LoanResponse.model_validate(new_loan).model_dump(mode="json")
+        )
 
-router = APIRouter(prefix = '/loans', tags = ["Loans"])
+    @router.post("return/{loan_id}", status_code= status.HTTP_200_OK)
+    async def return_book(loan_id : int,
+                    db = Depends(backend.get_db),
+                    current_user: Principal = Depends(backend.get_current_user)):
+        await controllers.return_book_user(loan_id= loan_id, db = db, current_user = current_user)
+        return success_response(message="Book return successfully!")
 
-@router.post("/borrow",
-             response_model= LoanResponse,
-             status_code=status.HTTP_201_CREATED)
-def borrow_book(loan: LoanCreate,
-                current_user: User = Depends(get_current_user),
-                db: Session = Depends(get_db)):
-    new_loan = borrow_book_user(loan = loan, current_user = current_user, db = db )
-    return success_response(
-        data = LoanResponse.model_validate(new_loan).model_dump(mode="json")
-    )
+    @router.post("/borrow/batch",
+                 response_model= List[LoanBatchItem],
+                 status_code=status.HTTP_200_OK)
+    async def borrow_books_batch(batch: LoanBatchCreate,
+                    current_user: Principal = Depends(backend.get_current_user),
+                    db = Depends(backend.get_db)):
+        results = await controllers.borrow_books_batch_user(batch = batch, current_user = current_user, db = db)
+        return list_response(LoanBatchItem, results)
 
-@router.post("return/{loan_id}", status_code= status.HTTP_200_OK)
-def return_book(loan_id : int,
-                db: Session = Depends(get_db),
-                current_user: User = Depends(get_current_user)):
-    return_book_user(loan_id= loan_id, db = db, current_user = current_user)
-    return success_response(message="Book return successfully!")
+    @router.post("/return/batch",
+                 response_model= List[LoanBatchItem],
+                 status_code=status.HTTP_200_OK)
+    async def return_books_batch(batch: LoanBatchReturn,
+                    db = Depends(backend.get_db),
+                    current_user: Principal = Depends(backend.get_current_user)):
+        results = await controllers.return_books_batch_user(batch = batch, db = db, current_user = current_user)
+        return list_response(LoanBatchItem, results)
 
-@router.get("/me", response_model=List[LoanResponse])
-def my_active_loans(db: Session = Depends(get_db),
-             current_user: User = Depends(get_current_user)):
-    activeLoanRecords = active_loans_users(db = db, current_user = current_user )
-    return success_response(
-        data = [ LoanResponse.model_validate(i).model_dump(mode="json") for i in activeLoanRecords]
-    )
+    @router.get("/me", response_model=List[LoanResponse])
+    async def my_active_loans(db = Depends(backend.get_db),
+                 current_user: Principal = Depends(backend.get_current_user)):
+        activeLoanRecords = await controllers.active_loans_users(db = db, current_user = current_user )
+        return list_response(LoanResponse, activeLoanRecords)
 
-@router.get("/history", response_model=List[LoanResponse])
-def my_loan_history(db: Session = Depends(get_db),
-             current_user: User = Depends(get_current_user)):
-    historyLoanRecords = my_loan_history_user(db = db, current_user = current_user)
-    return success_response(
-        data = [ LoanResponse.model_validate(i).model_dump(mode="json") for i in historyLoanRecords]
-    )
+    @router.get("/history", response_model=List[LoanResponse])
+    async def my_loan_history(limit: int = Query(50, ge=1, le=100),
+                 cursor: str | None = Query(None),
+                 db = Depends(backend.get_db),
+                 current_user: Principal = Depends(backend.get_current_user)):
+        historyLoanRecords, next_cursor = await controllers.my_loan_history_user(db = db, current_user = current_user, limit = limit, cursor = cursor)
+        return list_response(
+            LoanResponse, historyLoanRecords,
+            next_cursor = next_cursor
+        )
 
-@router.get("/user/{user_id}",
-            response_model=List[LoanResponse],
-            dependencies=[Depends(require_roles(Roles.ADMIN,Roles.LIBRARIAN))])
-def user_loan_history(user_id: int, db: Session = Depends(get_db) ):
-    userLoanHistory = user_loan_history_admin(user_id = user_id, db = db)
-    return success_response(
-        data = [ LoanResponse.model_validate(i).model_dump(mode="json") for i in userLoanHistory]
-    )
+    @router.get("/user/{user_id}",
+                response_model=List[LoanResponse],
+                dependencies=[Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))])
+    async def user_loan_history(user_id: int,
+                          limit: int = Query(50, ge=1, le=100),
+                          cursor: str | None = Query(None),
+                          db = Depends(backend.get_db) ):
+        userLoanHistory, next_cursor = await controllers.user_loan_history_admin(user_id = user_id, db = db, limit = limit, cursor = cursor)
+        return list_response(
+            LoanResponse, userLoanHistory,
+            next_cursor = next_cursor
+        )
+
+    @router.get("/overdue",
+                response_model=List[OverdueLoanResponse],
+                dependencies=[Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))])
+    async def overdue_loans(limit: int = Query(50, ge=1, le=100),
+                      cursor: str | None = Query(None),
+                      db = Depends(backend.get_db) ):
+        overdueLoans, next_cursor = await controllers.overdue_loans_admin(db = db, limit = limit, cursor = cursor)
+        return list_response(
+            OverdueLoanResponse, overdueLoans,
+            next_cursor = next_cursor
+        )
+
+    return router
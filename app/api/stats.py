@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List
+
+from app.schemas.stats import TopBookResponse, BookStatsResponse, DailyCirculation, CirculationSummary
+
+from app.core.roles import Roles
+from app.core.response import success_response, list_response
+
+def build_router(backend):
+    controllers = backend.controllers("stats_controller")
+
+    # circulation reports, served from the pre-aggregated tables
+    router = APIRouter(prefix = '/stats',
+                       tags = ["Stats"],
+                       dependencies = [Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))])
+
+    @router.get("/summary", response_model=CirculationSummary)
+    async def circulation_summary(db = Depends(backend.get_db)):
+        summary = await controllers.circulation_summary_admin(db = db)
+        return success_response(data = CirculationSummary.model_validate(summary).model_dump(mode="json"))
+
+    @router.get("/daily", response_model=List[DailyCirculation])
+    async def daily_circulation(days: int = Query(30, ge=1, le=366),
+                          db = Depends(backend.get_db)):
+        daily = await controllers.daily_circulation_admin(db = db, days = days)
+        return list_response(DailyCirculation, daily)
+
+    @router.get("/books/top", response_model=List[TopBookResponse])
+    async def top_books(limit: int = Query(10, ge=1, le=100),
+                  days: int | None = Query(None, ge=1, le=366),
+                  db = Depends(backend.get_db)):
+        topBooks = await controllers.top_books_admin(db = db, limit = limit, days = days)
+        return list_response(TopBookResponse, topBooks)
+
+    @router.get("/books/{book_id}", response_model=BookStatsResponse)
+    async def book_stats(book_id: int,
+                   days: int = Query(30, ge=1, le=366),
+                   db = Depends(backend.get_db)):
+        stats = await controllers.book_stats_admin(book_id = book_id, db = db, days = days)
+        return success_response(data = BookStatsResponse.model_validate(stats).model_dump(mode="json"))
+
+    return router
@@ -1,89 +1,105 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, Query
+from fastapi.responses import StreamingResponse
 from typing import List
 
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
-from app.controllers.auth_controller import get_current_user
+from app.schemas.audit_logs import AuditLogFilter, AuditLogResponse
 
-from app.models.user import User
+from app.core.principal_cache import Principal
 
 from app.core.roles import Roles
-from app.core.dependencies import require_roles
-from app.core.database import get_db
-from app.core.response import success_response
-
-from app.controllers.user_controller import (
-    get_audit_logs_admin, 
-    update_my_profile_user,
-    delete_profile_user,
-    create_user_admin,
-    get_all_users_admin,
-    get_user_by_id_admin,
-    update_user_by_id_admin,
-    delete_user_admin)
-
-router = APIRouter(prefix="/users", tags=["Users"])
-
-@router.get("/audit-logs")
-def get_audit_logs(
-    db: Session = Depends(get_db),
-    _ = Depends(require_roles(Roles.ADMIN))
-):
-    data = get_audit_logs_admin(db = db)
-    return success_response(data = jsonable_encoder(data))
-
-@router.get("/me",response_model=UserResponse) 
-def get_my_info(current_user: User = Depends(get_current_user)):
-    return success_response(data = UserResponse.model_validate(current_user).model_dump(mode="json") )
-
-@router.put("/me",response_model=UserResponse)
-def update_my_profile(userupdateobj: UserUpdate, db: Session = Depends(get_db), current_user:User =  Depends(get_current_user)):
-    user = update_my_profile_user(userupdateobj= userupdateobj,db = db, current_user = current_user)
-    return success_response(data = UserResponse.model_validate(user).model_dump(mode="json") )
-
-@router.delete("/me")
-def delete_profile(
-    db: Session = Depends(get_db),
-    current_user: User =Depends(get_current_user)
-):
-    delete_profile_user(db = db,current_user = current_user)
-    return success_response(message="Account deleted")
-
-@router.post("/", 
-             response_model=UserResponse, 
-             status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user),_= Depends(require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
-    user = create_user_admin(user = user ,db = db,current_user = current_user)
-    return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
-
-@router.get("/", 
-             response_model=List[UserResponse], 
-             status_code=status.HTTP_200_OK)
-def get_all_users(db: Session = Depends(get_db),_= Depends(require_roles(Roles.ADMIN))):
-    allUsers = get_all_users_admin(db = db)
-    return success_response(
-        data = [ UserResponse.model_validate(i).model_dump(mode="json") for i in allUsers]
-    )
-
-@router.get("/{userid}", 
-             response_model=UserResponse, 
-             status_code=status.HTTP_200_OK)
-def get_user_by_id(userid: int, db:Session = Depends(get_db),_= Depends(require_roles(Roles.ADMIN))):
-    user= get_user_by_id_admin(userid = userid,db = db)       
-    return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
-
-
-@router.put("/{userid}", response_model=UserResponse)
-def update_user_by_id(userid: int, 
-                      updateuserobj: UserUpdate, 
-                      db: Session = Depends(get_db), 
-                      current_user: User = Depends(get_current_user),
-                      _=Depends(require_roles(Roles.ADMIN))):
-    user = update_user_by_id_admin(userid = userid, updateuserobj = updateuserobj, db = db,current_user = current_user)
-    return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
-
-@router.delete("/{userid}")
-def delete_user(userid: int, db:Session = Depends(get_db), current_user: User = Depends(get_current_user),_=Depends(require_roles(Roles.ADMIN))):
-    delete_user_admin(userid = userid,db = db,current_user = current_user)
-    return success_response(message="User Deleted!")
+from app.core.response import success_response, list_response
+
+# owns its session and streams in either mode
+from app.controllers.user_controller import export_audit_logs_admin
+
+def build_router(backend):
+    controllers = backend.controllers("user_controller")
+    router = APIRouter(prefix="/users", tags=["Users"])
+
+    @router.get("/audit-logs")
+    async def get_audit_logs(
+        filters: AuditLogFilter = Depends(),
+        limit: int = Query(100, ge=1, le=500),
+        cursor: str | None = Query(None),
+        db = Depends(backend.get_db),
+        _ = Depends(backend.require_roles(Roles.ADMIN))
+    ):
+        logs, next_cursor = await controllers.get_audit_logs_admin(db = db, filters = filters, limit = limit, cursor = cursor)
+        return list_response(
+            AuditLogResponse, logs,
+            next_cursor = next_cursor
+        )
+
+    @router.get("/audit-logs/export")
+    async def export_audit_logs(
+        filters: AuditLogFilter = Depends(),
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        _ = Depends(backend.require_roles(Roles.ADMIN))
+    ):
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            export_audit_logs_admin(filters = filters, export_format = format),
+            media_type = media_type,
+            headers = {"Content-Disposition": f"attachment; filename=audit-logs.{format}"}
+        )
+
+    @router.get("/me",response_model=UserResponse)
+    async def get_my_info(current_user: Principal = Depends(backend.get_current_user)):
+        return success_response(data = UserResponse.model_validate(current_user).model_dump(mode="json") )
+
+    @router.put("/me",response_model=UserResponse)
+    async def update_my_profile(userupdateobj: UserUpdate, db = Depends(backend.get_db), current_user:Principal =  Depends(backend.get_current_user)):
+        user = await controllers.update_my_profile_user(userupdateobj= userupdateobj,db = db, current_user = current_user)
+        return success_response(data = UserResponse.model_validate(user).model_dump(mode="json") )
+
+    @router.delete("/me")
+    async def delete_profile(
+        db = Depends(backend.get_db),
+        current_user: Principal =Depends(backend.get_current_user)
+    ):
+        await controllers.delete_profile_user(db = db,current_user = current_user)
+        return success_response(message="Account deleted")
+
+    @router.post("/",
+                 response_model=UserResponse,
+                 status_code=status.HTTP_201_CREATED)
+    async def create_user(user: UserCreate, db = Depends(backend.get_db), current_user = Depends(backend.get_current_user),_= Depends(backend.require_roles(Roles.ADMIN,Roles.LIBRARIAN))):
+        user = await controllers.create_user_admin(user = user ,db = db,current_user = current_user)
+        return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
+
+    @router.get("/",
+                 response_model=List[UserResponse],
+                 status_code=status.HTTP_200_OK)
+    async def get_all_users(limit: int = Query(50, ge=1, le=100),
+                            cursor: str | None = Query(None),
+                            db = Depends(backend.get_db),_= Depends(backend.require_roles(Roles.ADMIN))):
+        allUsers, next_cursor = await controllers.get_all_users_admin(db = db, limit = limit, cursor = cursor)
+        return list_response(
+            UserResponse, allUsers,
+            next_cursor = next_cursor
+        )
+
+    @router.get("/{userid}",
+                 response_model=UserResponse,
+                 status_code=status.HTTP_200_OK)
+    async def get_user_by_id(userid: int, db = Depends(backend.get_db),_= Depends(backend.require_roles(Roles.ADMIN))):
+        user= await controllers.get_user_by_id_admin(userid = userid,db = db)
+        return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
+
+
+    @router.put("/{userid}", response_model=UserResponse)
+    async def update_user_by_id(userid: int,
+                                updateuserobj: UserUpdate,
+                                db = Depends(backend.get_db),
+                                current_user: Principal = Depends(backend.get_current_user),
+                                _=Depends(backend.require_roles(Roles.ADMIN))):
+        user = await controllers.update_user_by_id_admin(userid = userid, updateuserobj = updateuserobj, db = db,current_user = current_user)
+        return success_response(data = UserResponse.model_validate(user).model_dump(mode="json"))
+
+    @router.delete("/{userid}")
+    async def delete_user(userid: int, db = Depends(backend.get_db), current_user: Principal = Depends(backend.get_current_user),_=Depends(backend.require_roles(Roles.ADMIN))):
+        await controllers.delete_user_admin(userid = userid,db = db,current_user = current_user)
+        return success_response(message="User Deleted!")
+
+    return router
@@ -0,0 +1,86 @@
+from fastapi import Depends
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.async_database import get_async_db
+
+from app.core.principal_cache import Principal, TokenClaims, principal_cache
+from app.core.token_versions import token_versions
+
+from app.utils.hash_executor import hash_executor
+from app.core.metrics import login_events
+from app.utils.security import verify_password
+from app.schemas.auth import RefreshTokenRequest, LogoutRequest
+
+from app.exceptions.auth import AuthenticationError
+
+from app.controllers.auth_controller import (
+    oauth2_scheme,
+    decode_token,
+    load_current_user,
+    load_token_version,
+    claims_from_payload,
+    credentials_error,
+    find_login_user,
+    issue_login_tokens,
+    refresh_access_token_user,
+    logout_user
+)
+
+# Helper Function
+async def get_current_user_async(
+    token : str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    payload = decode_token(token)
+    user_id = int(payload["sub"])
+    
+    # the database is only hit on a cache miss
+    principal = principal_cache.get(user_id, token)
+    if principal is None:
+        generation = principal_cache.generation(user_id)
+        principal = await db.run_sync(lambda session: load_current_user(session, user_id, payload.get("ver")))
+        principal_cache.put(user_id, token, principal, generation)
+    
+    return principal
+
+async def get_token_claims_async(
+    token : str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    claims = claims_from_payload(decode_token(token))
+    
+    version = token_versions.get(claims.id)
+    if version is None:
+        version = await db.run_sync(lambda session: load_token_version(session, claims.id))
+    
+    if claims.token_version != version:
+        raise credentials_error()
+    
+    return claims
+
+async def login_user_async(
+    form_data: OAuth2PasswordRequestForm,
+    db: AsyncSession
+):
+    user = await db.run_sync(lambda session: find_login_user(form_data.username, session))
+    
+    # bcrypt must not run on the event loop
+    if not user or not await hash_executor.run_async(verify_password, form_data.password, user.password_hash):
+        login_events.inc("failure")
+        raise AuthenticationError(message = "Invalid email or password")
+    
+    return await db.run_sync(lambda session: issue_login_tokens(user, session))
+
+async def refresh_access_token_user_async(
+    data: RefreshTokenRequest,
+    db: AsyncSession
+):
+    return await db.run_sync(lambda session: refresh_access_token_user(data = data, db = session))
+
+async def logout_user_async(
+    data: LogoutRequest,
+    db: AsyncSession,
+    current_user: Principal
+):
+    return await db.run_sync(lambda session: logout_user(data = data, db = session, current_user = current_user))
@@ -0,0 +1,92 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.schemas.book import BookCreate, BookUpdate
+
+from app.controllers.book_controller import (
+    create_book_admin,
+    search_books,
+    get_specific_book,
+    update_book_by_id_admin,
+    delete_book_admin,
+    import_books_admin,
+    get_book_version,
+    search_cache_params,
+    search_page,
+    book_data
+)
+from app.core.catalog_version import get_catalog_version
+from app.core.catalog_cache import catalog_cache
+from app.core.database import SessionLocal
+
+# The sync controllers run inside AsyncSession.run_sync: their statements go
+# through the asyncio driver on the event loop, no threadpool slot is held.
+
+async def create_book_admin_async(book: BookCreate, db: AsyncSession):
+    return await db.run_sync(lambda session: create_book_admin(book = book, db = session))
+
+async def search_books_async(
+    search: str | None
+    ,in_stock: bool | None
+    ,sort_by: str | None
+    ,order: str
+    ,page: int 
+    ,limit: int
+    ,db: AsyncSession
+    ,cursor: str | None = None
+    ):
+    return await db.run_sync(
+        lambda session: search_books(search = search, in_stock = in_stock, sort_by = sort_by, order = order,
+                                     page = page, limit = limit, db = session, cursor = cursor)
+    )
+
+async def get_specific_book_async(bookid : int, db: AsyncSession):
+    return await db.run_sync(lambda session: get_specific_book(bookid = bookid, db = session))
+
+async def search_books_cached_async(
+    search: str | None
+    ,in_stock: bool | None
+    ,sort_by: str | None
+    ,order: str
+    ,page: int 
+    ,limit: int
+    ,db: AsyncSession
+    ,cursor: str | None = None
+    ,version: int | None = None
+    ):
+    params = dict(search = search, in_stock = in_stock, sort_by = sort_by, order = order, page = page, limit = limit, cursor = cursor)
+    key = catalog_cache.search_key(version, search_cache_params(**params))
+    result = await catalog_cache.get_or_load_async(
+        key, lambda: db.run_sync(lambda session: search_page(session, **params))
+    )
+    return result["books"], result["next_cursor"]
+
+async def get_specific_book_cached_async(bookid: int, db: AsyncSession, version: int | None = None):
+    return await catalog_cache.get_or_load_async(
+        catalog_cache.book_key(bookid, version), lambda: db.run_sync(lambda session: book_data(bookid, session))
+    )
+
+async def update_book_by_id_admin_async(bookid : int,
+                      bookobj : BookUpdate,
+                      db: AsyncSession):
+    return await db.run_sync(lambda session: update_book_by_id_admin(bookid = bookid, bookobj = bookobj, db = session))
+
+async def delete_book_admin_async(bookid : int,
+                db: AsyncSession):
+    return await db.run_sync(lambda session: delete_book_admin(bookid = bookid, db = session))
+
+async def import_books_admin_async(file, data_format: str, db: AsyncSession):
+    # the exception to run_sync: reading and validating a large feed is CPU
+    # work between the statements, on the event loop it would stall every
+    # other request for the length of the import. It gets a thread and a
+    # sync session of its own.
+    def run():
+        with SessionLocal() as session:
+            return import_books_admin(file = file, data_format = data_format, db = session)
+    return await run_in_threadpool(run)
+
+async def get_catalog_version_async(db: AsyncSession):
+    return await db.run_sync(get_catalog_version)
+
+async def get_book_version_async(bookid: int, db: AsyncSession):
+    return await db.run_sync(lambda session: get_book_version(bookid = bookid, db = session))
@@ -0,0 +1,54 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.principal_cache import Principal
+
+from app.schemas.loan import LoanCreate, LoanBatchCreate, LoanBatchReturn
+
+from app.controllers.loan_controller import (
+    borrow_book_user,
+    return_book_user,
+    borrow_books_batch_user,
+    return_books_batch_user,
+    active_loans_users,
+    my_loan_history_user,
+    user_loan_history_admin,
+    overdue_loans_admin
+)
+
+async def borrow_book_user_async(loan: LoanCreate,
+                current_user: Principal,
+                db: AsyncSession):
+    return await db.run_sync(lambda session: borrow_book_user(loan = loan, current_user = current_user, db = session))
+
+async def return_book_user_async(loan_id : int,
+                db: AsyncSession,
+                current_user: Principal):
+    return await db.run_sync(lambda session: return_book_user(loan_id = loan_id, db = session, current_user = current_user))
+
+async def borrow_books_batch_user_async(batch: LoanBatchCreate,
+                current_user: Principal,
+                db: AsyncSession):
+    return await db.run_sync(lambda session: borrow_books_batch_user(batch = batch, current_user = current_user, db = session))
+
+async def return_books_batch_user_async(batch: LoanBatchReturn,
+                db: AsyncSession,
+                current_user: Principal):
+    return await db.run_sync(lambda session: return_books_batch_user(batch = batch, db = session, current_user = current_user))
+
+async def active_loans_users_async(db: AsyncSession, current_user: Principal):
+    return await db.run_sync(lambda session: active_loans_users(db = session, current_user = current_user))
+
+async def my_loan_history_user_async(db: AsyncSession, current_user: Principal, limit: int, cursor: str | None = None):
+    return await db.run_sync(
+        lambda session: my_loan_history_user(db = session, current_user = current_user, limit = limit, cursor = cursor)
+    )
+
+async def user_loan_history_admin_async(user_id: int, db: AsyncSession, limit: int, cursor: str | None = None):
+    return await db.run_sync(
+        lambda session: user_loan_history_admin(user_id = user_id, db = session, limit = limit, cursor = cursor)
+    )
+
+async def overdue_loans_admin_async(db: AsyncSession, limit: int, cursor: str | None = None):
+    return await db.run_sync(
+        lambda session: overdue_loans_admin(db = session, limit = limit, cursor = cursor)
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.controllers.stats_controller import (
+    top_books_admin,
+    book_stats_admin,
+    daily_circulation_admin,
+    circulation_summary_admin
+)
+
+async def top_books_admin_async(db: AsyncSession, limit: int, days: int | None = None):
+    return await db.run_sync(lambda session: top_books_admin(db = session, limit = limit, days = days))
+
+async def book_stats_admin_async(book_id: int, db: AsyncSession, days: int):
+    return await db.run_sync(lambda session: book_stats_admin(book_id = book_id, db = session, days = days))
+
+async def daily_circulation_admin_async(db: AsyncSession, days: int):
+    return await db.run_sync(lambda session: daily_circulation_admin(db = session, days = days))
+
+async def circulation_summary_admin_async(db: AsyncSession):
+    return await db.run_sync(lambda session: circulation_summary_admin(db = session))
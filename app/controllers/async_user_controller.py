@@ -0,0 +1,54 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.principal_cache import Principal
+
+from app.schemas.user import UserCreate, UserUpdate
+from app.schemas.audit_logs import AuditLogFilter
+
+from app.utils.security import hash_password
+from app.utils.hash_executor import hash_executor
+
+from app.controllers.user_controller import (
+    get_audit_logs_admin,
+    update_my_profile_user,
+    delete_profile_user,
+    create_user_admin,
+    get_all_users_admin,
+    get_user_by_id_admin,
+    update_user_by_id_admin,
+    delete_user_admin
+)
+
+async def get_audit_logs_admin_async(db: AsyncSession, filters: AuditLogFilter, limit: int, cursor: str | None = None):
+    return await db.run_sync(
+        lambda session: get_audit_logs_admin(db = session, filters = filters, limit = limit, cursor = cursor)
+    )
+
+async def update_my_profile_user_async(userupdateobj: UserUpdate, db: AsyncSession, current_user: Principal):
+    return await db.run_sync(
+        lambda session: update_my_profile_user(userupdateobj = userupdateobj, db = session, current_user = current_user)
+    )
+
+async def delete_profile_user_async(db: AsyncSession, current_user: Principal):
+    return await db.run_sync(lambda session: delete_profile_user(db = session, current_user = current_user))
+
+async def create_user_admin_async(user: UserCreate, db: AsyncSession, current_user: Principal):
+    # bcrypt must not run on the event loop
+    password_hash = await hash_executor.run_async(hash_password, user.password)
+    return await db.run_sync(
+        lambda session: create_user_admin(user = user, db = session, current_user = current_user, password_hash = password_hash)
+    )
+
+async def get_all_users_admin_async(db: AsyncSession, limit: int, cursor: str | None = None):
+    return await db.run_sync(lambda session: get_all_users_admin(db = session, limit = limit, cursor = cursor))
+
+async def get_user_by_id_admin_async(userid: int, db: AsyncSession):
+    return await db.run_sync(lambda session: get_user_by_id_admin(userid = userid, db = session))
+
+async def update_user_by_id_admin_async(userid: int, updateuserobj: UserUpdate, db: AsyncSession, current_user: Principal):
+    return await db.run_sync(
+        lambda session: update_user_by_id_admin(userid = userid, updateuserobj = updateuserobj, db = session, current_user = current_user)
+    )
+
+async def delete_user_admin_async(userid: int, db: AsyncSession, current_user: Principal):
+    return await db.run_sync(lambda session: delete_user_admin(userid = userid, db = session, current_user = current_user))
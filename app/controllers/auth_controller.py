@@ -1,18 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from jose import jwt, JWTError
 
 from app.core.database import get_db
 from app.core.rate_limiter import limiter
 from app.core.audit import log_audit
 from app.core.response import success_response
+from app.core.principal_cache import Principal, TokenClaims, principal_cache
+from app.core.token_versions import token_versions
+from app.core.token_denylist import token_denylist, recent_access_tokens, deny_rows
 
 from app.models.user import User
 from app.models.refresh_token import RefreshToken
 from app.models.audit_log import AuditLog
 
-from app.utils.security import verify_password, create_access_token, create_refresh_token, refresh_token_expiry, decode_access_token
+from app.utils.hash_executor import hash_executor
+from app.core.metrics import login_events
+from app.utils.security import verify_password, create_access_token, create_refresh_token, refresh_token_expiry, decode_access_token, hash_refresh_token, new_token_id
 from app.schemas.auth import RefreshTokenRequest, LogoutRequest
 from app.schemas.audit_logs import AuditAction
 from app.schemas.user import UserResponse
@@ -20,26 +25,23 @@ from app.schemas.user import UserResponse
 from app.exceptions.auth import AuthenticationError,AuthorizationError
 
 
-import os
-from dotenv import load_dotenv, find_dotenv
 from datetime import datetime
 
-load_dotenv(find_dotenv())
-SECRET_KEY = os.getenv("SECRET_KEY","secret")
+from app.core.config import get_settings
+
+SECRET_KEY = get_settings().secret_key
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-# Helper Function
-def get_current_user(
-    token : str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
+def credentials_error():
+    return HTTPException(
         status_code = status.HTTP_401_UNAUTHORIZED,
         detail = "Cound not validate Credentials",
         headers = {"WWW-Authenticated" : "Bearer"}
     )
-    
+
+def decode_token(token: str):
+    credentials_exception = credentials_error()
     try: 
         payload = decode_access_token(token)
         user_id : str | None = payload.get("sub")
@@ -47,45 +49,102 @@ def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # logged out sessions, in memory: no query, and before any cache
+    if token_denylist.is_denied(payload.get("jti")):
+        raise credentials_exception
+    return payload
+
+def decode_user_id(token: str):
+    return int(decode_token(token)["sub"])
+
+def access_token_claims(user: User):
+    return {"sub": str(user.id), "role": user.role.name, "ver": user.token_version or 0}
+
+def load_current_user(db: Session, user_id: int, token_version: int | None = None):
+    # role is loaded in the same round trip, require_roles always reads it
+    user = db.query(User).options(joinedload(User.role)).filter(User.id == user_id).first()
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    if user is None or not user.is_active: 
+        raise credentials_error()
     
-    if user is None: 
-        raise credentials_exception
+    # tokens issued before the last role change / deactivation
+    if token_version is not None and token_version != (user.token_version or 0):
+        raise credentials_error()
+    
+    token_versions.put(user.id, user.token_version or 0)
     
-    return user
+    return Principal.from_user(user)
 
-def login_user(
-    form_data: OAuth2PasswordRequestForm,
-    db: Session
+def load_token_version(db: Session, user_id: int):
+    version = db.query(User.token_version).filter(User.id == user_id, User.is_active == True).scalar()
+    if version is None:
+        raise credentials_error()
+    token_versions.put(user_id, version)
+    return version
+
+def claims_from_payload(payload: dict):
+    # tokens minted before role claims existed can not be checked statelessly
+    if "role" not in payload or "ver" not in payload:
+        raise credentials_error()
+    return TokenClaims(id = int(payload["sub"]), role_name = payload["role"], token_version = payload["ver"])
+
+# Helper Function
+def get_current_user(
+    token : str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username,User.is_active == True).first()
+    payload = decode_token(token)
+    user_id = int(payload["sub"])
     
-    # form_data.password => test1234
-    # user.password_hash => $2b$12$kIVsVg78Su98CQn41An5KOdazXgL2JO283il7fXZOayX44VmH.PPO
+    # the database is only hit on a cache miss
+    principal = principal_cache.get(user_id, token)
+    if principal is None:
+        generation = principal_cache.generation(user_id)
+        principal = load_current_user(db, user_id, payload.get("ver"))
+        principal_cache.put(user_id, token, principal, generation)
     
-    if not user or not verify_password(form_data.password, user.password_hash):
-        raise AuthenticationError(message = "Invalid email or password")
+    return principal
+
+def get_token_claims(
+    token : str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    claims = claims_from_payload(decode_token(token))
+    
+    # the session stays unused unless this worker has not seen the user lately
+    version = token_versions.get(claims.id)
+    if version is None:
+        version = load_token_version(db, claims.id)
     
+    if claims.token_version != version:
+        raise credentials_error()
+    
+    return claims
+
+def find_login_user(email: str, db: Session):
+    return db.query(User).options(joinedload(User.role)).filter(User.email == email,User.is_active == True).first()
+
+def issue_login_tokens(user: User, db: Session):
+    # every login starts a family of its own, the user's other sessions
+    # are left alone
+    jti = new_token_id()
     access_token = create_access_token(
-        data = {"sub": str(user.id)}
+        data = {**access_token_claims(user), "jti": jti}
     )
     
     refresh_token_value = create_refresh_token()
     refresh_token = RefreshToken(
         user_id = user.id,
-        token = refresh_token_value,
-        expires_at = refresh_token_expiry()
+        token_hash = hash_refresh_token(refresh_token_value),
+        expires_at = refresh_token_expiry(),
+        family_id = new_token_id(),
+        access_jti = jti
     )
     
-    db.query(RefreshToken).filter(
-        RefreshToken.user_id == user.id,
-        RefreshToken.is_revoked == False
-    ).update({"is_revoked": True})
-    
     db.add(refresh_token)
 
     db.commit()
+    login_events.inc("success")
         
     return {
         "access_token": access_token,
@@ -93,32 +152,96 @@ def login_user(
         "token_type": "bearer"
     }
 
+def login_user(
+    form_data: OAuth2PasswordRequestForm,
+    db: Session
+):
+    user = find_login_user(form_data.username, db)
+    
+    # form_data.password => test1234
+    # user.password_hash => $2b$12$kIVsVg78Su98CQn41An5KOdazXgL2JO283il7fXZOayX44VmH.PPO
+    
+    if not user or not hash_executor.run(verify_password, form_data.password, user.password_hash):
+        login_events.inc("failure")
+        raise AuthenticationError(message = "Invalid email or password")
+    
+    return issue_login_tokens(user, db)
+
+def revoke_token_family(db: Session, token_record: RefreshToken):
+    # one session, found through ix_refresh_tokens_family_id; tokens issued
+    # before families existed are a family of one
+    if token_record.family_id is not None:
+        condition = RefreshToken.family_id == token_record.family_id
+    else:
+        condition = RefreshToken.id == token_record.id
+    
+    now = datetime.now()
+    recent = db.execute(recent_access_tokens(condition, now)).all()
+    db.query(RefreshToken).filter(
+        condition,
+        RefreshToken.revoked_at == None
+    ).update({"is_revoked": True, "revoked_at": now}, synchronize_session = False)
+    
+    # for the denylist once committed, the other workers read revoked_at
+    return recent
+
 def refresh_access_token_user(
     data: RefreshTokenRequest,
     db: Session
 ):
-    token_record = db.query(RefreshToken).filter(RefreshToken.token == data.refresh_token, RefreshToken.is_revoked == False).first()
+    token_record = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(data.refresh_token)).first()
     
     if not token_record:
         raise AuthenticationError(message = "Invalid refresh token!")
     
+    if token_record.is_revoked:
+        # a token that was already rotated is being replayed, one of the two
+        # holders is not the user: the whole session goes
+        if token_record.revoked_at is None:
+            recent = revoke_token_family(db, token_record)
+            log_audit(
+                db,
+                action=AuditAction.TOKEN_REVOKED,
+                entity="RefreshTokens",
+                entity_id=token_record.id,
+                performed_by=token_record.user_id,
+                message=f"Refresh token reuse detected, session of user {token_record.user_id} revoked."
+            )
+            db.commit()
+            deny_rows(recent)
+        raise AuthenticationError(message = "Invalid refresh token!")
+    
     if token_record.expires_at < datetime.now():
         raise AuthenticationError(message = "Invalid refresh token!")
     
-    token_record.is_revoked = True
+    # conditional, of two concurrent refreshes with the same token only one
+    # may rotate it
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == token_record.id,
+        RefreshToken.is_revoked == False
+    ).update({"is_revoked": True}, synchronize_session = False)
+    if not rotated:
+        raise AuthenticationError(message = "Invalid refresh token!")
+    
+    jti = new_token_id()
     new_refresh_token = create_refresh_token()
     
     refresh_token_obj = RefreshToken(
         user_id = token_record.user_id,
-        token = new_refresh_token,
-        expires_at = refresh_token_expiry()
+        token_hash = hash_refresh_token(new_refresh_token),
+        expires_at = refresh_token_expiry(),
+        # tokens from before families existed start one here
+        family_id = token_record.family_id or new_token_id(),
+        access_jti = jti
     )
     
     db.add(refresh_token_obj)
     
     
+    user = db.query(User).options(joinedload(User.role)).filter(User.id == token_record.user_id).first()
+    
     access_token = create_access_token(
-        {"sub": str(token_record.user_id)}
+        {**access_token_claims(user), "jti": jti}
     )
     
     db.commit()
@@ -134,15 +257,16 @@ def refresh_access_token_user(
 def logout_user(
     data: LogoutRequest,
     db: Session,
-    current_user: User
+    current_user: Principal
 ):
-    user_refresh_token = db.query(RefreshToken).filter(data.refresh_token == RefreshToken.token, RefreshToken.is_revoked == False).first()
+    user_refresh_token = db.query(RefreshToken).filter(hash_refresh_token(data.refresh_token) == RefreshToken.token_hash, RefreshToken.is_revoked == False).first()
     
-    if not user_refresh_token:
+    if not user_refresh_token or user_refresh_token.user_id != current_user.id:
         raise AuthenticationError(message = "Invalid token")
     
-    db.query(RefreshToken).filter(RefreshToken.is_revoked == False).update({"is_revoked": True})
-    # user_refresh_token.is_revoked = True
+    # only this session: its refresh tokens, and its access tokens through
+    # the denylist
+    recent = revoke_token_family(db, user_refresh_token)
     
     # Token revoked audit
     log_audit(
@@ -155,6 +279,7 @@ def logout_user(
     )
     
     db.commit()
+    deny_rows(recent)
     
     return 
 
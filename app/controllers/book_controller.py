@@ -1,10 +1,19 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, asc, desc
+from sqlalchemy import or_
+import io
 
-from app.schemas.book import BookCreate, BookUpdate
+from app.schemas.book import BookCreate, BookUpdate, BookResponse
 
 from app.models.book import Book
 
+from app.core.search import can_use_index, match_subquery, match_filter, index_book, unindex_book, query_tokens
+from app.core.pagination import paginate
+from app.core.response import response_columns, dump_list_data
+from app.core.catalog_cache import catalog_cache
+from app.core.catalog_version import mark_catalog_changed, get_catalog_version
+from app.core.circulation import record_stock
+from app.core.book_import import import_books, iter_records
+
 from app.exceptions.book import BookNotFound
 
 def create_book_admin(book: BookCreate, db: Session):
@@ -14,6 +23,12 @@ def create_book_admin(book: BookCreate, db: Session):
         stock = book.stock
     )
     db.add(db_book_obj)
+    db.flush()
+    
+    index_book(db, db_book_obj)
+    mark_catalog_changed(db, [db_book_obj.id])
+    record_stock(db, db_book_obj.stock)
+    
     db.commit()
     db.refresh(db_book_obj)
     
@@ -22,17 +37,23 @@ def create_book_admin(book: BookCreate, db: Session):
 def search_books(
     search: str | None
     ,in_stock: bool | None
-    ,sort_by: str
+    ,sort_by: str | None
     ,order: str
     ,page: int 
     ,limit: int
     ,db: Session
+    ,cursor: str | None = None
     ):
     
-    query = db.query(Book)
+    # plain columns, the listing never needs Book objects
+    query = db.query(*response_columns(BookResponse, Book))
+    match = None
     
     # searching 
-    if search:
+    if search and can_use_index(search):
+        match = match_subquery(search)
+        query = query.join(match, match.c.book_id == Book.id).filter(match_filter(search, match))
+    elif search:
         query = query.filter( or_ 
                              (
                                  Book.name.ilike(f"%{search}%"),
@@ -43,25 +64,27 @@ def search_books(
     if in_stock is True:
         query = query.filter(Book.stock > 0) 
     
-    # sorting column
-    if sort_by == "stock":
-        sort_column = Book.stock
+    # relevance ranking, unless an explicit sort column was asked for
+    if match is not None and sort_by in (None, "relevance"):
+        keyset = [(match.c.score, True), (Book.id, False)]
     else:
-        sort_column = Book.name
-        
-    # sorting order 
-    if order == "desc":
-        query = query.order_by(desc(sort_column))
-    else:
-        query = query.order_by(asc(sort_column))
+        # sorting column
+        if sort_by == "stock":
+            sort_column = Book.stock
+        else:
+            sort_column = Book.name
+            
+        # sorting order, id breaks ties so the (column, id) index serves it
+        descending = order == "desc"
+        keyset = [(sort_column, descending), (Book.id, descending)]
     
-    # pagination 
+    # pagination, a cursor wins over page 
     offset = (page - 1) * limit
     
     # final filtering
-    books = query.offset(offset).limit(limit).all()
+    books, next_cursor = paginate(query, keyset, limit = limit, cursor = cursor, offset = offset, scope = [search_scope(search), in_stock])
     
-    return books
+    return books, next_cursor
 
 def get_specific_book(bookid : int, db: Session):
     book = db.query(Book).filter(Book.id == bookid).first()
@@ -69,18 +92,74 @@ def get_specific_book(bookid : int, db: Session):
         raise BookNotFound()
     return book
 
+def search_scope(search: str | None):
+    # an indexed search by its query words, so "Dune  messiah" and "messiah
+    # dune" share cache entries and cursors
+    if search and can_use_index(search):
+        word_tokens, _ = query_tokens(search)
+        return ["index", sorted(word_tokens)]
+    return search or None
+
+def search_cache_params(search, in_stock, sort_by, order, page, limit, cursor):
+    # equivalent searches share one cache entry
+    return {"search": search_scope(search), "in_stock": in_stock, "sort_by": sort_by, "order": order,
+            "page": page, "limit": limit, "cursor": cursor}
+
+def search_page(db: Session, **params):
+    books, next_cursor = search_books(db = db, **params)
+    return {"books": dump_list_data(BookResponse, books), "next_cursor": next_cursor}
+
+def book_data(bookid: int, db: Session):
+    return BookResponse.model_validate(get_specific_book(bookid = bookid, db = db)).model_dump(mode = "json")
+
+def search_books_cached(
+    search: str | None
+    ,in_stock: bool | None
+    ,sort_by: str | None
+    ,order: str
+    ,page: int 
+    ,limit: int
+    ,db: Session
+    ,cursor: str | None = None
+    ,version: int | None = None
+    ):
+    # search_books through the catalog cache, books come back as plain dicts.
+    # version is the catalog version read by the request, None skips the cache
+    params = dict(search = search, in_stock = in_stock, sort_by = sort_by, order = order, page = page, limit = limit, cursor = cursor)
+    key = catalog_cache.search_key(version, search_cache_params(**params))
+    result = catalog_cache.get_or_load(key, lambda: search_page(db, **params))
+    return result["books"], result["next_cursor"]
+
+def get_specific_book_cached(bookid: int, db: Session, version: int | None = None):
+    # version is the book's version read by the request
+    return catalog_cache.get_or_load(catalog_cache.book_key(bookid, version), lambda: book_data(bookid, db))
+
+def get_book_version(bookid: int, db: Session):
+    # None when the book does not exist, the route then reports it as usual
+    return db.query(Book.version).filter(Book.id == bookid).scalar()
+
 def update_book_by_id_admin(bookid : int,
                       bookobj : BookUpdate,
                       db: Session):
-    book = db.query(Book).filter(Book.id==bookid).first()
+    # locked: a borrow in between would make the stock change counted into
+    # the circulation totals wrong by its copy
+    book = db.query(Book).filter(Book.id==bookid).with_for_update().first()
     
     if not book:
         raise BookNotFound()
     
     updated_data = bookobj.model_dump(exclude_unset=True)
+    if updated_data.get("stock") is not None:
+        record_stock(db, updated_data["stock"] - book.stock)
     
     for k,v in updated_data.items():
         setattr(book,k,v)
+    book.version = Book.version + 1
+
+    if "name" in updated_data or "isbn" in updated_data:
+        db.flush()
+        index_book(db, book)
+    mark_catalog_changed(db, [book.id])
 
     db.commit()
     db.refresh(book)
@@ -90,12 +169,23 @@ def update_book_by_id_admin(bookid : int,
 def delete_book_admin(bookid : int,
                 db: Session):
     
-    book = db.query(Book).filter(Book.id==bookid).first()
+    book = db.query(Book).filter(Book.id==bookid).with_for_update().first()
     
     if not book:
         raise BookNotFound()
     
+    unindex_book(db, book.id)
     db.delete(book)
+    mark_catalog_changed(db, [book.id])
+    record_stock(db, -book.stock)
     db.commit()
     
     return 
+
+def import_books_admin(file, data_format: str, db: Session):
+    # file is the binary upload, decoded and parsed line by line
+    lines = io.TextIOWrapper(file, encoding = "utf-8-sig", newline = "")
+    try:
+        return import_books(db, iter_records(lines, data_format))
+    finally:
+        lines.detach()
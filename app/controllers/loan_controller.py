@@ -1,38 +1,59 @@
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from collections import Counter
 from datetime import date
 
 from app.models.loan import Loan
-from app.models.user import User
 from app.models.book import Book
+from app.models.role import Role
+from app.models.user import User
 
-from app.schemas.loan import LoanCreate
+from app.schemas.loan import LoanCreate, LoanResponse, LoanBatchCreate, LoanBatchReturn
 from app.schemas.audit_logs import AuditAction
 
-from app.core.audit import log_audit
+from app.core.audit import log_audit, log_audit_many
+from app.core.pagination import paginate
+from app.core.response import response_columns
+from app.core.principal_cache import Principal
+from app.core.catalog_version import mark_catalog_changed
+from app.core.overdue import SWEEP_KEYSET, loan_fine
+from app.core.circulation import record_borrows, record_returns
 
+from app.exceptions.base import AppException
 from app.exceptions.book import BookNotFound, BookOutOfStock
 from app.exceptions.loan import AlreadyBorrowed, InvalidLoanOperation, LoanNotFound
 
+def take_copy(db: Session, book_id: int):
+    # one conditional UPDATE: the row lock it takes serialises concurrent
+    # borrowers and the stock > 0 guard means the last copy goes only once
+    result = db.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.stock > 0)
+        .values(stock = Book.stock - 1, version = Book.version + 1)
+        .execution_options(synchronize_session = False)
+    )
+    if result.rowcount == 1:
+        mark_catalog_changed(db, [book_id])
+        return
+    if db.query(Book.id).filter(Book.id == book_id).first() is None:
+        raise BookNotFound()
+    raise BookOutOfStock()
+
+def put_back_copy(db: Session, book_id: int):
+    db.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(stock = Book.stock + 1, version = Book.version + 1)
+        .execution_options(synchronize_session = False)
+    )
+    mark_catalog_changed(db, [book_id])
+
 def borrow_book_user(loan: LoanCreate,
-                current_user: User,
+                current_user: Principal,
                 db: Session):
     
-    book = db.query(Book).filter(Book.id == loan.book_id).first()
-    
-    if not book:
-        raise BookNotFound()
-        
-    if book.stock <= 0:
-        raise BookOutOfStock()
-    
-    existing_loan = db.query(Loan).filter(
-        Loan.book_id == loan.book_id,
-        Loan.user_id == current_user.id,
-        Loan.is_active == True
-    ).first()
-    
-    if existing_loan:
-        raise AlreadyBorrowed(message = "You have already borrowed this book!")
+    take_copy(db, loan.book_id)
     
     new_loan = Loan(
         user_id = current_user.id,
@@ -41,10 +62,14 @@ def borrow_book_user(loan: LoanCreate,
         due_date = loan.due_date
     )
     
-    book.stock -= 1
-    
     db.add(new_loan)
-    db.flush()
+    try:
+        db.flush()
+    except IntegrityError:
+        # uq_loans_active_user_book, the rollback also gives the copy back
+        db.rollback()
+        raise AlreadyBorrowed(message = "You have already borrowed this book!")
+    record_borrows(db, [loan.book_id])
     
     # Audit loan creation
     log_audit(
@@ -63,8 +88,8 @@ def borrow_book_user(loan: LoanCreate,
 
 def return_book_user(loan_id : int,
                 db: Session,
-                current_user: User):
-    loan = db.query(Loan).filter(Loan.id == loan_id, Loan.is_active == True).first()
+                current_user: Principal):
+    loan = db.query(Loan.id, Loan.user_id, Loan.book_id).filter(Loan.id == loan_id, Loan.is_active == True).first()
     
     if not loan:
         raise LoanNotFound()
@@ -72,11 +97,20 @@ def return_book_user(loan_id : int,
     if loan.user_id != current_user.id:
         raise InvalidLoanOperation(message = "You can not return this book!")
 
-    book = db.query(Book).filter(loan.book_id == Book.id).first()
-    
-    loan.is_active = False
-    loan.returned_at = date.today()
-    book.stock += 1
+    # the is_active guard makes a second, concurrent return of the same loan
+    # match nothing, so a copy is only ever put back once
+    result = db.execute(
+        update(Loan)
+        .where(Loan.id == loan.id, Loan.is_active == True)
+        .values(is_active = False, active_marker = None, returned_at = date.today())
+        .execution_options(synchronize_session = False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise LoanNotFound()
+
+    put_back_copy(db, loan.book_id)
+    record_returns(db, [loan.book_id])
     
     # Audit loan creation
     log_audit(
@@ -92,15 +126,242 @@ def return_book_user(loan_id : int,
     
     return 
 
-def active_loans_users(db: Session, current_user: User):
-    activeLoanRecords = db.query(Loan).filter(current_user.id == Loan.user_id, Loan.is_active == True).all()
+def _failed(key: str, item_id: int, error: AppException):
+    return {key: item_id, "success": False, "error": {"code": error.error_code, "message": error.message}}
+
+def _dedupe(ids: list[int]):
+    seen = set()
+    unique, repeated = [], []
+    for item_id in ids:
+        (repeated if item_id in seen else unique).append(item_id)
+        seen.add(item_id)
+    return unique, repeated
+
+def borrow_books_batch_user(batch: LoanBatchCreate,
+                current_user: Principal,
+                db: Session):
+    # the whole batch costs a fixed number of statements and one commit:
+    # read books, read active loans, bulk stock update, bulk loan insert,
+    # read the new loans back, bulk audit insert
+    book_ids, repeated = _dedupe(batch.book_ids)
+    failures = {}
+
+    # FOR UPDATE holds the rows until commit where the database supports it
+    stocks = dict(db.execute(
+        select(Book.id, Book.stock).where(Book.id.in_(book_ids)).with_for_update()
+    ).all())
+    active = set(db.execute(
+        select(Loan.book_id).where(Loan.user_id == current_user.id, Loan.book_id.in_(book_ids), Loan.is_active == True)
+    ).scalars())
+
+    for book_id in book_ids:
+        if book_id not in stocks:
+            failures[book_id] = BookNotFound()
+        elif stocks[book_id] <= 0:
+            failures[book_id] = BookOutOfStock()
+        elif book_id in active:
+            failures[book_id] = AlreadyBorrowed(message = "You have already borrowed this book!")
+
+    candidates = [book_id for book_id in book_ids if book_id not in failures]
+
+    if candidates and not _borrow_all(db, candidates, batch, current_user):
+        # a concurrent request took a copy or the same loan in between,
+        # redo the batch item by item to find out which
+        db.rollback()
+        candidates = _borrow_one_by_one(db, candidates, batch, current_user, failures)
+
+    loans = {}
+    if candidates:
+        # serialized before the commit expires them, which would reload each
+        loans = {
+            loan.book_id: LoanResponse.model_validate(loan)
+            for loan in db.query(Loan).filter(
+                Loan.user_id == current_user.id, Loan.book_id.in_(candidates), Loan.is_active == True
+            )
+        }
+        record_borrows(db, list(loans))
+        log_audit_many(db, [
+            {
+                "action": AuditAction.LOAN_CREATED.value,
+                "entity": "Loan",
+                "entity_id": loan.id,
+                "performed_by": current_user.id,
+                "message": f"User {current_user.email} took book by himself/herself."
+            }
+            for loan in loans.values()
+        ])
+        db.commit()
+
+    results = [
+        {"book_id": book_id, "success": True, "loan": loans[book_id]}
+        if book_id in loans else _failed("book_id", book_id, failures[book_id])
+        for book_id in book_ids
+    ]
+    results += [
+        _failed("book_id", book_id, InvalidLoanOperation(message = "Book appears more than once in the batch!"))
+        for book_id in repeated
+    ]
+    return results
+
+def _new_loan_row(book_id: int, batch: LoanBatchCreate, current_user: Principal):
+    return {"user_id": current_user.id, "book_id": book_id, "borrow_issue_date": date.today(),
+            "due_date": batch.due_date, "is_active": True, "active_marker": True}
+
+def _borrow_all(db: Session, candidates: list[int], batch: LoanBatchCreate, current_user: Principal):
+    taken = db.execute(
+        update(Book)
+        .where(Book.id.in_(candidates), Book.stock > 0)
+        .values(stock = Book.stock - 1, version = Book.version + 1)
+        .execution_options(synchronize_session = False)
+    ).rowcount
+    if taken != len(candidates):
+        return False
+    mark_catalog_changed(db, candidates)
+    try:
+        db.execute(insert(Loan.__table__), [_new_loan_row(book_id, batch, current_user) for book_id in candidates])
+    except IntegrityError:
+        return False
+    return True
+
+def _borrow_one_by_one(db: Session, candidates: list[int], batch: LoanBatchCreate, current_user: Principal, failures: dict):
+    # a savepoint per item: a failed statement aborts the whole transaction
+    # on PostgreSQL, rolling back to the savepoint keeps the rest of the batch
+    # going and also gives back the copy taken for the failed item
+    borrowed = []
+    for book_id in candidates:
+        savepoint = db.begin_nested()
+        try:
+            take_copy(db, book_id)
+            db.execute(insert(Loan.__table__), _new_loan_row(book_id, batch, current_user))
+        except AppException as error:
+            savepoint.rollback()
+            failures[book_id] = error
+            continue
+        except IntegrityError:
+            savepoint.rollback()
+            failures[book_id] = AlreadyBorrowed(message = "You have already borrowed this book!")
+            continue
+        savepoint.commit()
+        borrowed.append(book_id)
+    return borrowed
+
+def return_books_batch_user(batch: LoanBatchReturn,
+                db: Session,
+                current_user: Principal):
+    loan_ids, repeated = _dedupe(batch.loan_ids)
+    failures = {}
+
+    loans = {
+        loan.id: loan
+        for loan in db.execute(
+            select(Loan.id, Loan.user_id, Loan.book_id).where(Loan.id.in_(loan_ids), Loan.is_active == True)
+        )
+    }
+    for loan_id in loan_ids:
+        if loan_id not in loans:
+            failures[loan_id] = LoanNotFound()
+        elif loans[loan_id].user_id != current_user.id:
+            failures[loan_id] = InvalidLoanOperation(message = "You can not return this book!")
+
+    returning = [loan_id for loan_id in loan_ids if loan_id not in failures]
+
+    if returning:
+        closed = db.execute(
+            update(Loan)
+            .where(Loan.id.in_(returning), Loan.is_active == True)
+            .values(is_active = False, active_marker = None, returned_at = date.today())
+            .execution_options(synchronize_session = False)
+        ).rowcount
+        if closed != len(returning):
+            # some were returned concurrently, only close what is still open
+            db.rollback()
+            returning = _return_one_by_one(db, returning, loans, failures)
+        else:
+            # a book comes back once per loan: duplicate active loans that
+            # m0005 kept can close together. One UPDATE per distinct count,
+            # almost always just the one for a single copy.
+            copies = Counter(loans[loan_id].book_id for loan_id in returning)
+            by_count = {}
+            for book_id, count in copies.items():
+                by_count.setdefault(count, []).append(book_id)
+            for count, book_ids in by_count.items():
+                db.execute(
+                    update(Book)
+                    .where(Book.id.in_(book_ids))
+                    .values(stock = Book.stock + count, version = Book.version + 1)
+                    .execution_options(synchronize_session = False)
+                )
+            mark_catalog_changed(db, list(copies))
+
+    if returning:
+        record_returns(db, [loans[loan_id].book_id for loan_id in returning])
+        log_audit_many(db, [
+            {
+                "action": AuditAction.LOAN_RETURNED.value,
+                "entity": "Loan",
+                "entity_id": loan_id,
+                "performed_by": current_user.id,
+                "message": f"User {current_user.email} returned book by himself/herself."
+            }
+            for loan_id in returning
+        ])
+        db.commit()
+
+    results = [
+        {"loan_id": loan_id, "success": True}
+        if loan_id not in failures else _failed("loan_id", loan_id, failures[loan_id])
+        for loan_id in loan_ids
+    ]
+    results += [
+        _failed("loan_id", loan_id, InvalidLoanOperation(message = "Loan appears more than once in the batch!"))
+        for loan_id in repeated
+    ]
+    return results
+
+def _return_one_by_one(db: Session, loan_ids: list[int], loans: dict, failures: dict):
+    returned = []
+    for loan_id in loan_ids:
+        closed = db.execute(
+            update(Loan)
+            .where(Loan.id == loan_id, Loan.is_active == True)
+            .values(is_active = False, active_marker = None, returned_at = date.today())
+            .execution_options(synchronize_session = False)
+        ).rowcount
+        if closed != 1:
+            failures[loan_id] = LoanNotFound()
+            continue
+        put_back_copy(db, loans[loan_id].book_id)
+        returned.append(loan_id)
+    return returned
+
+def active_loans_users(db: Session, current_user: Principal):
+    activeLoanRecords = db.query(*response_columns(LoanResponse, Loan)).filter(current_user.id == Loan.user_id, Loan.is_active == True).all()
     return activeLoanRecords
 
-def my_loan_history_user(db: Session,current_user: User):
-    historyLoanRecords = db.query(Loan).filter(current_user.id == Loan.user_id).all()
-    return historyLoanRecords
+def my_loan_history_user(db: Session,current_user: Principal, limit: int, cursor: str | None = None):
+    query = db.query(*response_columns(LoanResponse, Loan)).filter(current_user.id == Loan.user_id)
+    historyLoanRecords, next_cursor = paginate(query, [(Loan.id, False)], limit = limit, cursor = cursor, scope = current_user.id)
+    return historyLoanRecords, next_cursor
 
-def user_loan_history_admin(user_id: int, db: Session):
-    userLoanHistory = db.query(Loan).filter(Loan.user_id == user_id).all()
-    return userLoanHistory
-    
\ No newline at end of file
+def user_loan_history_admin(user_id: int, db: Session, limit: int, cursor: str | None = None):
+    query = db.query(*response_columns(LoanResponse, Loan)).filter(Loan.user_id == user_id)
+    userLoanHistory, next_cursor = paginate(query, [(Loan.id, False)], limit = limit, cursor = cursor, scope = user_id)
+    return userLoanHistory, next_cursor
+
+def overdue_loans_admin(db: Session, limit: int, cursor: str | None = None):
+    # past due by date, whether or not the sweeper got to them yet. The fine
+    # is worked out here with the borrower's policy, the stored one is only
+    # as of the sweeper's last run
+    today = date.today()
+    query = (
+        db.query(*response_columns(LoanResponse, Loan), Role.name.label("role_name"))
+        .join(User, User.id == Loan.user_id)
+        .join(Role, Role.id == User.role_id)
+        .filter(Loan.is_active == True, Loan.due_date < today)
+    )
+    rows, next_cursor = paginate(query, SWEEP_KEYSET, limit = limit, cursor = cursor)
+    overdueLoans = [
+        {**row._mapping, "is_overdue": True, "fine_cents": loan_fine(row.role_name, row.due_date, today)}
+        for row in rows
+    ]
+    return overdueLoans, next_cursor
@@ -0,0 +1,115 @@
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+
+from app.models.book import Book
+from app.models.circulation_stats import BookCirculation, BookCirculationDaily, CirculationTotals
+
+from app.exceptions.book import BookNotFound
+
+# every report reads the pre-aggregated circulation tables only, never loans
+
+def _utilization(on_loan: int, stock: int):
+    # share of the copies that are out, stock counts the ones on the shelf
+    copies = on_loan + stock
+    return round(on_loan / copies, 4) if copies > 0 else 0.0
+
+def _in_window(days: int):
+    # bounded on both sides: with only a lower bound SQLite guesses the range
+    # is most of the table and walks the book_id index instead of the key
+    today = date.today()
+    return BookCirculationDaily.day.between(today - timedelta(days = days - 1), today)
+
+def top_books_admin(db: Session, limit: int, days: int | None = None):
+    if days is None:
+        # all time, straight off ix_book_circulation_total_borrows_book_id
+        rows = db.execute(
+            select(BookCirculation.book_id, Book.name, BookCirculation.total_borrows, BookCirculation.on_loan, Book.stock)
+            .join(Book, Book.id == BookCirculation.book_id)
+            .order_by(BookCirculation.total_borrows.desc(), BookCirculation.book_id.desc())
+            .limit(limit)
+        ).all()
+    else:
+        # the daily rows of the window, one per book borrowed or returned per day
+        window = (
+            select(BookCirculationDaily.book_id, func.sum(BookCirculationDaily.borrows).label("borrows"))
+            .where(_in_window(days))
+            .group_by(BookCirculationDaily.book_id)
+            .having(func.sum(BookCirculationDaily.borrows) > 0)
+            .order_by(func.sum(BookCirculationDaily.borrows).desc(), BookCirculationDaily.book_id.desc())
+            .limit(limit)
+            .subquery()
+        )
+        rows = db.execute(
+            select(window.c.book_id, Book.name, window.c.borrows, func.coalesce(BookCirculation.on_loan, 0), Book.stock)
+            .join(Book, Book.id == window.c.book_id)
+            .outerjoin(BookCirculation, BookCirculation.book_id == window.c.book_id)
+            .order_by(window.c.borrows.desc(), window.c.book_id.desc())
+        ).all()
+
+    return [
+        {
+            "book_id": book_id,
+            "name": name,
+            "borrows": borrows,
+            "on_loan": on_loan,
+            "stock": stock,
+            "utilization": _utilization(on_loan, stock)
+        }
+        for book_id, name, borrows, on_loan, stock in rows
+    ]
+
+def book_stats_admin(book_id: int, db: Session, days: int):
+    book = db.execute(select(Book.id, Book.name, Book.stock).where(Book.id == book_id)).first()
+    if book is None:
+        raise BookNotFound()
+
+    totals = db.execute(
+        select(BookCirculation.total_borrows, BookCirculation.total_returns, BookCirculation.on_loan, BookCirculation.last_borrowed_on)
+        .where(BookCirculation.book_id == book_id)
+    ).first()
+    total_borrows, total_returns, on_loan, last_borrowed_on = totals or (0, 0, 0, None)
+
+    daily = db.execute(
+        select(BookCirculationDaily.day, BookCirculationDaily.borrows, BookCirculationDaily.returns)
+        .where(BookCirculationDaily.book_id == book_id, _in_window(days))
+        .order_by(BookCirculationDaily.day)
+    ).all()
+
+    return {
+        "book_id": book.id,
+        "name": book.name,
+        "total_borrows": total_borrows,
+        "total_returns": total_returns,
+        "on_loan": on_loan,
+        "stock": book.stock,
+        "utilization": _utilization(on_loan, book.stock),
+        "last_borrowed_on": last_borrowed_on,
+        "daily": [{"day": day, "borrows": borrows, "returns": returns} for day, borrows, returns in daily]
+    }
+
+def daily_circulation_admin(db: Session, days: int):
+    rows = db.execute(
+        select(BookCirculationDaily.day, func.sum(BookCirculationDaily.borrows), func.sum(BookCirculationDaily.returns))
+        .where(_in_window(days))
+        .group_by(BookCirculationDaily.day)
+        .order_by(BookCirculationDaily.day)
+    ).all()
+    return [{"day": day, "borrows": borrows, "returns": returns} for day, borrows, returns in rows]
+
+def circulation_summary_admin(db: Session):
+    # the totals row, and today's range of the daily key
+    on_loan, available = db.execute(select(CirculationTotals.on_loan, CirculationTotals.available)).first() or (0, 0)
+    borrows_today, returns_today = db.execute(
+        select(
+            func.coalesce(func.sum(BookCirculationDaily.borrows), 0),
+            func.coalesce(func.sum(BookCirculationDaily.returns), 0)
+        ).where(BookCirculationDaily.day == date.today())
+    ).one()
+    return {
+        "on_loan": on_loan,
+        "available": available,
+        "utilization": _utilization(on_loan, available),
+        "borrows_today": borrows_today,
+        "returns_today": returns_today
+    }
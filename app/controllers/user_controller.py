@@ -1,5 +1,9 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
+import csv
+import io
+import json
 
 from app.models.user import User
 from app.models.role import Role
@@ -8,20 +12,84 @@ from app.models.refresh_token import RefreshToken
 from app.models.audit_log import AuditLog
 
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
-from app.schemas.audit_logs import AuditAction
+from app.schemas.audit_logs import AuditAction, AuditLogFilter, AuditLogResponse
 
 from app.core.audit import log_audit
+from app.core.database import SessionLocal
+from app.core.pagination import paginate
+from app.core.response import response_columns
+from app.core.principal_cache import Principal, principal_cache
+from app.core.token_versions import token_versions
 
 from app.utils.security import hash_password
+from app.utils.hash_executor import hash_executor
 
 from app.exceptions.auth import AuthenticationError
 from app.exceptions.user import UserNotFound,UserLoanPending,UserEmailAlreadyExists
 
-def get_audit_logs_admin(db: Session):
-    data = db.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(100).all()
-    return data
+AUDIT_LOG_KEYSET = [(AuditLog.created_at, True), (AuditLog.id, True)]
 
-def update_my_profile_user(userupdateobj: UserUpdate, db: Session, current_user:User):
+AUDIT_EXPORT_COLUMNS = ["id", "action", "entity", "entity_id", "performed_by", "message", "created_at"]
+
+def _audit_log_conditions(filters: AuditLogFilter):
+    conditions = []
+    if filters.action:
+        conditions.append(AuditLog.action == filters.action.value)
+    if filters.entity:
+        conditions.append(AuditLog.entity == filters.entity)
+    if filters.entity_id is not None:
+        conditions.append(AuditLog.entity_id == filters.entity_id)
+    if filters.performed_by is not None:
+        conditions.append(AuditLog.performed_by == filters.performed_by)
+    if filters.since:
+        conditions.append(AuditLog.created_at >= filters.since)
+    if filters.until:
+        conditions.append(AuditLog.created_at < filters.until)
+    return conditions
+
+def get_audit_logs_admin(db: Session, filters: AuditLogFilter, limit: int, cursor: str | None = None):
+    query = db.query(*response_columns(AuditLogResponse, AuditLog)).filter(*_audit_log_conditions(filters))
+    logs, next_cursor = paginate(query, AUDIT_LOG_KEYSET, limit = limit, cursor = cursor, scope = filters.model_dump(mode = "json"))
+    return logs, next_cursor
+
+def export_audit_logs_admin(filters: AuditLogFilter, export_format: str, batch_size: int = 1000):
+    # runs while the response streams, after the request session is gone, so
+    # it owns its session. Plain rows with yield_per keep memory flat: the
+    # driver fetches batch_size rows at a time and nothing lands in the
+    # identity map.
+    columns = [getattr(AuditLog, name) for name in AUDIT_EXPORT_COLUMNS]
+    statement = (
+        select(*columns)
+        .where(*_audit_log_conditions(filters))
+        .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+        .execution_options(yield_per = batch_size)
+    )
+
+    db = SessionLocal()
+    try:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(AUDIT_EXPORT_COLUMNS)
+            yield buffer.getvalue()
+
+        for rows in db.execute(statement).partitions():
+            if export_format == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    [*row[:-1], row.created_at.isoformat() if row.created_at else ""] for row in rows
+                )
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(dict(row._mapping), default = lambda value: value.isoformat()) + "\n" for row in rows
+                )
+    finally:
+        db.close()
+
+def update_my_profile_user(userupdateobj: UserUpdate, db: Session, current_user:Principal):
+    
+    user = db.query(User).filter(User.id == current_user.id).first()
     
     updated_data = userupdateobj.model_dump(exclude_unset=True)
     
@@ -34,42 +102,48 @@ def update_my_profile_user(userupdateobj: UserUpdate, db: Session, current_user:
             raise UserEmailAlreadyExists()
     
     for k,v in updated_data.items():
-        setattr(current_user,k,v)
+        setattr(user,k,v)
     
-    current_user.updated_at = datetime.now()
+    user.updated_at = datetime.now()
     
     # Audit user updation 
     log_audit(
         db,
         action=AuditAction.USER_UPDATED,
         entity="User",
-        entity_id=current_user.id,
-        performed_by=current_user.id,
-        message=f"User {current_user.email} updated by himself/herself."
+        entity_id=user.id,
+        performed_by=user.id,
+        message=f"User {user.email} updated by himself/herself."
     )
     
     db.commit()
-    db.refresh(current_user)
+    db.refresh(user)
+    
+    principal_cache.invalidate_user(user.id)
 
-    return current_user
+    return user
 
-def delete_profile_user(db: Session, current_user: User):
+def delete_profile_user(db: Session, current_user: Principal):
     # checking the loan history of the user before removing
     loans_history = db.query(Loan).filter(Loan.user_id == current_user.id, Loan.is_active == True).first()
     
     if loans_history:
         raise UserLoanPending()
     
+    user = db.query(User).filter(User.id == current_user.id).first()
+    
     # soft delete the user
-    current_user.is_active = False # db.delete(user)
-    current_user.deleted_at = datetime.now()
-    current_user.deleted_by = current_user.id
+    user.is_active = False # db.delete(user)
+    user.deleted_at = datetime.now()
+    user.deleted_by = user.id
+    # outstanding access tokens carry the old version
+    user.token_version = (user.token_version or 0) + 1
     
     # revoking the refresh tokens 
     db.query(RefreshToken).filter(
         RefreshToken.user_id == current_user.id,
         RefreshToken.is_revoked == False
-    ).update({"is_revoked": True},synchronize_session=False)
+    ).update({"is_revoked": True, "revoked_at": datetime.now()},synchronize_session=False)
     
     # Audit user deletion
     log_audit(
@@ -83,9 +157,12 @@ def delete_profile_user(db: Session, current_user: User):
     
     db.commit()
     
+    principal_cache.invalidate_user(current_user.id)
+    token_versions.invalidate(current_user.id)
+    
     return
 
-def create_user_admin(user: UserCreate, db: Session, current_user: User):
+def create_user_admin(user: UserCreate, db: Session, current_user: Principal, password_hash: str | None = None):
     # Check if email already exists
     existing_user = db.query(User).filter(User.email == user.email.strip().lower(), User.is_active == True).first()
     
@@ -101,7 +178,7 @@ def create_user_admin(user: UserCreate, db: Session, current_user: User):
     db_user = User(
         name=user.name,
         email=user.email.strip().lower(),
-        password_hash=hash_password(user.password),
+        password_hash=password_hash or hash_executor.run(hash_password, user.password),
         role_id=user.role_id
     )
 
@@ -123,9 +200,10 @@ def create_user_admin(user: UserCreate, db: Session, current_user: User):
     
     return db_user
 
-def get_all_users_admin(db: Session):
-    allUsers = db.query(User).filter(User.is_active==True).all()
-    return allUsers
+def get_all_users_admin(db: Session, limit: int, cursor: str | None = None):
+    query = db.query(*response_columns(UserResponse, User)).filter(User.is_active==True)
+    allUsers, next_cursor = paginate(query, [(User.id, False)], limit = limit, cursor = cursor)
+    return allUsers, next_cursor
 
 def get_user_by_id_admin(userid: int, db:Session):
     user= db.query(User).filter(User.id == userid,User.is_active==True).first()
@@ -133,7 +211,7 @@ def get_user_by_id_admin(userid: int, db:Session):
         raise UserNotFound()        
     return user
 
-def update_user_by_id_admin(userid: int, updateuserobj: UserUpdate, db: Session, current_user: User):
+def update_user_by_id_admin(userid: int, updateuserobj: UserUpdate, db: Session, current_user: Principal):
     
     user = db.query(User).filter(User.id == userid,User.is_active==True).first()
     
@@ -167,9 +245,11 @@ def update_user_by_id_admin(userid: int, updateuserobj: UserUpdate, db: Session,
     db.commit()
     db.refresh(user)
     
+    principal_cache.invalidate_user(user.id)
+    
     return user
 
-def delete_user_admin(userid: int, db:Session, current_user: User):
+def delete_user_admin(userid: int, db:Session, current_user: Principal):
     
     user = db.query(User).filter(User.id == userid,User.is_active==True).first()
     
@@ -186,12 +266,14 @@ def delete_user_admin(userid: int, db:Session, current_user: User):
     user.is_active = False # db.delete(user)
     user.deleted_at = datetime.now()
     user.deleted_by = current_user.id
+    # outstanding access tokens carry the old version
+    user.token_version = (user.token_version or 0) + 1
     
     # revoking the refresh tokens 
     db.query(RefreshToken).filter(
         RefreshToken.user_id == user.id,
         RefreshToken.is_revoked == False
-    ).update({"is_revoked": True})
+    ).update({"is_revoked": True, "revoked_at": datetime.now()})
     
     # Audit user deletion 
     log_audit(
@@ -205,4 +287,7 @@ def delete_user_admin(userid: int, db:Session, current_user: User):
     
     db.commit()
     
+    principal_cache.invalidate_user(user.id)
+    token_versions.invalidate(user.id)
+    
     return 
\ No newline at end of file
@@ -0,0 +1,60 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import threading
+
+from app.core.config import get_settings
+from app.core.database import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ECHO
+from app.core.metrics import register_engine
+
+# same database as the sync engine, reached through an asyncio driver:
+# sqlite, sqlite+pysqlite and sqlite+pysqlcipher all become sqlite+aiosqlite
+_ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+_ASYNC_DRIVER_NAMES = frozenset(("aiomysql", "asyncmy", "aiosqlite", "asyncpg", "psycopg"))
+
+def to_async_url(url: str):
+    scheme, sep, rest = url.partition("://")
+    dialect, _, driver = scheme.partition("+")
+    if dialect in _ASYNC_DRIVERS and driver not in _ASYNC_DRIVER_NAMES:
+        scheme = f"{dialect}+{_ASYNC_DRIVERS[dialect]}"
+    return f"{scheme}{sep}{rest}"
+
+ASYNC_DATABASE_URL = get_settings().async_database_url or to_async_url(DATABASE_URL)
+
+# created on first use like the sync engine
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                engine = create_async_engine(ASYNC_DATABASE_URL, echo=DB_ECHO, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+                register_engine("async", engine)
+                _async_engine = engine
+    return _async_engine
+
+def __getattr__(name):
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class LazyAsyncSessionmaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+# objects handed back to the routes must stay readable after commit, lazy
+# refreshes outside of run_sync are not possible on an async session
+AsyncSessionLocal = LazyAsyncSessionmaker(
+    autoflush=False,
+    expire_on_commit=False
+)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,4 +1,157 @@
+from datetime import datetime
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
 from app.models.audit_log import AuditLog
+from app.schemas.audit_logs import AuditAction
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# "sync" adds the row to the caller's transaction (the old behaviour),
+# "async" hands committed events to the background writer
+AUDIT_MODE = _settings.audit_mode
+AUDIT_QUEUE_SIZE = _settings.audit_queue_size
+AUDIT_BATCH_SIZE = _settings.audit_batch_size
+AUDIT_FLUSH_INTERVAL = _settings.audit_flush_interval
+AUDIT_MAX_RETRIES = _settings.audit_max_retries
+
+# always written in the caller's transaction, even in async mode
+DURABLE_ACTIONS = frozenset({
+    AuditAction.USER_DELETED,
+    AuditAction.USER_SELF_DELETED,
+    AuditAction.TOKEN_REVOKED,
+})
+
+_PENDING_KEY = "pending_audit"
+
+class AuditWriter:
+    # events wait in a bounded queue and are written with one multi-row
+    # insert per batch, on AUDIT_BATCH_SIZE events or AUDIT_FLUSH_INTERVAL,
+    # whichever comes first. When the queue is full the event is written
+    # synchronously instead of being dropped.
+
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float, max_retries: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize = queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "sync_fallbacks": 0,
+            "failed_flushes": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target = self._run, name = "audit-writer", daemon = True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        # the worker drains whatever is queued before it exits
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, rows: list[dict]):
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+                self._count("enqueued")
+            except queue.Full:
+                self._count("sync_fallbacks")
+                self._write([row])
+
+    def stats(self):
+        with self._lock:
+            return {"queue_depth": self._queue.qsize(), **self._stats}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _take_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout = timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+        while batch := self._drain():
+            self._flush(batch)
+
+    def _flush(self, batch: list[dict]):
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception:
+                self._count("failed_flushes")
+                logger.exception("audit flush of %s events failed (attempt %s)", len(batch), attempt)
+                time.sleep(min(attempt, 5))
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_flush_ms"] = round(elapsed, 3)
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], round(elapsed, 3))
+            return
+        self._count("dropped", len(batch))
+        logger.error("dropped %s audit events after %s attempts", len(batch), self.max_retries)
+
+    def _write(self, rows: list[dict]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(AuditLog.__table__), rows)
+            db.commit()
+        finally:
+            db.close()
+
+audit_writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_MAX_RETRIES)
 
 def log_audit(
     db,
@@ -6,14 +159,53 @@ def log_audit(
     entity: str,
     entity_id: int | None = None,
     performed_by: int | None = None,
-    message: str | None = None
+    message: str | None = None,
+    durable: bool | None = None
 ):
-    
-    audit = AuditLog(
-        action=action,
-        entity=entity,
-        entity_id=entity_id,
-        performed_by=performed_by,
-        message=message
-    )
-    db.add(audit)
\ No newline at end of file
+    # db may be a Session or an AsyncSession, both expose .info and .add
+    if durable is None:
+        durable = action in DURABLE_ACTIONS
+
+    row = {
+        "action": action,
+        "entity": entity,
+        "entity_id": entity_id,
+        "performed_by": performed_by,
+        "message": message,
+        "created_at": datetime.now()
+    }
+
+    if AUDIT_MODE != "async" or durable or not audit_writer.running:
+        db.add(AuditLog(**row))
+        return
+
+    # held until the caller's transaction commits, so a rolled back
+    # request never leaves an audit row behind
+    db.info.setdefault(_PENDING_KEY, []).append(row)
+
+def log_audit_many(db, events: list[dict], durable: bool = False):
+    # events are dicts of log_audit's arguments, written with one multi-row
+    # insert in the caller's transaction (or queued, like log_audit)
+    now = datetime.now()
+    rows = [
+        {"entity_id": None, "performed_by": None, "message": None, **event, "created_at": now}
+        for event in events
+    ]
+    if not rows:
+        return
+
+    if AUDIT_MODE != "async" or durable or not audit_writer.running:
+        db.execute(insert(AuditLog.__table__), rows)
+        return
+
+    db.info.setdefault(_PENDING_KEY, []).extend(rows)
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session):
+    rows = session.info.pop(_PENDING_KEY, None)
+    if rows:
+        audit_writer.enqueue(rows)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,64 @@
+from importlib import import_module
+
+from starlette.concurrency import run_in_threadpool
+
+# The routers in app.api are written once against a backend: the session
+# dependency, the auth dependencies and the controllers are the only parts
+# that differ between DB_MODE=sync and DB_MODE=async. Every controller is
+# awaited either way, by name: book_controller.search_books_cached in sync
+# mode, async_book_controller.search_books_cached_async in async mode.
+
+class _ThreadpoolControllers:
+    # the sync controllers on the threadpool, where the plain def routes ran them
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        fn = getattr(self._module, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(fn, *args, **kwargs)
+        return call
+
+class _AsyncControllers:
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        return getattr(self._module, f"{name}_async")
+
+class SyncBackend:
+    mode = "sync"
+
+    def __init__(self):
+        from app.core.database import get_db
+        from app.core.dependencies import require_roles
+        from app.controllers.auth_controller import get_current_user
+
+        self.get_db = get_db
+        self.require_roles = require_roles
+        self.get_current_user = get_current_user
+
+    def controllers(self, name: str):
+        return _ThreadpoolControllers(import_module(f"app.controllers.{name}"))
+
+class AsyncBackend:
+    mode = "async"
+
+    def __init__(self):
+        # imported here so the sync mode never needs an asyncio driver
+        from app.core.async_database import get_async_db
+        from app.core.dependencies import require_roles_async
+        from app.controllers.async_auth_controller import get_current_user_async
+
+        self.get_db = get_async_db
+        self.require_roles = require_roles_async
+        self.get_current_user = get_current_user_async
+
+    def controllers(self, name: str):
+        return _AsyncControllers(import_module(f"app.controllers.async_{name}"))
+
+def get_backend(mode: str):
+    return AsyncBackend() if mode == "async" else SyncBackend()
@@ -0,0 +1,216 @@
+import csv
+import itertools
+import json
+
+from pydantic import ValidationError
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.book import Book
+from app.models.loan import Loan
+from app.schemas.book import BookCreate
+from app.core.search import index_books
+from app.core.catalog_version import mark_catalog_changed
+from app.core.circulation import record_stock
+
+IMPORT_CHUNK_SIZE = 1000
+# per-row errors kept in the report, the counters stay exact past it
+IMPORT_MAX_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+
+def detect_format(filename: str | None, default: str = "csv"):
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+def iter_records(lines, data_format: str):
+    # (row number, dict or error message), lines are read lazily so a file
+    # of any size goes through in constant memory
+    if data_format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for number, line in enumerate(lines, start = 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield number, "Expected a JSON object"
+            continue
+        yield number, record
+
+def _validate(record):
+    book = BookCreate.model_validate(record)
+    book.name = book.name.strip()
+    book.isbn = book.isbn.strip()
+    # the column limits and the stock check constraint, caught here so one
+    # bad row can not fail the multi-row statement of its whole chunk
+    if not book.name or len(book.name) > Book.name.type.length:
+        raise ValueError(f"name must be 1-{Book.name.type.length} characters")
+    if not book.isbn or len(book.isbn) > Book.isbn.type.length:
+        raise ValueError(f"isbn must be 1-{Book.isbn.type.length} characters")
+    if book.stock < 0:
+        raise ValueError("stock must not be negative")
+    return book
+
+def _error_message(exc: Exception):
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in exc.errors())
+    return str(exc)
+
+def _upsert_statement(dialect: str):
+    # Core statements run as executemany: one compiled statement for every
+    # chunk (a multi-VALUES statement would be recompiled per chunk size),
+    # and pymysql rewrites an executemany INSERT into multi-row VALUES itself
+    table = Book.__table__
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update(
+            name = statement.inserted.name,
+            stock = statement.inserted.stock,
+            version = table.c.version + 1
+        )
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements = [table.c.isbn],
+        set_ = {"name": statement.excluded.name, "stock": statement.excluded.stock, "version": table.c.version + 1}
+    )
+
+def _write_chunk(db: Session, books: dict[str, BookCreate]):
+    # books is keyed by isbn, returns the isbns that already existed. The
+    # feed's stock is the copies the library owns, books.stock the copies on
+    # the shelf: an existing book keeps its loans out of it.
+    isbns = list(books)
+    # locked, the stock they are replacing goes into the circulation totals,
+    # and no borrow of them can commit between the loan count and the write
+    old_stock = dict(db.execute(select(Book.isbn, Book.stock).where(Book.isbn.in_(isbns)).with_for_update()).all())
+    existing = set(old_stock)
+    on_loan = {}
+    if existing:
+        on_loan = dict(db.execute(
+            select(Book.isbn, func.count(Loan.id))
+            .join(Loan, Loan.book_id == Book.id)
+            .where(Book.isbn.in_(existing), Loan.is_active == True)
+            .group_by(Book.isbn)
+        ).all())
+    rows = [{"name": b.name, "isbn": b.isbn, "stock": max(b.stock - on_loan.get(b.isbn, 0), 0)} for b in books.values()]
+
+    statement = _upsert_statement(db.get_bind().dialect.name)
+    if statement is not None:
+        db.execute(statement, rows)
+    else:
+        new_rows = [row for row in rows if row["isbn"] not in existing]
+        if new_rows:
+            db.execute(Book.__table__.insert(), new_rows)
+        for row in rows:
+            if row["isbn"] in existing:
+                db.execute(
+                    update(Book)
+                    .where(Book.isbn == row["isbn"])
+                    .values(name = row["name"], stock = row["stock"], version = Book.version + 1)
+                )
+
+    written = db.execute(select(Book.id, Book.name, Book.isbn).where(Book.isbn.in_(isbns))).all()
+    index_books(db, written)
+    mark_catalog_changed(db, [b.id for b in written])
+    record_stock(db, sum(row["stock"] for row in rows) - sum(old_stock.values()))
+    return existing
+
+def import_books(db: Session, records, chunk_size: int = IMPORT_CHUNK_SIZE):
+    # records come from iter_records. Rows are validated with BookCreate and
+    # upserted on isbn one chunk per statement and per commit, so a failure
+    # only costs its own chunk and the import can be re-run safely.
+    report = {"received": 0, "inserted": 0, "updated": 0, "duplicates": 0, "failed": 0, "errors": []}
+
+    def fail(number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": number, "error": message})
+
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        books = {}
+        numbers = {}
+        for number, record in chunk:
+            report["received"] += 1
+            if isinstance(record, str):
+                fail(number, record)
+                continue
+            try:
+                book = _validate(record)
+            except (ValidationError, ValueError) as exc:
+                fail(number, _error_message(exc))
+                continue
+            # a repeated isbn in the feed: the later row wins
+            if book.isbn in books:
+                report["duplicates"] += 1
+            books[book.isbn] = book
+            numbers[book.isbn] = number
+
+        if not books:
+            continue
+
+        try:
+            existing = _write_chunk(db, books)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            existing = _write_rows(db, books, numbers, fail)
+
+        report["updated"] += len(existing)
+        report["inserted"] += len(books) - len(existing)
+
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    return report
+
+def _write_rows(db: Session, books: dict[str, BookCreate], numbers: dict[str, int], fail):
+    # the chunk statement failed, find the offending rows one at a time
+    existing = set()
+    for isbn, book in list(books.items()):
+        try:
+            existing |= _write_chunk(db, {isbn: book})
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            del books[isbn]
+            fail(numbers[isbn], str(exc.orig) if getattr(exc, "orig", None) else str(exc))
+    return existing
+
+if __name__ == "__main__":
+    # python -m app.core.book_import feed.csv [--format csv|ndjson]
+    import argparse
+
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description = "Bulk import books, upserting on isbn")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices = FORMATS)
+    parser.add_argument("--chunk-size", type = int, default = IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.path, newline = "", encoding = "utf-8") as feed:
+            data_format = args.format or detect_format(args.path)
+            report = import_books(db, iter_records(feed, data_format), chunk_size = args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent = 2))
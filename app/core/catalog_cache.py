@@ -0,0 +1,273 @@
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_ENABLED = _settings.catalog_cache_enabled
+CATALOG_CACHE_SIZE = _settings.catalog_cache_size
+CATALOG_CACHE_TTL = _settings.catalog_cache_ttl
+# entries live this long in the in-process tier when a shared tier is set
+CATALOG_CACHE_LOCAL_TTL = _settings.catalog_cache_local_ttl
+# "redis://host:6379/0" for a cache shared by every worker, empty for none
+CATALOG_CACHE_URL = _settings.catalog_cache_url
+# how long a request waits for another request loading the same key
+CATALOG_CACHE_WAIT = _settings.catalog_cache_wait
+
+_MISS = object()
+_FAILED = object()
+
+class LocalBackend:
+    # bounded LRU with a per-entry TTL
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value, ttl: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    # the shared tier, values are stored as JSON
+
+    def __init__(self, url: str):
+        # imported here, redis is only needed when a shared cache is configured
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value, ttl: float):
+        self._client.set(key, json.dumps(value, separators = (",", ":")), ex = max(1, round(ttl)))
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _FAILED
+
+class CatalogCache:
+    # read-through cache for book entities and search result pages.
+    #
+    # Keys embed the versions the database keeps: "book:<id>:<books.version>"
+    # and "search:<catalog version>:<normalized query>", the same numbers the
+    # ETags are made of, read by the request before it looks anything up. A
+    # committed write moves them on, so every worker stops looking up the old
+    # entries at once and they simply age out; nothing has to be found and
+    # deleted, and nothing has to be shared between workers to stay correct.
+    # Concurrent misses on one key are coalesced into one load.
+    #
+    # Values must be plain JSON data and are shared between callers, which
+    # must not mutate them.
+
+    def __init__(self, local: LocalBackend, shared = None, ttl: float = 30,
+                 local_ttl: float = 5, enabled: bool = True, wait: float = 5):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.local_ttl = local_ttl if shared is not None else ttl
+        self.enabled = enabled
+        self.wait = wait
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "backend_errors": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["size"] = self.local.size()
+        stats["evictions"] = self.local.evictions
+        return stats
+
+    # keys
+
+    def book_key(self, book_id: int, version: int | None):
+        # None (no such book) skips the cache, the loader reports it
+        return None if version is None else f"book:{book_id}:{version}"
+
+    def search_key(self, version: int | None, params: dict):
+        if version is None:
+            return None
+        digest = hashlib.blake2b(json.dumps(params, sort_keys = True, default = str).encode(), digest_size = 16).hexdigest()
+        return f"search:{version}:{digest}"
+
+    # lookups
+
+    def _lookup(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception:
+                self._count("backend_errors")
+                logger.exception("catalog cache read failed")
+                return _MISS
+            if value is not None:
+                self.local.set(key, value, self._jitter(self.local_ttl))
+                return value
+        return _MISS
+
+    def _store(self, key: str, value):
+        # a little jitter keeps entries filled together from expiring together
+        self.local.set(key, value, self._jitter(self.local_ttl))
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, self._jitter(self.ttl))
+            except Exception:
+                self._count("backend_errors")
+                logger.exception("catalog cache write failed")
+
+    @staticmethod
+    def _jitter(ttl: float):
+        return ttl * random.uniform(0.9, 1.0)
+
+    def get_or_load(self, key: str | None, loader):
+        # loader() runs once per key however many threads miss at the same time
+        if not self.enabled or key is None:
+            return loader()
+
+        value = self._lookup(key)
+        if value is not _MISS:
+            self._count("hits")
+            return value
+        self._count("misses")
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._count("coalesced")
+            if flight.done.wait(self.wait) and flight.value is not _FAILED:
+                return flight.value
+            # the leader failed (a 404 say) or is too slow, load it ourselves
+            return loader()
+
+        try:
+            value = self._load(loader)
+            self._store(key, value)
+            flight.value = value
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def get_or_load_async(self, key: str | None, loader):
+        # the event loop version, loader is a coroutine function. Waiting on
+        # a threading.Event here would block the loop the leader runs on.
+        if not self.enabled or key is None:
+            return await loader()
+
+        value = self._lookup(key)
+        if value is not _MISS:
+            self._count("hits")
+            return value
+        self._count("misses")
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self._count("coalesced")
+            try:
+                value = await asyncio.wait_for(asyncio.shield(flight), self.wait)
+            except asyncio.TimeoutError:
+                value = _FAILED
+            if value is not _FAILED:
+                return value
+            return await loader()
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = flight
+        value = _FAILED
+        try:
+            self._count("loads")
+            try:
+                value = await loader()
+            except BaseException:
+                self._count("load_errors")
+                raise
+            self._store(key, value)
+            return value
+        finally:
+            self._async_flights.pop(key, None)
+            flight.set_result(value)
+
+    def _load(self, loader):
+        self._count("loads")
+        try:
+            return loader()
+        except BaseException:
+            self._count("load_errors")
+            raise
+
+    def clear(self):
+        self.local.clear()
+
+def _shared_backend():
+    if not CATALOG_CACHE_URL:
+        return None
+    return RedisBackend(CATALOG_CACHE_URL)
+
+catalog_cache = CatalogCache(
+    LocalBackend(CATALOG_CACHE_SIZE),
+    shared = _shared_backend(),
+    ttl = CATALOG_CACHE_TTL,
+    local_ttl = CATALOG_CACHE_LOCAL_TTL,
+    enabled = CATALOG_CACHE_ENABLED,
+    wait = CATALOG_CACHE_WAIT
+)
@@ -0,0 +1,56 @@
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.catalog_version import CatalogVersion
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+_CHANGED_KEY = "catalog_changed"
+
+# the version is spread over this many rows, summed on read. Every borrow
+# and return changes a listed stock, with one row every circulating
+# transaction would queue on the same row lock; with shards only changes to
+# books of the same shard wait for each other.
+CATALOG_VERSION_SHARDS = _settings.catalog_version_shards
+
+def version_shard(book_id: int):
+    return 1 + book_id % CATALOG_VERSION_SHARDS
+
+def mark_catalog_changed(db: Session, book_ids = ()):
+    # the shards are bumped once, right before the commit, so their rows are
+    # locked for as short as possible and only by transactions that commit.
+    # The new version is also what retires the catalog cache's entries.
+    db.info.setdefault(_CHANGED_KEY, set()).update(book_ids)
+
+def get_catalog_version(db: Session):
+    # strictly grows with every committed change, whichever shard it bumped
+    version = db.execute(select(func.sum(CatalogVersion.version))).scalar()
+    return int(version or 0)
+
+def bump_catalog_version(db: Session, book_ids = ()):
+    # sorted, so two transactions bumping the same shards lock them in order
+    shards = sorted({version_shard(book_id) for book_id in book_ids}) or [1]
+    result = db.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.id.in_(shards))
+        .values(version = CatalogVersion.version + 1)
+    )
+    if result.rowcount == len(shards):
+        return
+    # m0010 creates the rows, this covers a shard count raised since
+    existing = set(db.execute(select(CatalogVersion.id).where(CatalogVersion.id.in_(shards))).scalars())
+    missing = [{"id": shard, "version": 1} for shard in shards if shard not in existing]
+    if missing:
+        db.execute(insert(CatalogVersion), missing)
+
+@event.listens_for(Session, "before_commit")
+def _bump_on_commit(session):
+    if _CHANGED_KEY in session.info:
+        bump_catalog_version(session, session.info[_CHANGED_KEY])
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset(session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,197 @@
+from datetime import date
+
+from sqlalchemy import case, delete, event, func, insert, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.core.metrics import loan_events
+from app.models.book import Book
+from app.models.circulation_stats import BookCirculation, BookCirculationDaily, CirculationTotals
+from app.models.loan import Loan
+
+_DELTAS_KEY = "circulation_deltas"
+_STOCK_KEY = "circulation_stock"
+_COMMITTING_KEY = "circulation_committing"
+
+def record_borrows(db: Session, book_ids):
+    _record(db, book_ids, 0)
+
+def record_returns(db: Session, book_ids):
+    _record(db, book_ids, 1)
+
+def _record(db: Session, book_ids, slot: int):
+    # counted in session.info and written once, right before the commit, as
+    # part of the same transaction as the loans they describe
+    deltas = db.info.setdefault(_DELTAS_KEY, {})
+    for book_id in book_ids:
+        deltas.setdefault(book_id, [0, 0])[slot] += 1
+
+def record_stock(db: Session, amount: int):
+    # copies added to or taken out of the catalog by book writes. Borrows and
+    # returns are not reported here, each one moves a copy by itself.
+    if amount:
+        db.info[_STOCK_KEY] = db.info.get(_STOCK_KEY, 0) + amount
+
+def _increment_statement(dialect: str, table, keys: list[str], counters: list[str], extra: dict | None = None):
+    # INSERT the deltas, or add them to the row that is already there
+    extra = extra or {}
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        statement = dialect_insert(table)
+        return statement.on_duplicate_key_update(
+            **{c: table.c[c] + statement.inserted[c] for c in counters},
+            **{c: value(statement.inserted) for c, value in extra.items()}
+        )
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    statement = dialect_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements = [table.c[k] for k in keys],
+        set_ = {
+            **{c: table.c[c] + statement.excluded[c] for c in counters},
+            **{c: value(statement.excluded) for c, value in extra.items()}
+        }
+    )
+
+def _last_borrowed(new):
+    # COALESCE keeps the old day when this transaction only returned copies
+    table = BookCirculation.__table__
+    return func.coalesce(new.last_borrowed_on, table.c.last_borrowed_on)
+
+def apply_deltas(db: Session, deltas: dict, today: date | None = None):
+    today = today or date.today()
+    dialect = db.get_bind().dialect.name
+    # sorted so concurrent transactions lock the rows in the same order
+    book_ids = sorted(deltas)
+    totals = [
+        {
+            "book_id": book_id,
+            "total_borrows": deltas[book_id][0],
+            "total_returns": deltas[book_id][1],
+            "on_loan": deltas[book_id][0] - deltas[book_id][1],
+            "last_borrowed_on": today if deltas[book_id][0] else None
+        }
+        for book_id in book_ids
+    ]
+    daily = [
+        {"day": today, "book_id": book_id, "borrows": deltas[book_id][0], "returns": deltas[book_id][1]}
+        for book_id in book_ids
+    ]
+
+    statement = _increment_statement(
+        dialect, BookCirculation.__table__, ["book_id"],
+        ["total_borrows", "total_returns", "on_loan"], {"last_borrowed_on": _last_borrowed}
+    )
+    if statement is None:
+        _update_or_insert(db, BookCirculation, totals, ["book_id"], ["total_borrows", "total_returns", "on_loan"])
+    else:
+        db.execute(statement, totals)
+
+    statement = _increment_statement(dialect, BookCirculationDaily.__table__, ["day", "book_id"], ["borrows", "returns"])
+    if statement is None:
+        _update_or_insert(db, BookCirculationDaily, daily, ["day", "book_id"], ["borrows", "returns"])
+    else:
+        db.execute(statement, daily)
+
+def apply_totals(db: Session, deltas: dict, stock: int = 0):
+    # every borrow took a copy off the shelf and every return put one back
+    borrows = sum(d[0] for d in deltas.values())
+    returns = sum(d[1] for d in deltas.values())
+    result = db.execute(
+        update(CirculationTotals)
+        .where(CirculationTotals.id == 1)
+        .values(
+            on_loan = CirculationTotals.on_loan + borrows - returns,
+            available = CirculationTotals.available + stock - borrows + returns
+        )
+        .execution_options(synchronize_session = False)
+    )
+    if result.rowcount == 0:
+        # m0011 creates the row; the tables already hold this transaction's
+        # changes, so counting them gives the right start
+        rebuild_circulation_totals(db)
+
+def _update_or_insert(db: Session, model, rows: list[dict], keys: list[str], counters: list[str]):
+    for row in rows:
+        values = {c: getattr(model, c) + row[c] for c in counters}
+        values.update({c: v for c, v in row.items() if c not in keys and c not in counters and v is not None})
+        result = db.execute(
+            update(model)
+            .where(*[getattr(model, k) == row[k] for k in keys])
+            .values(**values)
+            .execution_options(synchronize_session = False)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(model.__table__), row)
+
+@event.listens_for(Session, "before_commit")
+def _apply_on_commit(session):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    stock = session.info.pop(_STOCK_KEY, 0)
+    if deltas:
+        apply_deltas(session, deltas)
+        session.info[_COMMITTING_KEY] = deltas
+    # last, every transaction locks the one totals row after its book rows
+    if deltas or stock:
+        apply_totals(session, deltas or {}, stock)
+
+@event.listens_for(Session, "after_commit")
+def _count_on_commit(session):
+    # counted once the loans are really in, not when they were attempted
+    deltas = session.info.pop(_COMMITTING_KEY, None)
+    if deltas:
+        loan_events.inc("borrowed", amount = sum(d[0] for d in deltas.values()))
+        loan_events.inc("returned", amount = sum(d[1] for d in deltas.values()))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_DELTAS_KEY, None)
+    session.info.pop(_STOCK_KEY, None)
+    session.info.pop(_COMMITTING_KEY, None)
+
+def rebuild_circulation_stats(db: Session):
+    # recomputes both tables from the loans, one aggregate scan each. For
+    # the initial backfill; concurrent borrows and returns would be counted
+    # twice or not at all, so it runs before the app takes traffic.
+    db.execute(delete(BookCirculationDaily))
+    db.execute(delete(BookCirculation))
+
+    totals = (
+        select(
+            Loan.book_id,
+            func.count(),
+            func.count(Loan.returned_at),
+            func.coalesce(func.sum(case((Loan.is_active == True, 1), else_ = 0)), 0),
+            func.max(Loan.borrow_issue_date)
+        )
+        .where(Loan.book_id.is_not(None))
+        .group_by(Loan.book_id)
+    )
+    db.execute(insert(BookCirculation.__table__).from_select(
+        ["book_id", "total_borrows", "total_returns", "on_loan", "last_borrowed_on"], totals
+    ))
+
+    events = union_all(
+        select(Loan.borrow_issue_date.label("day"), Loan.book_id, literal(1).label("b"), literal(0).label("r"))
+        .where(Loan.book_id.is_not(None)),
+        select(Loan.returned_at.label("day"), Loan.book_id, literal(0).label("b"), literal(1).label("r"))
+        .where(Loan.book_id.is_not(None), Loan.returned_at.is_not(None))
+    ).subquery()
+    daily = select(events.c.day, events.c.book_id, func.sum(events.c.b), func.sum(events.c.r)).group_by(events.c.day, events.c.book_id)
+    db.execute(insert(BookCirculationDaily.__table__).from_select(["day", "book_id", "borrows", "returns"], daily))
+    rebuild_circulation_totals(db)
+    db.commit()
+
+def rebuild_circulation_totals(db: Session):
+    # the totals row from book_circulation and books, in the caller's transaction
+    db.execute(delete(CirculationTotals))
+    totals = select(
+        literal(1),
+        select(func.coalesce(func.sum(BookCirculation.on_loan), 0)).scalar_subquery(),
+        select(func.coalesce(func.sum(Book.stock), 0)).scalar_subquery()
+    )
+    db.execute(insert(CirculationTotals.__table__).from_select(["id", "on_loan", "available"], totals))
@@ -1,13 +1,50 @@
 from fastapi import HTTPException, status, Depends
-from app.api.auth import get_current_user
-from app.models.user import User
+from app.controllers.auth_controller import get_current_user, get_token_claims
+from app.core.principal_cache import Principal, TokenClaims
 from app.core.roles import Roles
 from app.exceptions.auth import AuthorizationError
+from app.core.config import get_settings
 
+_settings = get_settings()
+
+# trust the signed "role"/"ver" claims of the access token instead of loading
+# the user, role checks then need no database access
+ROLE_CLAIMS_MODE = _settings.role_claims_mode
+
+def _forbidden():
+    return AuthorizationError(message = "You do not have permissions to perform this action!")
 
 def require_roles(*allowed_roles: Roles):
-    def role_checker(current_user: User = Depends(get_current_user)):
-        if current_user.role.name not in [i.value for i in allowed_roles]:
-            raise AuthorizationError(message = "You do not have permissions to perform this action!")
+    allowed = frozenset(i.value for i in allowed_roles)
+
+    if ROLE_CLAIMS_MODE:
+        def role_checker(claims: TokenClaims = Depends(get_token_claims)):
+            if claims.role_name not in allowed:
+                raise _forbidden()
+            return claims
+        return role_checker
+
+    def role_checker(current_user: Principal = Depends(get_current_user)):
+        if current_user.role_name not in allowed:
+            raise _forbidden()
+        return current_user
+    return role_checker
+
+def require_roles_async(*allowed_roles: Roles):
+    # imported here so the sync mode never needs an asyncio driver
+    from app.controllers.async_auth_controller import get_current_user_async, get_token_claims_async
+
+    allowed = frozenset(i.value for i in allowed_roles)
+
+    if ROLE_CLAIMS_MODE:
+        async def role_checker(claims: TokenClaims = Depends(get_token_claims_async)):
+            if claims.role_name not in allowed:
+                raise _forbidden()
+            return claims
+        return role_checker
+
+    async def role_checker(current_user: Principal = Depends(get_current_user_async)):
+        if current_user.role_name not in allowed:
+            raise _forbidden()
         return current_user
-    return role_checker
\ No newline at end of file
+    return role_checker
@@ -0,0 +1,46 @@
+import hashlib
+
+from fastapi import Request
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# Cache-Control sent with each conditional route, "no-cache" lets clients
+# keep the body but revalidate it (a cheap 304) on every use
+CACHE_CONTROL = {
+    "books": _settings.cache_control_books,
+    "book": _settings.cache_control_book,
+}
+
+class NotModified(Exception):
+    # raised from a route dependency, so neither the rate limiter nor the
+    # route itself runs for a client that already has the current body
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+def catalog_etag(version: int, request: Request):
+    # the listing depends only on the catalog and the query string
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+    return f'"c{version}-{digest}"'
+
+def book_etag(book_id: int, version: int):
+    return f'"b{book_id}-{version}"'
+
+def etag_matches(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # only a tag the client got from us skips the rate limiter. "*" proves
+    # nothing: answering it here would give anyone unlimited catalog reads,
+    # so it is served (and counted) like a request without the header.
+    # If-None-Match uses the weak comparison
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def conditional_headers(request: Request, etag: str, route: str):
+    # the headers for the 200 response, or NotModified when they match
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL[route]}
+    if etag_matches(request, etag):
+        raise NotModified(headers)
+    return headers
@@ -0,0 +1,53 @@
+import logging
+import threading
+
+from app.core.database import get_engine
+from app.core.migrations import DatabaseLock
+
+logger = logging.getLogger(__name__)
+
+class PeriodicJob:
+    # runs fn() every `interval` seconds on a daemon thread until stopped.
+    # Every worker runs its own copy; a job that must not run in two of them
+    # at once names a database lock, and a worker that finds it held skips
+    # its turn.
+
+    def __init__(self, name: str, interval: float, fn, lock: str | None = None):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.lock = lock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        # False when another worker held the lock and this run was skipped
+        if self.lock is None:
+            self.fn()
+            return True
+        with DatabaseLock(get_engine(), self.lock) as lock:
+            if not lock.acquired:
+                logger.debug("job %s skipped, another worker holds %s", self.name, self.lock)
+                return False
+            self.fn()
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("job %s failed", self.name)
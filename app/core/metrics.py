@@ -0,0 +1,303 @@
+from bisect import bisect_left
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# Prometheus text exposition without prometheus_client. The numbers are per
+# process: with several workers every one of them serves its own /metrics,
+# scrape each (or run one worker per container) and let Prometheus sum them.
+METRICS_ENABLED = _settings.metrics_enabled
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_HOLD_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+class Registry:
+    # every thread writes to its own shard, a plain dict nobody else writes
+    # to, so recording takes no lock; the lock is only taken to register a
+    # new shard. A scrape adds the shards up.
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._shards = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def counter(self, name: str, help: str, labels: tuple = ()):
+        return self._register(Counter(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, help, labels, buckets))
+
+    def collector(self, fn):
+        # fn() returns [(name, type, help, [(labels dict, value), ...])],
+        # read at scrape time, for values that already live somewhere else
+        self._collectors.append(fn)
+        return fn
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self):
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in _snapshot(shard):
+                if isinstance(value, list):
+                    total = merged.setdefault(key, [0] * len(value))
+                    for i, v in enumerate(value):
+                        total[i] += v
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self):
+        merged = self._merged()
+        by_metric = {}
+        for (name, labels), value in merged.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(by_metric.get(name, []), key = lambda item: item[0]):
+                lines.extend(metric.samples(dict(zip(metric.labels, labels)), value))
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception:
+                # a broken collector must not take the whole scrape down
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+def _snapshot(shard: dict):
+    # the owning thread may add a key while we iterate
+    while True:
+        try:
+            return [(key, list(value) if isinstance(value, list) else value) for key, value in list(shard.items())]
+        except RuntimeError:
+            continue
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def _number(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, registry: Registry, name: str, help: str, labels: tuple):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self.registry._shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def samples(self, labels: dict, value):
+        return [f"{self.name}{_labels(labels)} {_number(value)}"]
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, registry: Registry, name: str, help: str, labels: tuple, buckets: tuple):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self.registry._shard()
+        key = (self.name, labels)
+        # one slot per bucket, one for +Inf, then the count and the sum
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def samples(self, labels: dict, counts: list):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(float(bound))})} {cumulative}")
+        lines.append(f"{self.name}_count{_labels(labels)} {counts[-2]}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {_number(float(counts[-1]))}")
+        return lines
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "library_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+http_errors = registry.counter(
+    "library_http_request_errors_total", "HTTP requests answered with a 5xx or an unhandled exception.", ("method", "route")
+)
+http_duration = registry.histogram(
+    "library_http_request_duration_seconds", "Time from the request to the end of the response body.", ("method", "route")
+)
+rate_limited = registry.counter(
+    "library_rate_limit_rejections_total", "Requests turned away by the rate limiter.", ("route",)
+)
+pool_hold = registry.histogram(
+    "library_db_pool_hold_seconds", "Time a pooled connection was checked out for.", ("engine",), POOL_HOLD_BUCKETS
+)
+loan_events = registry.counter(
+    "library_loan_events_total", "Committed borrows and returns.", ("event",)
+)
+login_events = registry.counter(
+    "library_logins_total", "Login attempts by outcome.", ("outcome",)
+)
+
+# pools
+
+_engines = {}
+
+def _instrument_pool(name: str, engine):
+    # the pool's checkout and checkin events, listened to on the engine so
+    # they carry over to the pool dispose() swaps in. How long callers wait
+    # for a connection shows as checked_out sitting at size + overflow.
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checked_out_at", None)
+        if start is not None:
+            pool_hold.observe(time.perf_counter() - start, name)
+
+def register_engine(name: str, engine):
+    engine = getattr(engine, "sync_engine", engine)
+    _engines[name] = engine
+    _instrument_pool(name, engine)
+
+@registry.collector
+def _pool_collector():
+    gauges = {"checked_out": [], "checked_in": [], "overflow": [], "size": []}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        for gauge, method in (("checked_out", "checkedout"), ("checked_in", "checkedin"), ("overflow", "overflow"), ("size", "size")):
+            # NullPool and StaticPool do not keep these numbers
+            if hasattr(pool, method):
+                gauges[gauge].append(({"engine": name}, getattr(pool, method)()))
+    return [
+        ("library_db_pool_checked_out", "gauge", "Connections currently handed out.", gauges["checked_out"]),
+        ("library_db_pool_checked_in", "gauge", "Open connections idle in the pool.", gauges["checked_in"]),
+        ("library_db_pool_overflow", "gauge", "Connections open beyond pool_size, negative while the pool is not full yet.", gauges["overflow"]),
+        ("library_db_pool_size", "gauge", "Configured pool_size.", gauges["size"]),
+    ]
+
+# in-process components that already count for themselves
+
+@registry.collector
+def _component_collector():
+    # imported here, app.core.database registers its engine with this module
+    from app.core.audit import audit_writer
+    from app.core.catalog_cache import catalog_cache
+    from app.core.principal_cache import principal_cache
+    from app.core.token_denylist import token_denylist
+    from app.utils.hash_executor import hash_executor
+
+    catalog = catalog_cache.stats()
+    audit = audit_writer.stats()
+    principals = principal_cache.stats()
+    hashing = hash_executor.stats()
+    denylist = token_denylist.stats()
+    catalog_events = ("hits", "misses", "coalesced", "loads", "load_errors", "backend_errors", "evictions")
+    audit_events = ("enqueued", "written", "batches", "sync_fallbacks", "failed_flushes", "dropped")
+    return [
+        ("library_catalog_cache_events_total", "counter", "Catalog cache lookups, loads and evictions.",
+            [({"event": e}, catalog[e]) for e in catalog_events if e in catalog]),
+        ("library_catalog_cache_entries", "gauge", "Entries in the in-process catalog cache.", [({}, catalog["size"])]),
+        ("library_principal_cache_events_total", "counter", "Principal cache lookups.",
+            [({"event": "hits"}, principals["hits"]), ({"event": "misses"}, principals["misses"])]),
+        ("library_principal_cache_entries", "gauge", "Entries in the principal cache.", [({}, principals["size"])]),
+        ("library_audit_events_total", "counter", "Audit writer activity.",
+            [({"event": e}, audit[e]) for e in audit_events if e in audit]),
+        ("library_audit_queue_depth", "gauge", "Audit rows waiting for the background writer.", [({}, audit["queue_depth"])]),
+        ("library_hash_in_flight", "gauge", "Password hashes queued or running.", [({}, hashing["in_flight"])]),
+        ("library_hash_rejected_total", "counter", "Password hashes refused because the queue was full.", [({}, hashing["rejected"])]),
+        ("library_hash_pool_rebuilds_total", "counter", "Hash worker pools replaced after a worker died.", [({}, hashing["rebuilds"])]),
+        ("library_token_denylist_entries", "gauge", "Revoked access tokens that have not expired yet.", [({}, denylist["size"])]),
+        ("library_token_denylist_checks_total", "counter", "Denylist checks that went past the bloom filter.",
+            [({"result": "denied"}, denylist["denied"]), ({"result": "false_positive"}, denylist["false_positives"])]),
+    ]
+
+def render():
+    return registry.render()
+
+class MetricsMiddleware:
+    # plain ASGI like ProfilingMiddleware, added inside it
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            # the template, not the path: one series per route, not per book.
+            # Anything that matched no route shares one label.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, str(status))
+            http_duration.observe(time.perf_counter() - start, method, route)
+            if status >= 500:
+                http_errors.inc(method, route)
@@ -0,0 +1,284 @@
+from datetime import datetime
+import importlib
+import logging
+import pkgutil
+import time
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# every worker runs pending migrations on startup, one at a time thanks to a
+# database lock. Switch it off to run them from a deploy step instead:
+# python -m app.core.migrations
+MIGRATE_ON_STARTUP = _settings.migrate_on_startup
+
+MIGRATIONS_PACKAGE = "app.migrations"
+BACKFILL_BATCH_SIZE = 1000
+_LOCK_NAME = "library_schema_migrations"
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key = True),
+    Column("description", String(200), nullable = False),
+    Column("applied_at", DateTime, nullable = False),
+    Column("duration_ms", Integer, nullable = False),
+)
+
+class Operations:
+    # the DDL a migration may run. Every operation checks the live schema
+    # first, so a migration that died half way can simply be run again, and
+    # a database created by create_all just records the versions.
+    #
+    # Online-safe where the database allows it: MySQL adds columns with
+    # ALGORITHM=INSTANT and builds indexes with ALGORITHM=INPLACE, LOCK=NONE,
+    # PostgreSQL builds them CONCURRENTLY, so reads and writes carry on.
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+
+    def _inspector(self):
+        return inspect(self.engine)
+
+    def has_table(self, table: str):
+        return self._inspector().has_table(table)
+
+    def has_column(self, table: str, column: str):
+        return any(c["name"] == column for c in self._inspector().get_columns(table))
+
+    def has_index(self, table: str, name: str | None = None, columns: list[str] | None = None):
+        # by name, or by leading columns for indexes made by create_all
+        # (unique=True columns get unnamed constraints on some dialects)
+        inspector = self._inspector()
+        found = [(i["name"], i["column_names"]) for i in inspector.get_indexes(table)]
+        found += [(u["name"], u["column_names"]) for u in inspector.get_unique_constraints(table)]
+        return any(n == name or (columns is not None and list(c) == columns) for n, c in found)
+
+    def execute(self, statement, params = None):
+        with self.engine.connect() as conn:
+            result = conn.execute(text(statement) if isinstance(statement, str) else statement, params or {})
+            conn.commit()
+            return result
+
+    def add_column(self, column: Column):
+        table = column.table.name
+        if self.has_column(table, column.name):
+            return False
+        spec = CreateColumn(column).compile(dialect = self.engine.dialect)
+        ddl = f"ALTER TABLE {table} ADD COLUMN {spec}"
+        if self.dialect == "mysql":
+            try:
+                self.execute(f"{ddl}, ALGORITHM=INSTANT")
+                return True
+            except Exception:
+                # before 8.0.12, or a column INSTANT can not add
+                logger.info("INSTANT add of %s.%s refused, using INPLACE", table, column.name)
+                ddl = f"{ddl}, ALGORITHM=INPLACE, LOCK=NONE"
+        self.execute(ddl)
+        return True
+
+    def drop_column(self, table: str, column: str):
+        if not self.has_column(table, column):
+            return False
+        ddl = f"ALTER TABLE {table} DROP COLUMN {column}"
+        if self.dialect == "mysql":
+            ddl += ", ALGORITHM=INPLACE, LOCK=NONE"
+        self.execute(ddl)
+        return True
+
+    def create_index(self, index: Index):
+        table = index.table.name
+        columns = [c.name for c in index.columns]
+        if self.has_index(table, name = index.name, columns = columns):
+            return False
+
+        if self.dialect == "postgresql":
+            # CONCURRENTLY can not run inside a transaction block
+            ddl = str(CreateIndex(index, if_not_exists = True).compile(dialect = self.engine.dialect))
+            ddl = ddl.replace("INDEX IF NOT EXISTS", "INDEX CONCURRENTLY IF NOT EXISTS", 1)
+            with self.engine.connect().execution_options(isolation_level = "AUTOCOMMIT") as conn:
+                conn.execute(text(ddl))
+            return True
+
+        ddl = str(CreateIndex(index).compile(dialect = self.engine.dialect))
+        if self.dialect == "mysql":
+            ddl += " ALGORITHM=INPLACE LOCK=NONE"
+        self.execute(ddl)
+        return True
+
+    def drop_index(self, table: str, name: str):
+        if not self.has_index(table, name = name):
+            return False
+
+        if self.dialect == "postgresql":
+            with self.engine.connect().execution_options(isolation_level = "AUTOCOMMIT") as conn:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            return True
+
+        if self.dialect == "mysql":
+            self.execute(f"DROP INDEX {name} ON {table} ALGORITHM=INPLACE LOCK=NONE")
+        else:
+            self.execute(f"DROP INDEX {name}")
+        return True
+
+    def index(self, model, name: str):
+        # the model's own Index, so the migration and create_all never drift
+        table = model.__table__
+        for index in table.indexes:
+            if index.name == name:
+                return index
+        for constraint in table.constraints:
+            if constraint.name == name:
+                # a UNIQUE constraint can only be added to a live table as a
+                # unique index, which enforces exactly the same thing. Built
+                # on a copy, an Index on the model's columns would join the
+                # model's table and be created a second time by create_all.
+                copy = table.to_metadata(MetaData())
+                return Index(name, *[copy.c[c.name] for c in constraint.columns], unique = True)
+        raise KeyError(f"{table.name} has no index {name}")
+
+    def batches(self, query, batch_size: int = BACKFILL_BATCH_SIZE):
+        # runs query (keyset on the first selected column, which must be the
+        # primary key) and yields lists of rows, one short transaction each
+        last = None
+        while True:
+            statement = query
+            key = list(query.selected_columns)[0]
+            if last is not None:
+                statement = statement.where(key > last)
+            with self.engine.connect() as conn:
+                rows = conn.execute(statement.order_by(key).limit(batch_size)).all()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+def _discover():
+    package = importlib.import_module(MIGRATIONS_PACKAGE)
+    migrations = []
+    for info in pkgutil.iter_modules(package.__path__):
+        if info.name.startswith("m") and info.name[1:5].isdigit():
+            module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{info.name}")
+            migrations.append(module)
+    migrations.sort(key = lambda m: m.VERSION)
+    versions = [m.VERSION for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return migrations
+
+class DatabaseLock:
+    # a named lock held on its own connection for the length of the block.
+    # With a timeout the caller waits for it, without one it is only tried:
+    # `acquired` tells whether this process got it. SQLite has no such lock,
+    # its own DDL locking has to do and every holder acquires.
+    def __init__(self, engine: Engine, name: str, timeout: int | None = None):
+        self.engine = engine
+        self.name = name
+        self.timeout = timeout
+        self.conn = None
+        self.acquired = False
+
+    def __enter__(self):
+        dialect = self.engine.dialect.name
+        if dialect == "mysql":
+            self.conn = self.engine.connect()
+            self.acquired = self.conn.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"), {"name": self.name, "timeout": self.timeout or 0}
+            ).scalar() == 1
+        elif dialect == "postgresql":
+            self.conn = self.engine.connect()
+            if self.timeout is None:
+                self.acquired = self.conn.execute(
+                    text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": self.name}
+                ).scalar()
+            else:
+                self.conn.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {"name": self.name})
+                self.acquired = True
+            # the session lock outlives the transaction the query opened
+            self.conn.commit()
+        else:
+            self.acquired = True
+        return self
+
+    def __exit__(self, *exc):
+        if self.conn is None:
+            return
+        try:
+            if self.acquired:
+                if self.engine.dialect.name == "mysql":
+                    self.conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+                else:
+                    self.conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": self.name})
+        finally:
+            self.conn.close()
+            self.conn = None
+
+def applied_versions(engine: Engine):
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def run_migrations(engine: Engine, target: int | None = None):
+    # applies every pending migration in version order, returns their versions
+    _metadata.create_all(bind = engine)
+    applied = []
+    # one migrating process at a time, the others wait and then find nothing
+    # left to do
+    with DatabaseLock(engine, _LOCK_NAME, timeout = 600):
+        done = applied_versions(engine)
+        operations = Operations(engine)
+        for migration in _discover():
+            if migration.VERSION in done or (target is not None and migration.VERSION > target):
+                continue
+            logger.info("applying migration %04d: %s", migration.VERSION, migration.DESCRIPTION)
+            start = time.perf_counter()
+            migration.upgrade(operations)
+            with engine.begin() as conn:
+                conn.execute(schema_migrations.insert().values(
+                    version = migration.VERSION,
+                    description = migration.DESCRIPTION,
+                    applied_at = datetime.now(),
+                    duration_ms = round((time.perf_counter() - start) * 1000)
+                ))
+            applied.append(migration.VERSION)
+    return applied
+
+def migration_status(engine: Engine):
+    _metadata.create_all(bind = engine)
+    done = applied_versions(engine)
+    return [(m.VERSION, m.DESCRIPTION, m.VERSION in done) for m in _discover()]
+
+if __name__ == "__main__":
+    # python -m app.core.migrations [--status] [--target N] [--check-plans]
+    import argparse
+
+    from app.core.database import Base, engine
+    from app.models import book, loan, role, user, refresh_token, audit_log, book_search_token, catalog_version, circulation_stats
+
+    parser = argparse.ArgumentParser(description = "Apply pending schema migrations")
+    parser.add_argument("--status", action = "store_true", help = "list migrations and whether they are applied")
+    parser.add_argument("--target", type = int, help = "stop after this version")
+    parser.add_argument("--check-plans", action = "store_true", help = "EXPLAIN the hot queries afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level = logging.INFO)
+
+    if args.status:
+        for version, description, done in migration_status(engine):
+            print(f"{version:04d} {'applied' if done else 'pending'}  {description}")
+    else:
+        Base.metadata.create_all(bind = engine)
+        print(f"Applied {run_migrations(engine, target = args.target) or 'nothing'}")
+
+    if args.check_plans:
+        from app.core.query_plans import check_query_plans, format_report
+        report = check_query_plans(engine)
+        print(format_report(report))
+        raise SystemExit(0 if all(r["ok"] for r in report) else 1)
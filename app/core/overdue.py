@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from datetime import date
+import logging
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.jobs import PeriodicJob
+from app.core.pagination import keyset_filter, keyset_order
+from app.core.roles import Roles
+from app.models.loan import Loan
+from app.models.role import Role
+from app.models.user import User
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_SWEEP_ENABLED = _settings.overdue_sweep_enabled
+OVERDUE_SWEEP_INTERVAL = _settings.overdue_sweep_interval
+OVERDUE_SWEEP_BATCH_SIZE = _settings.overdue_sweep_batch_size
+
+@dataclass(frozen=True)
+class FinePolicy:
+    daily_cents: int
+    cap_cents: int
+    grace_days: int = 0
+
+    @classmethod
+    def parse(cls, value: str):
+        # "daily_cents,cap_cents,grace_days"
+        daily, cap, grace = (int(i) for i in value.split(","))
+        return cls(daily_cents = daily, cap_cents = cap, grace_days = grace)
+
+    def fine(self, days_overdue: int):
+        return min(self.cap_cents, max(0, days_overdue - self.grace_days) * self.daily_cents)
+
+FINE_POLICIES = {
+    Roles.ADMIN.value: FinePolicy.parse(_settings.fine_policy_admin),
+    Roles.LIBRARIAN.value: FinePolicy.parse(_settings.fine_policy_librarian),
+    Roles.STUDENT.value: FinePolicy.parse(_settings.fine_policy_student),
+}
+DEFAULT_FINE_POLICY = FINE_POLICIES[Roles.STUDENT.value]
+
+# the sweep walks ix_loans_is_active_due_date_id in (due_date, id) order
+SWEEP_KEYSET = [(Loan.due_date, False), (Loan.id, False)]
+
+# a loan returned between the batch read and this write keeps its state
+_set_fines = (
+    Loan.__table__.update()
+    .where(Loan.__table__.c.id == bindparam("loan_id"), Loan.__table__.c.is_active == True)
+    .values(is_overdue = True, fine_cents = bindparam("fine"))
+)
+
+def loan_fine(role_name: str, due_date: date, today: date):
+    return FINE_POLICIES.get(role_name, DEFAULT_FINE_POLICY).fine((today - due_date).days)
+
+def assess_fines(rows, today: date):
+    # one batch of (id, due_date, is_overdue, fine_cents, role) rows in, the
+    # parameter sets of the loans whose state changed out
+    changes = []
+    for loan_id, due_date, is_overdue, fine_cents, role_name in rows:
+        fine = loan_fine(role_name, due_date, today)
+        if not is_overdue or fine != fine_cents:
+            changes.append({"loan_id": loan_id, "fine": fine})
+    return changes
+
+def sweep_overdue_loans(db: Session, batch_size: int = OVERDUE_SWEEP_BATCH_SIZE, today: date | None = None):
+    # active loans past their due date, a keyset batch at a time, each batch
+    # read and written in its own short transaction. Loans whose fine did not
+    # move (capped, or already assessed today) are not written again.
+    today = today or date.today()
+    query = (
+        select(Loan.id, Loan.due_date, Loan.is_overdue, Loan.fine_cents, Role.name)
+        .join(User, User.id == Loan.user_id)
+        .join(Role, Role.id == User.role_id)
+        .where(Loan.is_active == True, Loan.due_date < today)
+        .order_by(*keyset_order(SWEEP_KEYSET))
+        .limit(batch_size)
+    )
+    scanned = updated = 0
+    last = None
+    while True:
+        statement = query if last is None else query.where(keyset_filter(SWEEP_KEYSET, last))
+        rows = db.execute(statement).all()
+        if not rows:
+            break
+        changes = assess_fines(rows, today)
+        if changes:
+            db.execute(_set_fines, changes)
+        db.commit()
+        scanned += len(rows)
+        updated += len(changes)
+        if len(rows) < batch_size:
+            break
+        last = [rows[-1].due_date, rows[-1].id]
+    return scanned, updated
+
+def _run_sweep():
+    db = SessionLocal()
+    try:
+        scanned, updated = sweep_overdue_loans(db)
+        if updated:
+            logger.info("overdue sweep: %s overdue loans, %s fines updated", scanned, updated)
+    finally:
+        db.close()
+
+overdue_sweep_job = PeriodicJob("overdue-sweep", OVERDUE_SWEEP_INTERVAL, _run_sweep, lock = "library_overdue_sweep")
@@ -0,0 +1,116 @@
+import base64
+import binascii
+from datetime import date, datetime
+from decimal import Decimal
+import hashlib
+import json
+
+from sqlalchemy import and_, or_, asc, desc
+
+from app.exceptions.pagination import InvalidCursor
+
+# A keyset is a list of (column, descending) pairs that ends with a unique
+# column (the primary key) so every row has exactly one position.
+
+def keyset_fingerprint(keyset, scope = None):
+    # which listing a cursor belongs to: the sort columns, their directions and
+    # whatever else decides the rows (the search, the filters). A cursor
+    # replayed against another sort or query is refused, not silently paged.
+    shape = [[getattr(column, "key", None) or str(column), descending] for column, descending in keyset]
+    raw = json.dumps([shape, scope], separators=(",", ":"), sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=6).hexdigest()
+
+def encode_cursor(values, fingerprint: str):
+    raw = json.dumps({"k": fingerprint, "v": list(values)}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int, fingerprint: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor()
+
+    if not isinstance(payload, dict) or payload.get("k") != fingerprint:
+        raise InvalidCursor()
+    values = payload.get("v")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor()
+    return values
+
+def _coerce(column, value):
+    # every value goes into the WHERE clause, so it has to be a scalar of the
+    # column's type. Cursors are JSON: dates and datetimes come back as ISO
+    # strings, numbers as int or float.
+    if value is None or isinstance(value, (list, dict)):
+        raise InvalidCursor()
+    try:
+        python_type = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+
+    if issubclass(python_type, date):
+        if not isinstance(value, str):
+            raise InvalidCursor()
+        try:
+            return python_type.fromisoformat(value)
+        except ValueError:
+            raise InvalidCursor()
+    if issubclass(python_type, bool):
+        valid = isinstance(value, bool)
+    elif issubclass(python_type, int):
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif issubclass(python_type, (float, Decimal)):
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif issubclass(python_type, str):
+        valid = isinstance(value, str)
+    else:
+        valid = True
+    if not valid:
+        raise InvalidCursor()
+    return value
+
+def keyset_order(keyset):
+    return [desc(column) if descending else asc(column) for column, descending in keyset]
+
+def keyset_filter(keyset, values):
+    # (a, b) after (x, y)  =>  a >= x AND (a > x OR (a = x AND b > y)), flipped
+    # per descending column. The leading a >= x is what lets the database
+    # seek into the (a, b) index instead of scanning it.
+    clauses = []
+    for i, (column, descending) in enumerate(keyset):
+        equal = [c == v for (c, _), v in zip(keyset[:i], values[:i])]
+        after = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, after))
+
+    first_column, first_descending = keyset[0]
+    bound = first_column <= values[0] if first_descending else first_column >= values[0]
+    return and_(bound, or_(*clauses))
+
+def paginate(query, keyset, limit: int, cursor: str | None = None, offset: int = 0, scope = None):
+    # query selects one entity (rows come back as objects) or plain columns
+    # (rows come back as Row tuples, the keyset columns ride along labelled).
+    # scope is whatever besides the keyset decides the rows, JSON-able.
+    single = len(query.column_descriptions) == 1
+    query = query.add_columns(*[column.label(f"_keyset_{i}") for i, (column, _) in enumerate(keyset)])
+    query = query.order_by(*keyset_order(keyset))
+
+    fingerprint = keyset_fingerprint(keyset, scope)
+    if cursor:
+        values = decode_cursor(cursor, len(keyset), fingerprint)
+        values = [_coerce(column, value) for (column, _), value in zip(keyset, values)]
+        query = query.filter(keyset_filter(keyset, values))
+    elif offset:
+        query = query.offset(offset)
+
+    # one extra row tells us whether there is a next page
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-len(keyset):], fingerprint)
+
+    if single:
+        return [row[0] for row in rows], next_cursor
+    return rows, next_cursor
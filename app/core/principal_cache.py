@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import hashlib
+import itertools
+import threading
+import time
+
+from sqlalchemy import select, union
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.jobs import PeriodicJob
+from app.core.token_versions import token_versions
+from app.models.user import User
+
+_settings = get_settings()
+
+PRINCIPAL_CACHE_SIZE = _settings.principal_cache_size
+PRINCIPAL_CACHE_TTL = _settings.principal_cache_ttl
+# how often a worker drops the principals of users changed on the other
+# workers, the longest such a change goes unseen here
+PRINCIPAL_CACHE_SYNC_ENABLED = _settings.principal_cache_sync_enabled
+PRINCIPAL_CACHE_SYNC_INTERVAL = _settings.principal_cache_sync_interval
+
+@dataclass(frozen=True)
+class Principal:
+    # what authenticated routes need to know about the caller, without an ORM row
+    id: int
+    name: str
+    email: str
+    role_id: int
+    role_name: str
+    is_active: bool
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id = user.id,
+            name = user.name,
+            email = user.email,
+            role_id = user.role_id,
+            role_name = user.role.name,
+            is_active = bool(user.is_active),
+            token_version = user.token_version or 0
+        )
+
+@dataclass(frozen=True)
+class TokenClaims:
+    # the signed role claims of an access token, enough for require_roles
+    id: int
+    role_name: str
+    token_version: int
+
+class PrincipalCache:
+    # bounded LRU with a TTL, keyed by (user id, token) so a cached entry can
+    # only ever be served for the exact token that produced it.
+    # invalidate_user bumps the user's generation: a principal loaded before
+    # the change and stored after it would otherwise live for the whole TTL,
+    # so put() only stores what was loaded under the current generation.
+    # A generation only has to outlive the loads in flight when it was
+    # bumped, it is forgotten after a TTL; numbers are never reused, so a
+    # load that read a forgotten one still finds it changed.
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        # user id -> (generation, bumped at), oldest bump first
+        self._generations = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_id: int, token: str):
+        return user_id, hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, user_id: int, token: str):
+        key = self._key(user_id, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, user_id: int):
+        # read before loading the principal, handed back to put()
+        entry = self._generations.get(user_id)
+        return entry[0] if entry is not None else 0
+
+    def put(self, user_id: int, token: str, principal: Principal, generation: int):
+        if self.maxsize <= 0:
+            return
+        key = self._key(user_id, token)
+        with self._lock:
+            if self.generation(user_id) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            self._generations[user_id] = (next(self._counter), now)
+            self._generations.move_to_end(user_id)
+            while next(iter(self._generations.values()))[1] < now - self.ttl:
+                self._generations.popitem(last = False)
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+def changed_users(since: datetime):
+    # users updated or deleted since, each side through its own index
+    return union(
+        select(User.id).where(User.updated_at >= since),
+        select(User.id).where(User.deleted_at >= since)
+    )
+
+class PrincipalSync:
+    # invalidate_user only reaches the worker that made the change. Profile
+    # updates set users.updated_at and deletions deleted_at, every worker
+    # reads the users changed since its last run and drops them too. The
+    # watermark starts one TTL back, older entries have expired anyway.
+
+    # updated_at is set before the commit, a transaction that commits up to
+    # this much later (or a worker clock behind ours) is still picked up.
+    # Invalidating twice is harmless.
+    OVERLAP = timedelta(seconds = 5)
+
+    def __init__(self, cache: PrincipalCache):
+        self.cache = cache
+        self.watermark = datetime.now() - timedelta(seconds = cache.ttl)
+
+    def run(self, db = None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            now = datetime.now()
+            user_ids = db.execute(changed_users(self.watermark - self.OVERLAP)).scalars().all()
+            for user_id in user_ids:
+                self.cache.invalidate_user(user_id)
+                token_versions.invalidate(user_id)
+            self.watermark = now
+            return len(user_ids)
+        finally:
+            if own_session:
+                db.close()
+
+principal_sync = PrincipalSync(principal_cache)
+
+# no lock: each worker drops the entries of its own caches
+principal_sync_job = PeriodicJob("principal-cache-sync", PRINCIPAL_CACHE_SYNC_INTERVAL, principal_sync.run)
@@ -0,0 +1,132 @@
+from contextvars import ContextVar
+import json
+import logging
+import random
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = _settings.profiling_enabled
+SERVER_TIMING_ENABLED = _settings.server_timing_enabled
+SLOW_REQUEST_MS = _settings.slow_request_ms
+SLOW_QUERY_MS = _settings.slow_query_ms
+# share of the slow requests and statements that get logged, a slow database
+# makes everything slow and would otherwise flood the log
+SLOW_LOG_SAMPLE_RATE = _settings.slow_log_sample_rate
+SLOW_QUERY_TEXT_LIMIT = 1000
+
+class RequestProfile:
+    __slots__ = ("scope", "method", "start", "queries", "db_ms")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.method = scope["method"]
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+
+    @property
+    def route(self):
+        # the route template once routing is done, /books/{book_id} groups
+        # every book, the raw path before that
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope["path"]
+
+# set by the middleware for the length of a request. Starlette copies the
+# context into the threadpool and run_sync keeps it, so the statements of
+# sync and async routes alike land in their request's profile.
+_current_profile: ContextVar[RequestProfile | None] = ContextVar("request_profile", default = None)
+
+def current_profile():
+    return _current_profile.get()
+
+def _sampled():
+    return SLOW_LOG_SAMPLE_RATE >= 1 or random.random() < SLOW_LOG_SAMPLE_RATE
+
+def _log(event_name: str, **fields):
+    # one JSON object per line, ready for whatever ships the logs
+    logger.warning(json.dumps({"event": event_name, **fields}, default = str))
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.queries += 1
+        profile.db_ms += elapsed_ms
+    if elapsed_ms >= SLOW_QUERY_MS and _sampled():
+        # no parameters, they carry emails and token hashes
+        _log(
+            "slow_query",
+            duration_ms = round(elapsed_ms, 2),
+            route = profile.route if profile is not None else None,
+            method = profile.method if profile is not None else None,
+            executemany = executemany,
+            statement = " ".join(statement.split())[:SLOW_QUERY_TEXT_LIMIT]
+        )
+
+def server_timing(profile: RequestProfile, app_ms: float):
+    return f'db;dur={profile.db_ms:.2f};desc="{profile.queries} queries", app;dur={app_ms:.2f}'
+
+class ProfilingMiddleware:
+    # plain ASGI: BaseHTTPMiddleware would add a task and a copy of the body
+    # to every request, the overhead this is meant to measure
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+        token = _current_profile.set(profile)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    # the headers go out before a streamed body, so this is
+                    # the time to the first byte
+                    app_ms = (time.perf_counter() - profile.start) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(profile, app_ms).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            total_ms = (time.perf_counter() - profile.start) * 1000
+            if total_ms >= SLOW_REQUEST_MS and _sampled():
+                _log(
+                    "slow_request",
+                    method = profile.method,
+                    route = profile.route,
+                    status = status,
+                    duration_ms = round(total_ms, 2),
+                    db_ms = round(profile.db_ms, 2),
+                    queries = profile.queries
+                )
@@ -0,0 +1,218 @@
+from contextvars import ContextVar
+from collections import Counter
+import functools
+import inspect
+import json
+import logging
+import re
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# "off" in production, "warn" on staging logs every request over its route's
+# budget, "raise" (the pytest plugin's default) fails it
+QUERY_BUDGET_MODE = _settings.query_budget_mode
+# the same statement shape this many times in one budget reads as an N+1
+QUERY_BUDGET_REPEAT = _settings.query_budget_repeat
+
+# statements per request for every route in app/api, sync and async routers
+# alike, with the principal and catalog caches cold. A page of results must
+# cost the same as a single row: none of these may grow with the data.
+# tests/test_query_budgets.py runs every route cold against these.
+ROUTE_BUDGETS = {
+    ("GET", "/"): 0,
+    ("GET", "/health"): 0,
+    ("GET", "/metrics"): 0,
+
+    ("POST", "/auth/login"): 2,
+    ("GET", "/auth/me"): 1,
+    ("POST", "/auth/refresh"): 4,
+    ("POST", "/auth/logout"): 5,
+
+    ("POST", "/books/"): 7,
+    # up to IMPORT_CHUNK_SIZE rows, the one route that grows by design
+    ("POST", "/books/import"): 9,
+    ("GET", "/books/"): 2,
+    ("GET", "/books/{book_id}"): 2,
+    ("PUT", "/books/{book_id}"): 8,
+    ("DELETE", "/books/{book_id}"): 6,
+
+    ("POST", "/loans/borrow"): 9,
+    ("POST", "/loansreturn/{loan_id}"): 9,
+    ("POST", "/loans/borrow/batch"): 11,
+    ("POST", "/loans/return/batch"): 9,
+    ("GET", "/loans/me"): 2,
+    ("GET", "/loans/history"): 2,
+    ("GET", "/loans/user/{user_id}"): 2,
+    ("GET", "/loans/overdue"): 2,
+
+    ("GET", "/stats/summary"): 3,
+    ("GET", "/stats/daily"): 2,
+    ("GET", "/stats/books/top"): 2,
+    ("GET", "/stats/books/{book_id}"): 4,
+
+    ("GET", "/users/audit-logs"): 2,
+    ("GET", "/users/audit-logs/export"): 2,
+    ("GET", "/users/me"): 1,
+    ("PUT", "/users/me"): 5,
+    ("DELETE", "/users/me"): 6,
+    ("POST", "/users/"): 6,
+    ("GET", "/users/"): 2,
+    ("GET", "/users/{userid}"): 2,
+    ("PUT", "/users/{userid}"): 5,
+    ("DELETE", "/users/{userid}"): 6,
+}
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+# placeholders of every driver, and the lists an IN (...) expands into, so
+# "WHERE id IN (?, ?)" and "WHERE id IN (?, ?, ?)" are one shape
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+))+\s*\)")
+
+def statement_shape(statement: str):
+    return _IN_LIST.sub("(?)", " ".join(statement.split()))
+
+class QueryBudget:
+    # counts the statements run inside it, as a context manager or a
+    # decorator. By default only the statements of the current context: the
+    # request it was opened in, including its threadpool and run_sync work.
+    # all_threads counts every statement in the process, for tests whose
+    # client runs the app on another thread.
+
+    def __init__(self, limit: int | None, name: str | None = None, mode: str | None = None, all_threads: bool = False, repeat: int | None = None):
+        self.limit = limit
+        self.name = name
+        self.mode = mode or QUERY_BUDGET_MODE
+        self.all_threads = all_threads
+        self.repeat = repeat or QUERY_BUDGET_REPEAT
+        self.statements = []
+        self._token = None
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def exceeded(self):
+        return self.limit is not None and self.count > self.limit
+
+    def repeated(self):
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= self.repeat]
+
+    def report(self):
+        lines = [f"{self.name or 'query budget'}: {self.count} statements, budget {self.limit}"]
+        for shape, n in self.repeated():
+            lines.append(f"  {n}x {shape[:300]}")
+        return "\n".join(lines)
+
+    def __enter__(self):
+        self.statements = []
+        if self.all_threads:
+            with _global_lock:
+                _global_budgets.append(self)
+        else:
+            self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.all_threads:
+            with _global_lock:
+                _global_budgets.remove(self)
+        else:
+            _active.reset(self._token)
+        # an exception already on its way out says more than the budget
+        if exc_type is None:
+            self.check()
+        return False
+
+    def check(self):
+        if not self.exceeded or self.mode == "off":
+            return
+        if self.mode == "raise":
+            raise QueryBudgetExceeded(self.report())
+        logger.warning(json.dumps({
+            "event": "query_budget_exceeded",
+            "name": self.name,
+            "statements": self.count,
+            "budget": self.limit,
+            "repeated": [{"count": n, "statement": shape[:300]} for shape, n in self.repeated()]
+        }))
+
+    def __call__(self, fn):
+        # a fresh budget per call, the decorator can be shared by threads
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with self._copy():
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self._copy():
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def _copy(self):
+        return QueryBudget(self.limit, self.name, self.mode, self.all_threads, self.repeat)
+
+_active: ContextVar[tuple] = ContextVar("query_budgets", default = ())
+_global_budgets = []
+_global_lock = threading.Lock()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active.get():
+        budget.statements.append(statement)
+    if _global_budgets:
+        for budget in list(_global_budgets):
+            budget.statements.append(statement)
+
+def unbudgeted_routes(app):
+    # every route the app serves must have a budget, HEAD comes with GET
+    missing = []
+    for route in app.routes:
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if method != "HEAD" and (method, route.path) not in ROUTE_BUDGETS and route.path not in _DOC_ROUTES:
+                missing.append((method, route.path))
+    return missing
+
+_DOC_ROUTES = frozenset(("/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"))
+
+# observed statement counts per route, for the pytest plugin's summary
+route_peaks = {}
+
+class QueryBudgetMiddleware:
+    # plain ASGI like the profiling and metrics middleware. The budget is
+    # looked up after the request, the route is only known once routing ran.
+
+    def __init__(self, app, mode: str):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        budget = QueryBudget(None, mode = self.mode)
+        with budget:
+            await self.app(scope, receive, send)
+
+        route = getattr(scope.get("route"), "path", None)
+        if route is None:
+            return
+        key = (scope["method"], route)
+        route_peaks[key] = max(route_peaks.get(key, 0), budget.count)
+        budget.limit = ROUTE_BUDGETS.get(key)
+        budget.name = f"{scope['method']} {route}"
+        budget.check()
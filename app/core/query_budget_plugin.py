@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+# pytest -p app.core.query_budget_plugin, or in a conftest.py:
+# pytest_plugins = ["app.core.query_budget_plugin"]
+#
+# every request the TestClient makes is held to its ROUTE_BUDGETS entry, a
+# test marked @pytest.mark.query_budget(n) to n statements in total, and the
+# query_budget fixture makes budgets for a block of a test:
+#
+#     with query_budget(3):
+#         client.get("/loans/me", headers = headers)
+#
+# Nothing from app is imported when the plugin loads: the modules read their
+# settings on import, and the tests set the environment first.
+
+_MODE = pytest.StashKey[str]()
+_BUDGETS_MODULE = "app.core.query_budget"
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query budget")
+    group.addoption(
+        "--query-budget",
+        choices = ("off", "warn", "raise"),
+        default = "raise",
+        help = "what a statement count over budget does: nothing, a logged warning, or a failed test"
+    )
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(limit): fail the test when it runs more than limit SQL statements")
+    mode = config.getoption("--query-budget")
+    config.stash[_MODE] = mode
+    # the app reads it through Settings when the tests import app.main, and
+    # hands it to QueryBudgetMiddleware
+    if _BUDGETS_MODULE in sys.modules:
+        raise pytest.UsageError(f"{_BUDGETS_MODULE} was imported before the query budget plugin was configured")
+    os.environ["QUERY_BUDGET_MODE"] = mode
+
+def _budget(config, limit: int, name: str):
+    from app.core.query_budget import QueryBudget
+    # all threads: the TestClient runs the app on a thread of its own
+    return QueryBudget(limit, name = name, mode = config.stash[_MODE], all_threads = True)
+
+@pytest.hookimpl(wrapper = True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        return (yield)
+    with _budget(item.config, marker.args[0], item.nodeid):
+        return (yield)
+
+@pytest.fixture
+def query_budget(request):
+    def make(limit: int, name: str | None = None):
+        return _budget(request.config, limit, name or request.node.nodeid)
+    return make
+
+def pytest_terminal_summary(terminalreporter, config):
+    budgets = sys.modules.get(_BUDGETS_MODULE)
+    if budgets is None or (not budgets.route_peaks and "app.main" not in sys.modules):
+        return
+    terminalreporter.section("query budgets")
+    for (method, route), peak in sorted(budgets.route_peaks.items(), key = lambda item: (item[0][1], item[0][0])):
+        limit = budgets.ROUTE_BUDGETS.get((method, route))
+        terminalreporter.write_line(f"{peak:4d} / {limit if limit is not None else '-':>4}  {method} {route}")
+
+    main = sys.modules.get("app.main")
+    if main is not None:
+        for method, route in budgets.unbudgeted_routes(main.app):
+            terminalreporter.write_line(f"no budget for {method} {route}, add it to ROUTE_BUDGETS", yellow = True)
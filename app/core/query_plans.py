@@ -0,0 +1,107 @@
+from datetime import date
+import json
+
+from sqlalchemy import select, text, func
+from sqlalchemy.engine import Engine
+
+from app.core.principal_cache import changed_users
+from app.models.audit_log import AuditLog
+from app.models.book import Book
+from app.models.loan import Loan
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+
+# the queries every request path leans on, as the controllers build them.
+# Each must be answered from an index, a full scan of loans or users here
+# is a latency cliff that only shows up once the table is large.
+def _hot_queries():
+    return {
+        "active loans of a user": select(Loan.id, Loan.book_id, Loan.due_date)
+            .where(Loan.user_id == 1, Loan.is_active == True),
+        "pending loan check on user deletion": select(Loan.id)
+            .where(Loan.user_id == 1, Loan.is_active == True).limit(1),
+        "batch borrow active loan lookup": select(Loan.book_id)
+            .where(Loan.user_id == 1, Loan.book_id.in_([1, 2, 3]), Loan.is_active == True),
+        "loan history of a user": select(Loan.id, Loan.book_id, Loan.due_date)
+            .where(Loan.user_id == 1).order_by(Loan.id.desc()).limit(20),
+        "copies on loan of imported books": select(Book.isbn, func.count(Loan.id))
+            .join(Loan, Loan.book_id == Book.id)
+            .where(Book.isbn.in_(["9780000000001", "9780000000002"]), Loan.is_active == True).group_by(Book.isbn),
+        "overdue sweep": select(Loan.id, Loan.due_date, Loan.fine_cents)
+            .where(Loan.is_active == True, Loan.due_date < date(2024, 1, 1))
+            .order_by(Loan.due_date, Loan.id).limit(1000),
+        "login by email": select(User.id, User.password_hash)
+            .where(User.email == "reader@example.com", User.is_active == True),
+        "refresh token lookup": select(RefreshToken.id)
+            .where(RefreshToken.token_hash == "0" * 64, RefreshToken.is_revoked == False),
+        "refresh token family revocation": select(RefreshToken.id)
+            .where(RefreshToken.family_id == "0" * 32, RefreshToken.revoked_at == None),
+        "token denylist sync": select(RefreshToken.access_jti, RefreshToken.created_at)
+            .where(RefreshToken.revoked_at >= date(2024, 1, 1), RefreshToken.access_jti.is_not(None)),
+        "principal cache sync": changed_users(date(2024, 1, 1)),
+        "audit logs by action": select(AuditLog.id, AuditLog.created_at)
+            .where(AuditLog.action == "BORROW").order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(50),
+    }
+
+def _sqlite_plan(conn, sql: str):
+    # detail is "SEARCH loans USING INDEX ix_... (user_id=?)" or "SCAN loans"
+    details = [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    scans = [d for d in details if d.startswith("SCAN") and "USING" not in d]
+    indexes = [d.split(" INDEX ", 1)[1].split(" ")[0] for d in details if " INDEX " in d]
+    if not indexes and any("INTEGER PRIMARY KEY" in d for d in details):
+        indexes = ["PRIMARY KEY"]
+    return indexes, details, not scans
+
+def _mysql_plan(conn, sql: str):
+    # type ALL is a full table scan, key is the index picked
+    rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    indexes = [row["key"] for row in rows if row["key"]]
+    details = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+    return indexes, details, all(row["type"] != "ALL" for row in rows)
+
+def _postgresql_plan(conn, sql: str):
+    # tiny tables are always cheapest to scan, so ask whether an index
+    # can serve the query at all rather than whether one is preferred today
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get("Plans", []))
+    indexes = [n["Index Name"] for n in nodes if "Index Name" in n]
+    details = [f"{n['Node Type']} {n.get('Relation Name', '')} {n.get('Index Name', '')}".strip() for n in nodes]
+    return indexes, details, all(n["Node Type"] != "Seq Scan" for n in nodes)
+
+_PLANNERS = {
+    "sqlite": _sqlite_plan,
+    "mysql": _mysql_plan,
+    "postgresql": _postgresql_plan,
+}
+
+def check_query_plans(engine: Engine):
+    # EXPLAINs each hot query, one entry per query:
+    # {"query", "indexes", "plan", "ok"}, ok is False for a full table scan
+    planner = _PLANNERS.get(engine.dialect.name)
+    if planner is None:
+        raise RuntimeError(f"no query plan check for {engine.dialect.name}")
+
+    report = []
+    with engine.connect() as conn:
+        for name, query in _hot_queries().items():
+            sql = str(query.compile(dialect = engine.dialect, compile_kwargs = {"literal_binds": True}))
+            indexes, details, ok = planner(conn, sql)
+            report.append({"query": name, "indexes": indexes, "plan": details, "ok": ok})
+        conn.rollback()
+    return report
+
+def format_report(report):
+    lines = []
+    for entry in report:
+        status = "ok  " if entry["ok"] else "SCAN"
+        lines.append(f"{status} {entry['query']}: {', '.join(entry['indexes']) or 'no index'}")
+        if not entry["ok"]:
+            lines.extend(f"       {detail}" for detail in entry["plan"])
+    return "\n".join(lines)
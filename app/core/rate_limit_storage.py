@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+# expired rows are swept every this many writes, so the table only ever
+# holds the keys that were active during the last couple of windows
+PURGE_EVERY = 1000
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    # limits storage in a SQLite file, shared by every worker process on the
+    # host: "sqlite:///relative.db" or "sqlite:////absolute/path.db".
+    # One row (key, count, expires_at) per counter; the sliding window counter
+    # strategy needs two per limited identity, whatever its request rate.
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        self.path = uri.split(":///", 1)[1] or ":memory:"
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions = wrap_exceptions, **options)
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # sqlite3 connections are per thread, the file does the sharing
+        db = getattr(self._local, "db", None)
+        if db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok = True)
+            db = sqlite3.connect(self.path, timeout = 5, isolation_level = None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        return _Immediate(self._connection())
+
+    def _get(self, db, key: str, now: float):
+        row = db.execute("SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def _incr(self, db, key: str, expiry: float, amount: int, now: float):
+        # a counter that has expired starts over, like a fresh key
+        db.execute(
+            "INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,"
+            " expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END",
+            (key, amount, now + expiry, now, now)
+        )
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            db.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return self._get(db, key, now)
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._transaction() as db:
+            return self._incr(db, key, expiry, amount, time.time())
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE rate_limits SET count = MAX(count - ?, 0) WHERE key = ? AND expires_at > ?", (amount, key, now))
+            return self._get(db, key, now)
+
+    def get(self, key: str) -> int:
+        return self._get(self._connection(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        with self._transaction() as db:
+            return db.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def _window(self, db, key: str, expiry: int, now: float):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(db, previous_key, now)
+        current_count = self._get(db, current_key, now)
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        # the read and the increment share one write transaction, so
+        # concurrent workers can not both take the last slot
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._transaction() as db:
+            previous_count, previous_ttl, current_count, _ = self._window(db, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            self._incr(db, current_key, 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(self, key: str, expiry: int):
+        return self._window(self._connection(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._transaction() as db:
+            db.execute("DELETE FROM rate_limits WHERE key IN (?, ?)", (previous_key, current_key))
+
+class _Immediate:
+    # BEGIN IMMEDIATE takes the write lock up front, a deferred transaction
+    # that reads first can deadlock against another writer and fail
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
@@ -1,4 +1,65 @@
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from jose import JWTError
+from starlette.requests import Request
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+from app.core.roles import Roles
+from app.core import rate_limit_storage  # registers the sqlite:// storage scheme
+from app.utils.security import decode_access_token
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# load tests switch it off, every request comes from the same address there
+RATE_LIMIT_ENABLED = _settings.rate_limit_enabled
+
+# shared by every worker on the host, so N workers still allow the configured
+# rate and not N times it. "redis://..." for workers spread over hosts,
+# "memory://" for the old per-process counters.
+RATE_LIMIT_STORAGE_URI = _settings.rate_limit_storage_uri
+# two counters per identity and route, whatever the request rate
+RATE_LIMIT_STRATEGY = _settings.rate_limit_strategy
+
+# GET /books and /books/{book_id}, per user for authenticated callers and
+# per address for everybody else
+CATALOG_QUOTAS = {
+    Roles.ADMIN.value: _settings.rate_limit_catalog_admin,
+    Roles.LIBRARIAN.value: _settings.rate_limit_catalog_librarian,
+    Roles.STUDENT.value: _settings.rate_limit_catalog_student,
+}
+CATALOG_ANONYMOUS_QUOTA = _settings.rate_limit_catalog_anonymous
+
+def rate_limit_key(request: Request):
+    # "user:<id>:<role>" for a valid access token, "ip:<address>" otherwise.
+    # The token is verified: an unsigned one could pick any bucket it liked.
+    key = getattr(request.state, "rate_limit_key", None)
+    if key is not None:
+        return key
+
+    key = f"ip:{get_remote_address(request)}"
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            claims = decode_access_token(token)
+            if claims.get("sub"):
+                key = f"user:{claims['sub']}:{claims.get('role', '')}"
+        except JWTError:
+            pass
+
+    request.state.rate_limit_key = key
+    return key
+
+def catalog_quota(key: str):
+    if key.startswith("user:"):
+        role = key.rsplit(":", 1)[1]
+        return CATALOG_QUOTAS.get(role, CATALOG_ANONYMOUS_QUOTA)
+    return CATALOG_ANONYMOUS_QUOTA
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    enabled=RATE_LIMIT_ENABLED,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    # a storage outage falls back to per-process counters instead of failing requests
+    in_memory_fallback_enabled=True
+)
@@ -1,20 +1,93 @@
+from functools import lru_cache
 from typing import Any
-from fastapi.responses import JSONResponse
+import json
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# distinguishes "not a paginated listing" from "last page" (next_cursor=None)
+_NOT_PAGINATED = object()
+
+def _dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option = orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii = False, allow_nan = False, separators = (",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    # JSONResponse encoded with orjson when it is installed
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+@lru_cache(maxsize = None)
+def _list_adapter(schema):
+    return TypeAdapter(list[schema])
+
+def dump_list(schema, rows) -> bytes:
+    # validates and serializes the whole list in one pydantic-core call
+    # instead of a model_validate/model_dump round trip per row. rows may be
+    # ORM objects or Row tuples from response_columns()
+    adapter = _list_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes = True))
+
+def dump_list_data(schema, rows) -> list:
+    # dump_list as plain JSON-ready data, for values that get cached
+    adapter = _list_adapter(schema)
+    return adapter.dump_python(adapter.validate_python(rows, from_attributes = True), mode = "json")
+
+def response_columns(schema, model):
+    # the model columns a response schema reads, selecting these instead of
+    # the entity skips ORM hydration and the identity map for list endpoints
+    return [getattr(model, field) for field in schema.model_fields]
 
 def success_response(
     *,
     message: str = "Success",
     data: Any = None,
-    status_code: int = 200
+    status_code: int = 200,
+    next_cursor: Any = _NOT_PAGINATED,
+    headers: dict | None = None
+):
+    content = {
+        "success": True,
+        "message": message,
+        "data": data,
+        "error": None
+    }
+    if next_cursor is not _NOT_PAGINATED:
+        content["next_cursor"] = next_cursor
+
+    return FastJSONResponse(
+        status_code=status_code,
+        content=content,
+        headers=headers
+    )
+
+def list_response(
+    schema,
+    rows,
+    *,
+    message: str = "Success",
+    status_code: int = 200,
+    next_cursor: Any = _NOT_PAGINATED,
+    headers: dict | None = None
 ):
-    return JSONResponse(
+    # same envelope as success_response, the pre-encoded list is spliced in
+    # rather than decoded and encoded a second time
+    parts = [b'{"success":true,"message":', _dumps(message), b',"data":', dump_list(schema, rows), b',"error":null']
+    if next_cursor is not _NOT_PAGINATED:
+        parts += [b',"next_cursor":', _dumps(next_cursor)]
+    parts.append(b"}")
+
+    return Response(
+        content=b"".join(parts),
         status_code=status_code,
-        content={
-            "success": True,
-            "message": message,
-            "data": data,
-            "error": None
-        }
+        headers=headers,
+        media_type="application/json"
     )
 
 
@@ -25,7 +98,7 @@ def error_response(
     status_code: int,
     details: str | None = None
 ):
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
         content={
             "success": False,
@@ -0,0 +1,178 @@
+import re
+
+from sqlalchemy import select, delete, insert, func, case, or_, and_
+from sqlalchemy.orm import Session
+
+from app.models.book import Book
+from app.models.book_search_token import BookSearchToken
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# "index" uses the word/prefix/trigram side table, "ilike" keeps the old
+# full scan
+SEARCH_BACKEND = _settings.search_backend
+
+WORD_WEIGHT = 3
+PREFIX_WEIGHT = 1
+# an infix match ("graphy" in "Oceanography") is found but adds nothing to
+# the score, it ranks below every word and prefix match
+TRIGRAM_WEIGHT = 0
+
+MIN_PREFIX = 2
+MAX_PREFIX = 20
+
+_WORD_RE = re.compile(r"[0-9a-z]+")
+# an isbn-10 (check digit may be X) or isbn-13 once spaces and hyphens are gone
+_ISBN_RE = re.compile(r"[0-9]{9}[0-9xX]|[0-9]{13}")
+
+def _words(text: str):
+    return _WORD_RE.findall(text.lower())
+
+def trigrams(word: str):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def book_tokens(name: str, isbn: str):
+    # token -> weight, a whole word match ranks above a prefix match, the
+    # trigrams of every word let a query word match inside one
+    tokens = {}
+    words = _words(name)
+    # isbn is indexed as one word so "978-0-13" and "978013" both hit
+    words.append("".join(_words(isbn)))
+
+    for word in words:
+        if len(word) < MIN_PREFIX:
+            continue
+        tokens[f"w:{word[:62]}"] = WORD_WEIGHT
+        for size in range(MIN_PREFIX, min(len(word), MAX_PREFIX) + 1):
+            tokens.setdefault(f"p:{word[:size]}", PREFIX_WEIGHT)
+        for trigram in trigrams(word[:62]):
+            tokens.setdefault(f"t:{trigram}", TRIGRAM_WEIGHT)
+    return tokens
+
+def query_words(search: str):
+    if _ISBN_RE.fullmatch(re.sub(r"[\s\-]", "", search)):
+        # looks like an isbn, match it the way it was indexed
+        words = {"".join(_words(search))}
+    else:
+        words = set(_words(search))
+    return sorted(w for w in words if len(w) >= MIN_PREFIX)
+
+def query_tokens(search: str):
+    words = query_words(search)
+    word_tokens = {f"w:{w[:62]}" for w in words}
+    prefix_tokens = {f"p:{w[:MAX_PREFIX]}" for w in words}
+    return word_tokens, prefix_tokens
+
+def can_use_index(search: str):
+    _, prefix_tokens = query_tokens(search)
+    return SEARCH_BACKEND == "index" and bool(prefix_tokens)
+
+def match_subquery(search: str):
+    # every query word has to start some word of the title (or the isbn), or
+    # failing that sit inside one. The score is the summed weight of all
+    # matched tokens. The trigrams only narrow the candidates, they may come
+    # from different words ("graph physics" has every trigram of "graphy"),
+    # so match_filter confirms the infix matches against the row.
+    words = query_words(search)
+    word_tokens, prefix_tokens = query_tokens(search)
+    trigram_tokens = {f"t:{trigram}" for w in words for trigram in trigrams(w[:62])}
+
+    columns = []
+    conditions = []
+    for i, word in enumerate(words):
+        prefix_hit = func.sum(case((BookSearchToken.token == f"p:{word[:MAX_PREFIX]}", 1), else_=0))
+        columns.append(prefix_hit.label(f"prefix_{i}"))
+        word_trigrams = {f"t:{trigram}" for trigram in trigrams(word[:62])}
+        if word_trigrams:
+            trigram_hits = func.sum(case((BookSearchToken.token.in_(word_trigrams), 1), else_=0))
+            conditions.append(or_(prefix_hit > 0, trigram_hits == len(word_trigrams)))
+        else:
+            # two letters have no trigram, they only match as a prefix
+            conditions.append(prefix_hit > 0)
+
+    return (
+        select(
+            BookSearchToken.book_id.label("book_id"),
+            func.sum(BookSearchToken.weight).label("score"),
+            *columns
+        )
+        .where(BookSearchToken.token.in_(word_tokens | prefix_tokens | trigram_tokens))
+        .group_by(BookSearchToken.book_id)
+        .having(and_(*conditions))
+        .subquery()
+    )
+
+def match_filter(search: str, match):
+    # a query word that is no prefix has to really be in the name or the isbn
+    isbn = func.replace(func.replace(Book.isbn, "-", ""), " ", "")
+    return and_(*[
+        or_(match.c[f"prefix_{i}"] > 0, Book.name.ilike(f"%{word}%"), isbn.ilike(f"%{word}%"))
+        for i, word in enumerate(query_words(search))
+    ])
+
+def index_book(db: Session, book: Book):
+    unindex_book(db, book.id)
+    rows = [
+        {"token": token, "book_id": book.id, "weight": weight}
+        for token, weight in book_tokens(book.name, book.isbn).items()
+    ]
+    if rows:
+        db.execute(insert(BookSearchToken.__table__), rows)
+
+def unindex_book(db: Session, book_id: int):
+    db.execute(delete(BookSearchToken).where(BookSearchToken.book_id == book_id))
+
+def index_books(db: Session, books):
+    # bulk version of index_book for rows with id, name and isbn. Token rows
+    # go through the Core table, the ORM bulk path costs more than the insert
+    book_ids = [b.id for b in books]
+    if not book_ids:
+        return
+    db.execute(delete(BookSearchToken).where(BookSearchToken.book_id.in_(book_ids)))
+    rows = [
+        {"token": token, "book_id": b.id, "weight": weight}
+        for b in books
+        for token, weight in book_tokens(b.name, b.isbn).items()
+    ]
+    if rows:
+        db.execute(insert(BookSearchToken.__table__), rows)
+
+def rebuild_search_index(db: Session, batch_size: int = 1000):
+    db.execute(delete(BookSearchToken))
+
+    last_id = 0
+    indexed = 0
+    while True:
+        books = db.execute(
+            select(Book.id, Book.name, Book.isbn)
+            .where(Book.id > last_id)
+            .order_by(Book.id)
+            .limit(batch_size)
+        ).all()
+        if not books:
+            break
+
+        rows = [
+            {"token": token, "book_id": b.id, "weight": weight}
+            for b in books
+            for token, weight in book_tokens(b.name, b.isbn).items()
+        ]
+        if rows:
+            db.execute(insert(BookSearchToken.__table__), rows)
+        db.commit()
+
+        last_id = books[-1].id
+        indexed += len(books)
+
+    return indexed
+
+if __name__ == "__main__":
+    # backfill for catalogs that existed before the index: python -m app.core.search
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Indexed {rebuild_search_index(db)} books")
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import Settings
+from app.core.database import Base, SessionLocal, get_engine
+from app.core.metrics import registry
+from app.core.migrations import run_migrations, MIGRATE_ON_STARTUP
+from app.core.token_denylist import denylist_sync, TOKEN_DENYLIST_SYNC_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# milliseconds per startup phase of this process, import included
+startup_timings = {}
+
+@contextmanager
+def _phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+def initialize_database(settings: Settings):
+    engine = get_engine()
+    # create_all only makes missing tables, columns and indexes added to
+    # existing tables come from the versioned migrations in app/migrations
+    if settings.create_tables_on_startup:
+        Base.metadata.create_all(bind = engine)
+    if MIGRATE_ON_STARTUP:
+        run_migrations(engine)
+
+def warm_up_pool(count: int):
+    # opened together so the pool really holds count connections afterwards
+    engine = get_engine()
+    connections = [engine.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+
+async def warm_up_async_pool(count: int):
+    from app.core.async_database import get_async_engine
+
+    engine = get_async_engine()
+    connections = [await engine.connect() for _ in range(count)]
+    for connection in connections:
+        await connection.close()
+
+def warm_up_caches():
+    from app.controllers.book_controller import search_books_cached
+    from app.core.catalog_version import get_catalog_version
+    from app.utils.hash_executor import hash_executor
+    from app.utils.security import hash_refresh_token
+
+    # the page every client opens with: GET /books/ without parameters
+    db = SessionLocal()
+    try:
+        search_books_cached(db = db, search = None, in_stock = None, sort_by = None, order = "asc", page = 1, limit = 10, cursor = None,
+                            version = get_catalog_version(db))
+    finally:
+        db.close()
+    hash_executor.warm_up(hash_refresh_token, "warm-up")
+
+async def startup(settings: Settings, import_ms: float):
+    # runs in the lifespan, so a database that is down fails the worker's
+    # startup with a clear error instead of the import of app.main
+    startup_timings["import"] = round(import_ms, 2)
+    with _phase("database"):
+        await run_in_threadpool(initialize_database, settings)
+    # beyond pool_size they would be closed again on return
+    connections = min(settings.warmup_connections, settings.db_pool_size)
+    if connections > 0:
+        with _phase("pool"):
+            await run_in_threadpool(warm_up_pool, connections)
+            if settings.db_mode == "async":
+                await warm_up_async_pool(connections)
+    if TOKEN_DENYLIST_SYNC_ENABLED:
+        # the sessions revoked on other workers within an access token lifetime
+        with _phase("denylist"):
+            await run_in_threadpool(denylist_sync.run)
+    if settings.warmup_caches:
+        with _phase("caches"):
+            await run_in_threadpool(warm_up_caches)
+    startup_timings["total"] = round(sum(v for k, v in startup_timings.items() if k != "total"), 2)
+
+    report = json.dumps({"event": "startup", "budget_ms": settings.startup_budget_ms, **{f"{k}_ms": v for k, v in startup_timings.items()}})
+    if settings.startup_budget_ms > 0 and startup_timings["total"] > settings.startup_budget_ms:
+        logger.warning(report)
+    else:
+        logger.info(report)
+
+@registry.collector
+def _startup_collector():
+    return [
+        ("library_startup_seconds", "gauge", "Time spent per startup phase of this process.",
+            [({"phase": phase}, round(ms / 1000, 6)) for phase, ms in startup_timings.items()])
+    ]
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+import hashlib
+import math
+import threading
+import time
+
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.core.jobs import PeriodicJob
+from app.models.refresh_token import RefreshToken
+from app.utils.security import ACCESS_TOKEN_EXPIRE_MINUTES, access_token_exp
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# revoked access tokens held at once before the filter is rebuilt larger
+TOKEN_DENYLIST_CAPACITY = _settings.token_denylist_capacity
+TOKEN_DENYLIST_ERROR_RATE = _settings.token_denylist_error_rate
+# how often expired entries are dropped and the filter rebuilt from the rest
+TOKEN_DENYLIST_SWEEP_INTERVAL = _settings.token_denylist_sweep_interval
+# how often a worker picks up the revocations made by the other workers,
+# the longest a revoked access token stays usable on another worker
+TOKEN_DENYLIST_SYNC_ENABLED = _settings.token_denylist_sync_enabled
+TOKEN_DENYLIST_SYNC_INTERVAL = _settings.token_denylist_sync_interval
+
+class BloomFilter:
+    # k bit positions per key from one blake2b digest (double hashing)
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size = 16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenDenylist:
+    # jti -> exp of the revoked access tokens that have not expired yet. Almost
+    # every check is for a token that was never revoked, the filter answers
+    # those without the lock or the exact set; a maybe is confirmed exactly,
+    # so a false positive costs a dict lookup, never a rejected request.
+
+    def __init__(self, capacity: int, error_rate: float, sweep_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sweep_interval = sweep_interval
+        self.denied = 0
+        self.false_positives = 0
+        self._expiry = {}
+        self._filter = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+
+    def add(self, jti: str, exp: float):
+        self.add_many([(jti, exp)])
+
+    def add_many(self, tokens):
+        now = time.time()
+        with self._lock:
+            for jti, exp in tokens:
+                # an expired token is rejected by its signature check already
+                if jti is None or exp <= now:
+                    continue
+                self._expiry[jti] = max(exp, self._expiry.get(jti, 0))
+                self._filter.add(jti)
+            if now >= self._next_sweep or len(self._expiry) > self.capacity:
+                self._sweep(now)
+
+    def is_denied(self, jti: str | None):
+        if jti is None or jti not in self._filter:
+            return False
+        exp = self._expiry.get(jti)
+        if exp is None or exp <= time.time():
+            self.false_positives += 1
+            return False
+        self.denied += 1
+        return True
+
+    def _sweep(self, now: float):
+        # entries leave with their tokens; a bloom filter can not forget a
+        # key, so it is rebuilt from what is left and swapped in
+        live = {jti: exp for jti, exp in self._expiry.items() if exp > now}
+        self.capacity = max(self.capacity, 2 * len(live))
+        rebuilt = BloomFilter(self.capacity, self.error_rate)
+        for jti in live:
+            rebuilt.add(jti)
+        self._expiry = live
+        self._filter = rebuilt
+        self._next_sweep = now + self.sweep_interval
+
+    def stats(self):
+        return {
+            "size": len(self._expiry),
+            "filter_bytes": len(self._filter.bits),
+            "denied": self.denied,
+            "false_positives": self.false_positives
+        }
+
+    def clear(self):
+        with self._lock:
+            self._expiry = {}
+            self._filter = BloomFilter(self.capacity, self.error_rate)
+
+token_denylist = TokenDenylist(TOKEN_DENYLIST_CAPACITY, TOKEN_DENYLIST_ERROR_RATE, TOKEN_DENYLIST_SWEEP_INTERVAL)
+
+def recent_access_tokens(condition, now: datetime):
+    # the access tokens issued with these refresh tokens that can still be
+    # valid, as (jti, exp) pairs for the denylist
+    return (
+        select(RefreshToken.access_jti, RefreshToken.created_at)
+        .where(condition, RefreshToken.access_jti.is_not(None), RefreshToken.created_at >= now - timedelta(minutes = ACCESS_TOKEN_EXPIRE_MINUTES))
+    )
+
+def deny_rows(rows):
+    token_denylist.add_many([(jti, access_token_exp(created_at)) for jti, created_at in rows])
+
+class DenylistSync:
+    # revocations are written with revoked_at, every worker reads the new
+    # ones through ix_refresh_tokens_revoked_at. The watermark starts one
+    # access token lifetime back so a fresh worker knows all that matter.
+
+    # revoked_at is set before the commit, a transaction that commits up to
+    # this much later (or a worker clock behind ours) is still picked up.
+    # Re-adding an entry is harmless.
+    OVERLAP = timedelta(seconds = 5)
+
+    def __init__(self):
+        self.watermark = datetime.now() - timedelta(minutes = ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    def run(self, db = None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            now = datetime.now()
+            rows = db.execute(recent_access_tokens(RefreshToken.revoked_at >= self.watermark - self.OVERLAP, now)).all()
+            deny_rows(rows)
+            self.watermark = now
+            return len(rows)
+        finally:
+            if own_session:
+                db.close()
+
+denylist_sync = DenylistSync()
+
+# no lock: each worker reads the revocations into its own denylist
+token_denylist_job = PeriodicJob("token-denylist-sync", TOKEN_DENYLIST_SYNC_INTERVAL, denylist_sync.run)
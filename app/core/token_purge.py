@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.jobs import PeriodicJob
+from app.models.refresh_token import RefreshToken
+from app.utils.security import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PURGE_ENABLED = _settings.token_purge_enabled
+TOKEN_PURGE_INTERVAL = _settings.token_purge_interval
+TOKEN_PURGE_BATCH_SIZE = _settings.token_purge_batch_size
+
+def _purge_where(db: Session, condition, order_by, batch_size: int):
+    # small id batches, each in its own transaction, so the purge never holds
+    # locks on a large range of a table that logins keep inserting into
+    purged = 0
+    while True:
+        ids = db.execute(
+            select(RefreshToken.id).where(condition).order_by(order_by).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+        db.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
+
+def purge_refresh_tokens(db: Session, batch_size: int = TOKEN_PURGE_BATCH_SIZE, now: datetime | None = None):
+    now = now or datetime.now()
+    # two passes so each one is served by its own index
+    expired = _purge_where(db, RefreshToken.expires_at < now, RefreshToken.expires_at, batch_size)
+    # revoked sessions once their access tokens have run out, the denylist
+    # sync reads them until then. Rotated tokens stay until they expire, a
+    # replayed one must still be recognised to revoke its family.
+    revoked_before = now - timedelta(minutes = ACCESS_TOKEN_EXPIRE_MINUTES)
+    revoked = _purge_where(db, RefreshToken.revoked_at < revoked_before, RefreshToken.revoked_at, batch_size)
+    return expired + revoked
+
+def _run_purge():
+    db = SessionLocal()
+    try:
+        purged = purge_refresh_tokens(db)
+        if purged:
+            logger.info("purged %s refresh tokens", purged)
+    finally:
+        db.close()
+
+token_purge_job = PeriodicJob("refresh-token-purge", TOKEN_PURGE_INTERVAL, _run_purge, lock = "library_token_purge")
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import threading
+import time
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# users whose version a worker keeps, and how long it trusts the one it
+# last read for a user
+TOKEN_VERSION_CACHE_SIZE = _settings.token_version_cache_size
+TOKEN_VERSION_TTL = _settings.token_version_ttl
+
+class TokenVersionCache:
+    # user id -> current users.token_version, so a claims-only role check can
+    # reject stale tokens with a dict lookup instead of a query. Bounded LRU
+    # with a TTL like the principal cache, every user who ever sent a token
+    # would otherwise stay in it for the life of the worker.
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._versions[user_id]
+                return None
+            self._versions.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, version: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._versions[user_id] = (time.monotonic() + self.ttl, version)
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.maxsize:
+                self._versions.popitem(last = False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+
+token_versions = TokenVersionCache(TOKEN_VERSION_CACHE_SIZE, TOKEN_VERSION_TTL)
@@ -14,4 +14,8 @@ class MyHTTPException(AppException):
     status_code = 401
     error_code = "AUTHENTICATION_FAILED"
     message = "Cound not validate Credentials"
-     
\ No newline at end of file
+
+class HashingBusy(AppException):
+    status_code = 503
+    error_code = "HASHING_BUSY"
+    message = "Too many password operations in progress. Please try again."
@@ -0,0 +1,6 @@
+from app.exceptions.base import AppException
+
+class InvalidCursor(AppException):
+    status_code = 400
+    error_code = "INVALID_CURSOR"
+    message = "Invalid pagination cursor!"
@@ -1,42 +1,92 @@
+import time
+_import_started = time.perf_counter()
+
+# first, it loads .env before the modules below read their settings
+from app.core.config import get_settings
+
 from fastapi import FastAPI, Request,HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
 
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from app.core.rate_limiter import limiter
 
-from app.core.database import Base, engine
+from app.core.database import DB_MODE
+from app.core.backends import get_backend
 from app.core.response import error_response
-from app.models import book,loan,role,user,refresh_token,audit_log
-from app.api import books, auth, users, loans
+from app.core.etag import NotModified
+from app.core.token_purge import token_purge_job, TOKEN_PURGE_ENABLED
+from app.core.token_denylist import token_denylist_job, TOKEN_DENYLIST_SYNC_ENABLED
+from app.core.principal_cache import principal_sync_job, PRINCIPAL_CACHE_SYNC_ENABLED
+from app.core.overdue import overdue_sweep_job, OVERDUE_SWEEP_ENABLED
+from app.core.audit import audit_writer, AUDIT_MODE
+from app.core.startup import startup
+from app.core.profiling import ProfilingMiddleware
+from app.core.query_budget import QueryBudgetMiddleware, QUERY_BUDGET_MODE
+from app.core.metrics import MetricsMiddleware, METRICS_ENABLED, CONTENT_TYPE, rate_limited, render as render_metrics
+from app.utils.hash_executor import hash_executor
+from app.models import book,loan,role,user,refresh_token,audit_log,book_search_token,catalog_version,circulation_stats
 
 from app.exceptions.base import AppException
 from app.exceptions.auth import AuthenticationError, AuthorizationError
 from app.exceptions.book import BookNotFound,BookOutOfStock
 from app.exceptions.loan import AlreadyBorrowed,LoanNotFound,InvalidLoanOperation
 from app.exceptions.user import UserNotFound,UserLoanPending,UserEmailAlreadyExists
+from app.exceptions.pagination import InvalidCursor
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup(get_settings(), _import_ms)
+    if TOKEN_PURGE_ENABLED:
+        token_purge_job.start()
+    if OVERDUE_SWEEP_ENABLED:
+        overdue_sweep_job.start()
+    if TOKEN_DENYLIST_SYNC_ENABLED:
+        token_denylist_job.start()
+    if PRINCIPAL_CACHE_SYNC_ENABLED:
+        principal_sync_job.start()
+    if AUDIT_MODE == "async":
+        audit_writer.start()
+    yield
+    token_purge_job.stop()
+    overdue_sweep_job.stop()
+    token_denylist_job.stop()
+    principal_sync_job.stop()
+    audit_writer.stop()
+    hash_executor.shutdown()
 
-app = FastAPI(title = "Library Management System")
+app = FastAPI(title = "Library Management System", lifespan = lifespan)
 
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
+app.add_middleware(MetricsMiddleware)
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode = QUERY_BUDGET_MODE)
+# added last so it is outermost and times everything, rate limiting included
+app.add_middleware(ProfilingMiddleware)
 
-Base.metadata.create_all(bind = engine)
+from app.api import books, auth, users, loans, stats
 
-app.include_router(books.router)
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(loans.router)
+# one set of routes, DB_MODE picks the session and controllers behind them
+backend = get_backend(DB_MODE)
+for api in (books, auth, users, loans, stats):
+    app.include_router(api.build_router(backend))
 
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    rate_limited.inc(getattr(request.scope.get("route"), "path", None) or "unmatched")
     return error_response(
         message="Too many requests. Please try again later.",
         error_code="TOO_MANY_REQUESTS",
         status_code=429
     )
 
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
 @app.exception_handler(AppException)
 async def app_exception_handler(request: Request, exc: AppException):
     return error_response(
@@ -59,4 +109,11 @@ def home():
 
 @app.get("/health")
 def health_check():
-    return { "message" : "Library app is running!"}
\ No newline at end of file
+    return { "message" : "Library app is running!"}
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema = False)
+    def metrics():
+        return Response(content = render_metrics(), media_type = CONTENT_TYPE)
+
+_import_ms = (time.perf_counter() - _import_started) * 1000
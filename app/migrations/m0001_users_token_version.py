@@ -0,0 +1,8 @@
+from app.models.user import User
+
+VERSION = 1
+DESCRIPTION = "users.token_version and the active users keyset index"
+
+def upgrade(ops):
+    ops.add_column(User.__table__.c.token_version)
+    ops.create_index(ops.index(User, "ix_users_is_active_id"))
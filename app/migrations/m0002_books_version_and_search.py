@@ -0,0 +1,22 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.search import rebuild_search_index
+from app.models.book import Book
+from app.models.book_search_token import BookSearchToken
+
+VERSION = 2
+DESCRIPTION = "books.version, the catalog keyset indexes and the search token backfill"
+
+def upgrade(ops):
+    ops.add_column(Book.__table__.c.version)
+    ops.create_index(ops.index(Book, "ix_books_name_id"))
+    ops.create_index(ops.index(Book, "ix_books_stock_id"))
+
+    # create_all made the token table empty, books that predate it are not
+    # searchable until they are tokenized
+    with Session(bind = ops.engine) as db:
+        has_books = db.scalar(select(func.count()).select_from(Book)) > 0
+        has_tokens = db.scalar(select(BookSearchToken.book_id).limit(1)) is not None
+        if has_books and not has_tokens:
+            rebuild_search_index(db)
@@ -0,0 +1,39 @@
+from sqlalchemy import Boolean, Column, Index, Integer, MetaData, String, Table, bindparam, select
+
+from app.models.refresh_token import RefreshToken
+from app.utils.security import hash_refresh_token
+
+VERSION = 3
+DESCRIPTION = "refresh_tokens stores sha256 hashes instead of the tokens"
+
+# the table as it was, only what the backfill touches. token_hash is added
+# nullable, existing rows have no value until the backfill reaches them.
+_old = Table(
+    "refresh_tokens", MetaData(),
+    Column("id", Integer, primary_key = True),
+    Column("token", String),
+    Column("token_hash", String(64), nullable = True),
+    Column("is_revoked", Boolean),
+)
+
+def upgrade(ops):
+    ops.add_column(_old.c.token_hash)
+
+    if ops.has_column("refresh_tokens", "token"):
+        query = select(_old.c.id, _old.c.token).where(_old.c.token_hash.is_(None))
+        update = _old.update().where(_old.c.id == bindparam("row_id"))
+        for rows in ops.batches(query):
+            with ops.engine.begin() as conn:
+                conn.execute(update, [
+                    {"row_id": row.id, "token_hash": hash_refresh_token(row.token)} for row in rows
+                ])
+
+    ops.create_index(Index("uq_refresh_tokens_token_hash", _old.c.token_hash, unique = True))
+    ops.create_index(ops.index(RefreshToken, "ix_refresh_tokens_expires_at"))
+    ops.create_index(ops.index(RefreshToken, "ix_refresh_tokens_user_id_is_revoked"))
+    # no longer on the model, m0012 drops it again
+    ops.create_index(Index("ix_refresh_tokens_is_revoked_id", _old.c.is_revoked, _old.c.id))
+
+    # the plain tokens go last: NOT NULL and unwritten by the current code,
+    # inserts fail until the column is gone
+    ops.drop_column("refresh_tokens", "token")
@@ -0,0 +1,10 @@
+from app.models.audit_log import AuditLog
+
+VERSION = 4
+DESCRIPTION = "audit_logs keyset indexes for each listing filter"
+
+def upgrade(ops):
+    ops.create_index(ops.index(AuditLog, "ix_audit_logs_created_at_id"))
+    ops.create_index(ops.index(AuditLog, "ix_audit_logs_action_created_at_id"))
+    ops.create_index(ops.index(AuditLog, "ix_audit_logs_entity_created_at_id"))
+    ops.create_index(ops.index(AuditLog, "ix_audit_logs_performed_by_created_at_id"))
@@ -0,0 +1,27 @@
+from sqlalchemy import select, update
+
+from app.models.loan import Loan
+
+VERSION = 5
+DESCRIPTION = "loans.active_marker, one active loan per (user, book)"
+
+def upgrade(ops):
+    ops.add_column(Loan.__table__.c.active_marker)
+
+    # the oldest active loan of each (user, book) gets the marker. Batches
+    # come in id order, so the first one seen for a pair is the oldest; any
+    # duplicates the old check-then-insert let through stay active unmarked
+    # and the unique index can still be built.
+    seen = set()
+    query = select(Loan.id, Loan.user_id, Loan.book_id).where(Loan.is_active == True)
+    for rows in ops.batches(query):
+        marked = []
+        for row in rows:
+            if (row.user_id, row.book_id) not in seen:
+                seen.add((row.user_id, row.book_id))
+                marked.append(row.id)
+        if marked:
+            ops.execute(update(Loan).where(Loan.id.in_(marked)).values(active_marker = True))
+
+    ops.create_index(ops.index(Loan, "uq_loans_active_user_book"))
+    ops.create_index(ops.index(Loan, "ix_loans_user_id_id"))
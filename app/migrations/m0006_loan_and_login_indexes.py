@@ -0,0 +1,9 @@
+from app.models.loan import Loan
+from app.models.user import User
+
+VERSION = 6
+DESCRIPTION = "active loans by user and login by email indexes"
+
+def upgrade(ops):
+    ops.create_index(ops.index(Loan, "ix_loans_user_id_is_active_book_id"))
+    ops.create_index(ops.index(User, "ix_users_email_is_active"))
@@ -0,0 +1,11 @@
+from app.models.loan import Loan
+
+VERSION = 7
+DESCRIPTION = "loans.is_overdue, loans.fine_cents and the due date index"
+
+def upgrade(ops):
+    # both columns have server defaults, existing loans start at not overdue
+    # and no fine until the first sweep
+    ops.add_column(Loan.__table__.c.is_overdue)
+    ops.add_column(Loan.__table__.c.fine_cents)
+    ops.create_index(ops.index(Loan, "ix_loans_is_active_due_date_id"))
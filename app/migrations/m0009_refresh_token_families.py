@@ -0,0 +1,13 @@
+from app.models.refresh_token import RefreshToken
+
+VERSION = 9
+DESCRIPTION = "refresh_tokens.family_id, access_jti and revoked_at with their indexes"
+
+def upgrade(ops):
+    # all nullable: tokens issued before this are a family of their own and
+    # their access tokens carry no jti to deny, both run out within days
+    ops.add_column(RefreshToken.__table__.c.family_id)
+    ops.add_column(RefreshToken.__table__.c.access_jti)
+    ops.add_column(RefreshToken.__table__.c.revoked_at)
+    ops.create_index(ops.index(RefreshToken, "ix_refresh_tokens_family_id"))
+    ops.create_index(ops.index(RefreshToken, "ix_refresh_tokens_revoked_at"))
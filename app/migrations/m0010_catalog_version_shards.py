@@ -0,0 +1,18 @@
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core.catalog_version import CATALOG_VERSION_SHARDS
+from app.models.catalog_version import CatalogVersion
+
+VERSION = 10
+DESCRIPTION = "catalog_version shard rows"
+
+def upgrade(ops):
+    # the existing row stays shard 1 with its count, the sum carries on from
+    # it; creating the others up front keeps the first bumps free of races
+    with Session(bind = ops.engine) as db:
+        existing = set(db.scalars(select(CatalogVersion.id)))
+        missing = [{"id": shard, "version": 0} for shard in range(1, CATALOG_VERSION_SHARDS + 1) if shard not in existing]
+        if missing:
+            db.execute(insert(CatalogVersion), missing)
+        db.commit()
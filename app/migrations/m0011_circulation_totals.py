@@ -0,0 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.circulation import rebuild_circulation_totals
+from app.models.circulation_stats import CirculationTotals
+
+VERSION = 11
+DESCRIPTION = "circulation_totals row for the circulation summary"
+
+def upgrade(ops):
+    # create_all made the table; counted once from the per-book counters and
+    # the stock, every later commit keeps it current
+    with Session(bind = ops.engine) as db:
+        if db.scalar(select(CirculationTotals.id)) is None:
+            rebuild_circulation_totals(db)
+            db.commit()
@@ -0,0 +1,7 @@
+VERSION = 12
+DESCRIPTION = "drop refresh_tokens ix_refresh_tokens_is_revoked_id"
+
+def upgrade(ops):
+    # the purge reads by expires_at and revoked_at since m0009, each with its
+    # own index; this one only cost every login and rotation a write
+    ops.drop_index("refresh_tokens", "ix_refresh_tokens_is_revoked_id")
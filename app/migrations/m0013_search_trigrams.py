@@ -0,0 +1,15 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.search import rebuild_search_index
+from app.models.book import Book
+
+VERSION = 13
+DESCRIPTION = "retokenize the catalog with the trigram search tokens"
+
+def upgrade(ops):
+    # books indexed before this have only word and prefix tokens, a query
+    # word inside a title would not find them
+    with Session(bind = ops.engine) as db:
+        if db.scalar(select(func.count()).select_from(Book)) > 0:
+            rebuild_search_index(db)
@@ -0,0 +1,8 @@
+from app.models.user import User
+
+VERSION = 14
+DESCRIPTION = "users updated_at and deleted_at indexes for the principal cache sync"
+
+def upgrade(ops):
+    ops.create_index(ops.index(User, "ix_users_updated_at"))
+    ops.create_index(ops.index(User, "ix_users_deleted_at"))
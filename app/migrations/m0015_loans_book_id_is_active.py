@@ -0,0 +1,7 @@
+from app.models.loan import Loan
+
+VERSION = 15
+DESCRIPTION = "active loans by book index for the catalog import"
+
+def upgrade(ops):
+    ops.create_index(ops.index(Loan, "ix_loans_book_id_is_active"))
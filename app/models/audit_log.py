@@ -1,4 +1,4 @@
-from sqlalchemy import Integer,String,Column, TIMESTAMP, ForeignKey
+from sqlalchemy import Integer,String,Column, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -12,4 +12,13 @@ class AuditLog(Base):
     performed_by = Column(Integer, ForeignKey("users.id"), nullable = True)
     
     message = Column(String(255), nullable = True)
-    created_at = Column(TIMESTAMP, default=func.now())
\ No newline at end of file
+    created_at = Column(TIMESTAMP, default=func.now())
+
+    # every listing is newest first on (created_at, id), each filter gets an
+    # index that ends in those two columns so the keyset seek stays an index range
+    __table_args__ = (
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_audit_logs_action_created_at_id", "action", "created_at", "id"),
+        Index("ix_audit_logs_entity_created_at_id", "entity", "entity_id", "created_at", "id"),
+        Index("ix_audit_logs_performed_by_created_at_id", "performed_by", "created_at", "id"),
+    )
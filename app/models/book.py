@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, CheckConstraint
+from sqlalchemy import Column, Integer, String, CheckConstraint, Index
 from app.core.database import Base
 
 class Book(Base):
@@ -8,7 +8,12 @@ class Book(Base):
     name = Column(String(200), nullable=False)
     isbn = Column(String(20), unique=True, nullable=False)
     stock = Column(Integer, nullable=False)
+    # bumped by every change to the row, the ETag of GET /books/{book_id}
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     __table_args__ = (
         CheckConstraint("stock >= 0", name="check_stock_non_negative"),
+        # keyset pagination: (sort column, id)
+        Index("ix_books_name_id", "name", "id"),
+        Index("ix_books_stock_id", "stock", "id"),
     )
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from app.core.database import Base
+
+class BookSearchToken(Base):
+    __tablename__ = "book_search_tokens"
+
+    token = Column(String(64), primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True, index=True)
+    weight = Column(Integer, nullable=False, default=1)
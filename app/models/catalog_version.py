@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, BigInteger
+from app.core.database import Base
+
+class CatalogVersion(Base):
+    # CATALOG_VERSION_SHARDS rows, every transaction that changes books bumps
+    # the rows of their shards once; the catalog version is the sum
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
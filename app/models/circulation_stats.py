@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Index
+from app.core.database import Base
+
+# pre-aggregated circulation counters, kept current by the loan controllers
+# (app/core/circulation.py) so reports never read the loans table
+
+class BookCirculation(Base):
+    __tablename__ = "book_circulation"
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    total_borrows = Column(Integer, nullable=False, default=0)
+    total_returns = Column(Integer, nullable=False, default=0)
+    on_loan = Column(Integer, nullable=False, default=0)
+    last_borrowed_on = Column(Date, nullable=True)
+
+    __table_args__ = (
+        # all time top-N, read backwards
+        Index("ix_book_circulation_total_borrows_book_id", "total_borrows", "book_id"),
+    )
+
+class BookCirculationDaily(Base):
+    __tablename__ = "book_circulation_daily"
+
+    # day first: a date window is one range of the primary key
+    day = Column(Date, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    borrows = Column(Integer, nullable=False, default=0)
+    returns = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # one book's daily series
+        Index("ix_book_circulation_daily_book_id_day", "book_id", "day"),
+    )
+
+class CirculationTotals(Base):
+    # one row (id 1), the whole library: the summary reads this instead of
+    # adding up book_circulation and books
+    __tablename__ = "circulation_totals"
+
+    id = Column(Integer, primary_key=True)
+    on_loan = Column(Integer, nullable=False, default=0)
+    available = Column(Integer, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Date, ForeignKey, Boolean, Index, UniqueConstraint, text, false
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -13,6 +13,40 @@ class Loan(Base):
     
     returned_at = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True)
+    # True while the loan is active, NULL once returned. NULLs never collide
+    # in a unique index, so the constraint below allows any number of past
+    # loans but only one active loan per (user, book).
+    active_marker = Column(Boolean, nullable=True, default=True)
+    # kept up to date by the overdue sweeper (app/core/overdue.py), a
+    # returned loan keeps the fine of the last sweep before its return
+    is_overdue = Column(Boolean, nullable=False, default=False, server_default=false())
+    fine_cents = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User")
     book = relationship("Book")
+
+    __table_args__ = (
+        # keyset pagination of a user's loan history
+        Index("ix_loans_user_id_id", "user_id", "id"),
+        # a user's active loans: "my loans", the pending-loan check on user
+        # deletion and the batch borrow lookup. Partial where the database
+        # has them (returned loans pile up forever), a plain composite on MySQL.
+        Index(
+            "ix_loans_user_id_is_active_book_id", "user_id", "is_active", "book_id",
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active = true")
+        ),
+        # the overdue sweep and GET /loans/overdue: active loans in due date order
+        Index(
+            "ix_loans_is_active_due_date_id", "is_active", "due_date", "id",
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active = true")
+        ),
+        # the copies of a book on loan, read by the catalog import
+        Index(
+            "ix_loans_book_id_is_active", "book_id", "is_active",
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active = true")
+        ),
+        UniqueConstraint("user_id", "book_id", "active_marker", name="uq_loans_active_user_book"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer,Column,Boolean,String,DateTime,ForeignKey
+from sqlalchemy import Integer,Column,Boolean,String,DateTime,ForeignKey,Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -9,10 +9,24 @@ class RefreshToken(Base):
     
     id = Column(Integer,primary_key=True,index=True)
     user_id = Column(Integer,ForeignKey("users.id"), nullable=False)
-    token = Column(String,nullable=False)
-    expires_at = Column(DateTime, nullable = False)
+    # sha256 hex digest of the token, the token itself is never stored
+    token_hash = Column(String(64),nullable=False,unique=True)
+    expires_at = Column(DateTime, nullable = False, index = True)
+    # every token rotated out of the same login shares its family (session)
+    family_id = Column(String(32), nullable = True)
+    # the access token issued together with this refresh token
+    access_jti = Column(String(32), nullable = True)
+    # rotated tokens are only is_revoked, revoked_at marks a revoked family
     is_revoked = Column(Boolean, default = False)
+    revoked_at = Column(DateTime, nullable = True)
     created_at = Column(DateTime, default = datetime.now)
     
     user = relationship("User")
-    
\ No newline at end of file
+
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_is_revoked", "user_id", "is_revoked"),
+        # logout and reuse detection revoke one family
+        Index("ix_refresh_tokens_family_id", "family_id"),
+        # the denylist sync and the purge read revocations by time
+        Index("ix_refresh_tokens_revoked_at", "revoked_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -16,6 +16,19 @@ class User(Base):
     updated_at = Column(TIMESTAMP, nullable = True)
     deleted_at = Column(TIMESTAMP, nullable = True)
     deleted_by = Column(Integer, nullable = True)
+    # bumped on role change / deactivation, access tokens carry it as "ver"
+    token_version = Column(Integer, nullable = False, default = 0, server_default = "0")
     
     role = relationship("Role")
+
+    __table_args__ = (
+        # keyset pagination of active users
+        Index("ix_users_is_active_id", "is_active", "id"),
+        # login and the duplicate email checks, email is an unbounded VARCHAR
+        # on MySQL so only a prefix is indexed there
+        Index("ix_users_email_is_active", "email", "is_active", mysql_length={"email": 191}),
+        # the principal cache sync of every worker reads the recent changes
+        Index("ix_users_updated_at", "updated_at"),
+        Index("ix_users_deleted_at", "deleted_at"),
+    )
     
\ No newline at end of file
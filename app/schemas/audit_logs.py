@@ -1,5 +1,8 @@
+from datetime import datetime
 from enum import Enum
 
+from pydantic import BaseModel, ConfigDict
+
 class AuditAction(str, Enum):
     USER_CREATED = "USER_CREATED"
     USER_UPDATED = "USER_UPDATED"
@@ -9,4 +12,22 @@ class AuditAction(str, Enum):
     LOAN_CREATED = "LOAN_CREATED"
     LOAN_RETURNED = "LOAN_RETURNED"
 
-    TOKEN_REVOKED = "TOKEN_REVOKED"
\ No newline at end of file
+    TOKEN_REVOKED = "TOKEN_REVOKED"
+
+class AuditLogFilter(BaseModel):
+    action: AuditAction | None = None
+    entity: str | None = None
+    entity_id: int | None = None
+    performed_by: int | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+class AuditLogResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    action: str
+    entity: str
+    entity_id: int
+    performed_by: int | None
+    message: str | None
+    created_at: datetime | None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel 
+from pydantic import BaseModel, Field
 from datetime import date
 
 
@@ -16,4 +16,26 @@ class LoanResponse(BaseModel):
     is_active: bool
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class OverdueLoanResponse(LoanResponse):
+    is_overdue: bool
+    fine_cents: int
+
+class LoanBatchCreate(BaseModel):
+    book_ids: list[int] = Field(min_length=1, max_length=20)
+    due_date: date
+
+class LoanBatchReturn(BaseModel):
+    loan_ids: list[int] = Field(min_length=1, max_length=20)
+
+class LoanBatchError(BaseModel):
+    code: str
+    message: str
+
+class LoanBatchItem(BaseModel):
+    book_id: int | None = None
+    loan_id: int | None = None
+    success: bool
+    loan: LoanResponse | None = None
+    error: LoanBatchError | None = None
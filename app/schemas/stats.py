@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from datetime import date
+
+
+class DailyCirculation(BaseModel):
+    day: date
+    borrows: int
+    returns: int
+
+class TopBookResponse(BaseModel):
+    book_id: int
+    name: str
+    borrows: int
+    on_loan: int
+    stock: int
+    utilization: float
+
+class BookStatsResponse(BaseModel):
+    book_id: int
+    name: str
+    total_borrows: int
+    total_returns: int
+    on_loan: int
+    stock: int
+    utilization: float
+    last_borrowed_on: date | None
+    daily: list[DailyCirculation]
+
+class CirculationSummary(BaseModel):
+    on_loan: int
+    available: int
+    utilization: float
+    borrows_today: int
+    returns_today: int
@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import threading
+
+from starlette.concurrency import run_in_threadpool
+
+from app.exceptions.auth import HashingBusy
+from app.core.config import get_settings
+
+_settings = get_settings()
+
+# 0 workers runs bcrypt in the calling thread (the old behaviour), async
+# callers hand it to the threadpool
+HASH_WORKERS = _settings.hash_workers
+# calls allowed to wait for a worker, anything beyond is rejected at once
+HASH_QUEUE_SIZE = _settings.hash_queue_size
+
+class HashExecutor:
+    # bcrypt in a process pool: it does not hold the GIL of the web workers,
+    # and because admission is bounded a login storm can tie up at most
+    # workers + queue_size request threads instead of the whole threadpool
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rejected = 0
+        self.rebuilds = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn, forking a process that already runs threads is unsafe
+                    self._pool = ProcessPoolExecutor(
+                        max_workers = self.workers,
+                        mp_context = multiprocessing.get_context("spawn")
+                    )
+        return self._pool
+
+    def _discard(self, pool):
+        # a worker that died (OOM kill, segfault) breaks the whole pool for
+        # good; the next call builds a new one. Only the caller that still
+        # sees the broken pool swaps it, concurrent ones reuse the new pool.
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.rebuilds += 1
+        pool.shutdown(wait = False, cancel_futures = True)
+
+    def _release(self, _future = None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def submit(self, fn, *args, pool = None):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise HashingBusy()
+            self._in_flight += 1
+        try:
+            future = (pool or self._get_pool()).submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        # one retry on a rebuilt pool, then the caller gets a 503
+        for _ in range(2):
+            pool = self._get_pool()
+            try:
+                return self.submit(fn, *args, pool = pool).result()
+            except BrokenProcessPool:
+                self._discard(pool)
+        raise HashingBusy()
+
+    async def run_async(self, fn, *args):
+        if self.workers <= 0:
+            # never on the event loop, a hash would stall every request
+            return await run_in_threadpool(fn, *args)
+        for _ in range(2):
+            pool = self._get_pool()
+            try:
+                return await asyncio.wrap_future(self.submit(fn, *args, pool = pool))
+            except BrokenProcessPool:
+                self._discard(pool)
+        raise HashingBusy()
+
+    def warm_up(self, fn, *args):
+        # spawns the workers and has them import fn's module, both otherwise
+        # paid for by the first logins. Outside the admission count.
+        if self.workers <= 0:
+            return
+        pool = self._get_pool()
+        for future in [pool.submit(fn, *args) for _ in range(self.workers)]:
+            future.result()
+
+    def stats(self):
+        return {"workers": self.workers, "in_flight": self._in_flight, "rejected": self.rejected, "rebuilds": self.rebuilds}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait = False, cancel_futures = True)
+            self._pool = None
+
+hash_executor = HashExecutor(HASH_WORKERS, HASH_QUEUE_SIZE)
@@ -1,22 +1,31 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt 
+import calendar
 import secrets
-import os
-from dotenv import load_dotenv, find_dotenv
+import hashlib
 
-load_dotenv(find_dotenv())
+from app.core.config import get_settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-SECRET_KEY = os.getenv("SECRET_KEY","secret")
+SECRET_KEY = get_settings().secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+def new_token_id():
+    # jti of an access token, id of a refresh token family
+    return secrets.token_hex(16)
+
 def create_refresh_token():
     return secrets.token_urlsafe(48)
 
+def hash_refresh_token(token: str):
+    # refresh tokens are 48 random bytes, a plain digest is enough to make a
+    # leaked table useless while keeping the lookup a unique index probe
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def refresh_token_expiry():
     return datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
@@ -32,6 +41,11 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp":expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def access_token_exp(issued_at: datetime):
+    # the exp claim of an access token issued at issued_at, worked out the
+    # way jose encodes the datetime above
+    return calendar.timegm((issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)).utctimetuple())
+
 def decode_access_token(token: str):
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 ##########################################################################################################################################
@@ -0,0 +1,76 @@
+"""Borrow/return latency with the audit row written inline vs. by the writer.
+
+    python benchmarks/bench_audit.py --clients 16 --seconds 10
+
+Each client loops borrow -> return on its own book, so every request writes
+one audit event. Runs once with AUDIT_MODE=sync and once with AUDIT_MODE=async.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+
+from common import seed_library, serve_app, percentiles, PASSWORD
+
+def borrow_return_loop(base_url: str, clients: int, seconds: float):
+    samples = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client_loop(i):
+        nonlocal errors
+        local, failed = [], 0
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            r = client.post("/auth/login", data={"username": f"student{i}@bench.io", "password": PASSWORD})
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                r = client.post("/loans/borrow", json={"book_id": i + 1, "due_date": "2030-01-01"}, headers=headers)
+                local.append((time.perf_counter() - start) * 1000)
+                if r.status_code != 200:
+                    failed += 1
+                    continue
+                start = time.perf_counter()
+                r = client.post(f"/loansreturn/{r.json()['data']['id']}", headers=headers)
+                local.append((time.perf_counter() - start) * 1000)
+                failed += r.status_code != 200
+        with lock:
+            samples.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {"requests_per_s": round(len(samples) / seconds, 1), "errors": errors, **percentiles(samples)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    report = {"clients": args.clients}
+    for mode in ("sync", "async"):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        seed_library(path, books=1000, students=args.clients)
+        env = {
+            "DATABASE_URL": f"sqlite:///{path}",
+            "RATE_LIMIT_ENABLED": "false",
+            "HASH_WORKERS": "0",
+            "DB_POOL_SIZE": "40",
+            "AUDIT_MODE": mode,
+        }
+        with serve_app(env) as base_url:
+            report[mode] = borrow_return_loop(base_url, args.clients, args.seconds)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
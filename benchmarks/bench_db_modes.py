@@ -0,0 +1,71 @@
+"""Throughput of DB_MODE=sync against DB_MODE=async under many concurrent connections.
+
+    python benchmarks/bench_db_modes.py --connections 1000 --requests 20000
+
+Both modes serve the same seeded SQLite file; point DATABASE_URL at MySQL
+(and install aiomysql) to compare against the production driver instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from common import seed_library, serve_app, percentiles, PASSWORD
+
+async def drive(base_url: str, connections: int, total: int):
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        r = await client.post("/auth/login", data={"username": "student0@bench.io", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        latencies = []
+        errors = 0
+        queue = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for _ in queue:
+                start = time.perf_counter()
+                try:
+                    response = await client.get("/loans/me", headers=headers)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(connections)])
+        elapsed = time.perf_counter() - start
+
+    return {"throughput_rps": round(total / elapsed, 1), "errors": errors, **percentiles(latencies)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    # enough connections for the 40 threadpool workers of the sync mode
+    env = {"DB_POOL_SIZE": "40", "DB_MAX_OVERFLOW": "10"}
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        seed_library(path, books=1000)
+        env["DATABASE_URL"] = f"sqlite:///{path}"
+
+    report = {"connections": args.connections, "requests": args.requests}
+    for mode in ("sync", "async"):
+        with serve_app({**env, "DB_MODE": mode}) as base_url:
+            report[mode] = asyncio.run(drive(base_url, args.connections, args.requests))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
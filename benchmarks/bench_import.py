@@ -0,0 +1,78 @@
+"""Rows per second of the bulk import against one create_book_admin per row.
+
+    python benchmarks/bench_import.py --rows 100000 --per-row 2000
+
+Generates a CSV feed, times create_book_admin (commit and refresh per book)
+on the first --per-row rows, then a fresh import of all --rows rows and a
+second import of the same feed, which is all updates.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import make_engine, make_vocabulary
+
+from app.controllers.book_controller import create_book_admin
+from app.core.book_import import import_books, iter_records
+from app.schemas.book import BookCreate
+
+def make_feed(rows: int, seed: int = 3):
+    rng = random.Random(seed)
+    vocab, cum_weights = make_vocabulary()
+    feed = io.StringIO()
+    feed.write("name,isbn,stock\n")
+    for i in range(rows):
+        title = " ".join(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(2, 6))).title()
+        feed.write(f"{title[:200]},979{i:010d},{rng.randint(0, 10)}\n")
+    return feed.getvalue()
+
+def fresh_session(name: str):
+    path = os.path.join(tempfile.gettempdir(), name)
+    if os.path.exists(path):
+        os.remove(path)
+    engine, Session = make_engine(path)
+    return engine, Session(), path
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--per-row", type=int, default=2000)
+    args = parser.parse_args()
+
+    feed = make_feed(args.rows)
+    report = {"rows": args.rows}
+
+    engine, db, path = fresh_session("bench_import_rows.db")
+    start = time.perf_counter()
+    for _, record in itertools.islice(iter_records(io.StringIO(feed), "csv"), args.per_row):
+        create_book_admin(BookCreate.model_validate(record), db)
+    elapsed = time.perf_counter() - start
+    report["per_row"] = {"rows": args.per_row, "rows_per_s": round(args.per_row / elapsed, 1)}
+    db.close()
+    engine.dispose()
+    os.remove(path)
+
+    engine, db, path = fresh_session("bench_import_bulk.db")
+    for label in ("bulk_insert", "bulk_update"):
+        start = time.perf_counter()
+        result = import_books(db, iter_records(io.StringIO(feed), "csv"))
+        elapsed = time.perf_counter() - start
+        report[label] = {
+            "rows_per_s": round(args.rows / elapsed, 1),
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "failed": result["failed"],
+        }
+    db.close()
+    engine.dispose()
+    os.remove(path)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Load test for every router: auth, books, loans, users and stats.
+
+Boots app.main:app with uvicorn against a freshly seeded SQLite file and
+drives it with virtual users, each one a loop of weighted operations drawn
+from a workload mix. Everything random comes from --seed, so two runs of the
+same command send the same requests in the same proportions.
+
+    python benchmarks/bench_load.py --mix mixed --users 50 --duration 30 --out before.json
+    # ... change something ...
+    python benchmarks/bench_load.py --mix mixed --users 50 --duration 30 --out after.json --compare before.json
+
+The result file holds the parameters, the commit and, per operation and in
+total: requests, throughput, status counts and p50/p95/p99 latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from common import ROOT, WORDS, seed_library, serve_app, percentiles, PASSWORD
+
+from app.core.search import rebuild_search_index
+
+# operation -> weight, per workload
+MIXES = {
+    "browse": {
+        "books.list": 30, "books.search": 35, "books.get": 25, "books.get_conditional": 10,
+    },
+    "circulation": {
+        "loans.borrow": 30, "loans.return": 25, "loans.me": 25, "loans.history": 20,
+    },
+    "admin": {
+        "users.list": 20, "users.get": 10, "users.audit_logs": 20, "stats.summary": 10,
+        "stats.top": 15, "stats.book": 10, "loans.overdue": 10, "loans.user_history": 5,
+    },
+    "auth": {
+        "auth.login": 10, "auth.refresh": 30, "auth.me": 40, "users.me": 20,
+    },
+    # roughly what a library sees: mostly catalog reads, some circulation,
+    # a little staff reporting and token traffic
+    "mixed": {
+        "books.list": 15, "books.search": 25, "books.get": 12, "books.get_conditional": 5,
+        "loans.borrow": 8, "loans.return": 6, "loans.me": 8, "loans.history": 4,
+        "auth.refresh": 3, "auth.me": 3, "users.me": 3,
+        "users.list": 2, "users.audit_logs": 2, "stats.summary": 1, "stats.top": 1,
+        "loans.overdue": 1, "auth.login": 1,
+    },
+}
+
+class VirtualUser:
+    def __init__(self, number: int, email: str, rng: random.Random):
+        self.number = number
+        self.email = email
+        self.rng = rng
+        self.headers = {}
+        self.refresh_token = None
+        self.loan_ids = []
+        self.etags = {}
+
+    async def login(self, client: httpx.AsyncClient):
+        response = await client.post("/auth/login", data={"username": self.email, "password": PASSWORD})
+        if response.status_code == 200:
+            body = response.json()
+            self.headers = {"Authorization": f"Bearer {body['access_token']}"}
+            self.refresh_token = body["refresh_token"]
+        return response
+
+class Workload:
+    # the operations, each one request. Staff operations run as the admin.
+
+    def __init__(self, books: int, students: int, admin: VirtualUser):
+        self.books = books
+        self.students = students
+        self.admin = admin
+
+    def book_id(self, user: VirtualUser):
+        return user.rng.randint(1, self.books)
+
+    async def run(self, name: str, client: httpx.AsyncClient, user: VirtualUser):
+        return await getattr(self, name.replace(".", "_"))(client, user)
+
+    # auth
+
+    async def auth_login(self, client, user):
+        return await user.login(client)
+
+    async def auth_refresh(self, client, user):
+        response = await client.post("/auth/refresh", json={"refresh_token": user.refresh_token})
+        if response.status_code == 200:
+            data = response.json()["data"]
+            user.headers = {"Authorization": f"Bearer {data['access_token']}"}
+            user.refresh_token = data.get("refresh_token", user.refresh_token)
+        return response
+
+    async def auth_me(self, client, user):
+        return await client.get("/auth/me", headers=user.headers)
+
+    # books
+
+    async def books_list(self, client, user):
+        sort_by = user.rng.choice(["name", "stock"])
+        return await client.get("/books/", params={"sort_by": sort_by, "limit": 20}, headers=user.headers)
+
+    async def books_search(self, client, user):
+        return await client.get("/books/", params={"search": user.rng.choice(WORDS), "limit": 20}, headers=user.headers)
+
+    async def books_get(self, client, user):
+        # the route declares {book_id} but reads a bookid query parameter
+        book_id = self.book_id(user)
+        return await client.get(f"/books/{book_id}", params={"bookid": book_id}, headers=user.headers)
+
+    async def books_get_conditional(self, client, user):
+        # revalidation of a book this user fetched before, mostly 304s
+        if user.etags and user.rng.random() < 0.9:
+            book_id = user.rng.choice(sorted(user.etags))
+        else:
+            book_id = self.book_id(user)
+        headers = dict(user.headers)
+        if book_id in user.etags:
+            headers["If-None-Match"] = user.etags[book_id]
+        response = await client.get(f"/books/{book_id}", params={"bookid": book_id}, headers=headers)
+        if "etag" in response.headers:
+            user.etags[book_id] = response.headers["etag"]
+        return response
+
+    # loans
+
+    async def loans_borrow(self, client, user):
+        due_date = (date.today() + timedelta(days=user.rng.randint(-10, 30))).isoformat()
+        response = await client.post("/loans/borrow", json={"book_id": self.book_id(user), "due_date": due_date}, headers=user.headers)
+        if response.status_code in (200, 201):
+            user.loan_ids.append(response.json()["data"]["id"])
+        return response
+
+    async def loans_return(self, client, user):
+        if not user.loan_ids:
+            return await self.loans_borrow(client, user)
+        loan_id = user.loan_ids.pop(user.rng.randrange(len(user.loan_ids)))
+        # the route is registered as "return/{loan_id}" under the /loans prefix
+        return await client.post(f"/loansreturn/{loan_id}", headers=user.headers)
+
+    async def loans_me(self, client, user):
+        return await client.get("/loans/me", headers=user.headers)
+
+    async def loans_history(self, client, user):
+        return await client.get("/loans/history", params={"limit": 20}, headers=user.headers)
+
+    async def loans_overdue(self, client, user):
+        return await client.get("/loans/overdue", params={"limit": 50}, headers=self.admin.headers)
+
+    async def loans_user_history(self, client, user):
+        user_id = user.rng.randint(2, self.students + 1)
+        return await client.get(f"/loans/user/{user_id}", params={"limit": 50}, headers=self.admin.headers)
+
+    # users
+
+    async def users_me(self, client, user):
+        return await client.get("/users/me", headers=user.headers)
+
+    async def users_list(self, client, user):
+        return await client.get("/users/", params={"limit": 50}, headers=self.admin.headers)
+
+    async def users_get(self, client, user):
+        return await client.get(f"/users/{user.rng.randint(1, self.students + 1)}", headers=self.admin.headers)
+
+    async def users_audit_logs(self, client, user):
+        return await client.get("/users/audit-logs", params={"limit": 100}, headers=self.admin.headers)
+
+    # stats
+
+    async def stats_summary(self, client, user):
+        return await client.get("/stats/summary", headers=self.admin.headers)
+
+    async def stats_top(self, client, user):
+        return await client.get("/stats/books/top", params={"limit": 10, "days": 30}, headers=self.admin.headers)
+
+    async def stats_book(self, client, user):
+        return await client.get(f"/stats/books/{self.book_id(user)}", headers=self.admin.headers)
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.recording = False
+
+    def add(self, name: str, elapsed_ms: float, status: str):
+        if not self.recording:
+            return
+        self.latencies.setdefault(name, []).append(elapsed_ms)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def report(self, seconds: float):
+        def summary(latencies, statuses):
+            errors = sum(n for status, n in statuses.items() if status.startswith("5") or status == "error")
+            return {
+                "throughput_rps": round(len(latencies) / seconds, 1),
+                "errors": errors,
+                "statuses": dict(sorted(statuses.items())),
+                **percentiles(latencies)
+            }
+
+        operations = {name: summary(self.latencies[name], self.statuses[name]) for name in sorted(self.latencies)}
+        every_latency = [ms for latencies in self.latencies.values() for ms in latencies]
+        every_status = {}
+        for statuses in self.statuses.values():
+            for status, n in statuses.items():
+                every_status[status] = every_status.get(status, 0) + n
+        return {"total": summary(every_latency, every_status), "operations": operations}
+
+async def drive(base_url: str, args, mix: dict):
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        admin = VirtualUser(0, "admin@bench.io", random.Random(args.seed))
+        await admin.login(client)
+        workload = Workload(args.books, args.students, admin)
+
+        users = [
+            VirtualUser(i, f"student{i % args.students}@bench.io", random.Random(args.seed * 1000 + i))
+            for i in range(args.users)
+        ]
+        # logins are bcrypt bound, done before the clock starts
+        await asyncio.gather(*[user.login(client) for user in users])
+
+        deadline = None
+
+        async def loop(user: VirtualUser):
+            while deadline is None or time.perf_counter() < deadline:
+                name = user.rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await workload.run(name, client, user)
+                    status = str(response.status_code)
+                except httpx.HTTPError:
+                    status = "error"
+                recorder.add(name, (time.perf_counter() - start) * 1000, status)
+                if args.think_time:
+                    await asyncio.sleep(user.rng.expovariate(1 / args.think_time))
+
+        tasks = [asyncio.create_task(loop(user)) for user in users]
+        # warm up caches and connection pools, then measure
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return recorder.report(elapsed)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(current: dict, previous: dict):
+    # per operation: p50/p95/p99 and throughput, previous -> current
+    lines = [f"{'operation':<24}{'metric':<16}{'before':>10}{'after':>10}{'change':>9}"]
+    rows = [("total", current["total"], previous.get("total", {}))]
+    rows += [(name, ops, previous.get("operations", {}).get(name, {})) for name, ops in current["operations"].items()]
+    for name, now, before in rows:
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if metric not in now or metric not in before:
+                continue
+            change = f"{(now[metric] - before[metric]) / before[metric] * 100:+.1f}%" if before[metric] else "n/a"
+            lines.append(f"{name:<24}{metric:<16}{before[metric]:>10}{now[metric]:>10}{change:>9}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before that")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between a user's requests, seconds")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db-mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default=None, help="SQLite file to seed, a temporary one if omitted")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--compare", default=None, help="a previous report to compare against")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "load.db")
+    seed_library(path, books=args.books, students=args.students)
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    engine = create_engine(f"sqlite:///{path}")
+    with Session(engine) as db:
+        rebuild_search_index(db)
+    engine.dispose()
+
+    env = {
+        "DATABASE_URL": f"sqlite:///{path}",
+        "DB_MODE": args.db_mode,
+        # one address sends everything, the per-client limits would reject most of it
+        "RATE_LIMIT_ENABLED": "false",
+        "RATE_LIMIT_STORAGE_URI": "memory://",
+    }
+    with serve_app(env, workers=args.workers) as base_url:
+        results = asyncio.run(drive(base_url, args, MIXES[args.mix]))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "db")},
+            "mix": MIXES[args.mix],
+        },
+        **results
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report["total"], indent=2))
+    for name, ops in report["operations"].items():
+        print(f"{name:<24}{ops['throughput_rps']:>9} rps  p50 {ops.get('p50_ms')}  p95 {ops.get('p95_ms')}  p99 {ops.get('p99_ms')}  {ops['statuses']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)))
+
+if __name__ == "__main__":
+    main()
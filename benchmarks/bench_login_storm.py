@@ -0,0 +1,83 @@
+"""Latency of a non-auth endpoint while /auth/login is being hammered.
+
+    python benchmarks/bench_login_storm.py --storm 64 --seconds 10
+
+Runs the same storm with bcrypt inline (HASH_WORKERS=0) and with the
+process-pool hash executor, and probes GET /loans/me throughout.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+
+from common import seed_library, serve_app, percentiles, PASSWORD
+
+def storm_and_probe(base_url: str, storm: int, seconds: float):
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        r = client.post("/auth/login", data={"username": "student0@bench.io", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    stop = threading.Event()
+    outcomes = {}
+    lock = threading.Lock()
+
+    def login_loop(i):
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set():
+                try:
+                    status = client.post("/auth/login", data={"username": f"student{i % 50}@bench.io", "password": PASSWORD}).status_code
+                except httpx.HTTPError:
+                    status = "error"
+                with lock:
+                    outcomes[status] = outcomes.get(status, 0) + 1
+
+    def probe(duration):
+        samples = []
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                client.get("/loans/me", headers=headers)
+                samples.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.05)
+        return samples
+
+    idle = percentiles(probe(min(seconds, 2)))
+
+    threads = [threading.Thread(target=login_loop, args=(i,), daemon=True) for i in range(storm)]
+    for t in threads:
+        t.start()
+    loaded = percentiles(probe(seconds))
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {"probe_idle": idle, "probe_during_storm": loaded, "login_status_counts": {str(k): v for k, v in outcomes.items()}}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--storm", type=int, default=64, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", default=str(min(4, os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed_library(path, books=1000)
+    env = {
+        "DATABASE_URL": f"sqlite:///{path}",
+        "RATE_LIMIT_ENABLED": "false",
+        "DB_POOL_SIZE": "40",
+    }
+
+    report = {"storm_clients": args.storm}
+    for label, workers in (("inline", "0"), ("process_pool", args.workers)):
+        with serve_app({**env, "HASH_WORKERS": workers}) as base_url:
+            report[label] = storm_and_probe(base_url, args.storm, args.seconds)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Cost of a deep page with OFFSET versus a keyset cursor.
+
+    python benchmarks/bench_pagination.py --books 200000 --page 10000
+"""
+import argparse
+import json
+
+from common import make_engine, seed_books, timed
+
+from app.controllers.book_controller import search_books
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine, Session = make_engine()
+    db = Session()
+    seed_books(db, args.books)
+
+    def page(number, cursor=None):
+        return search_books(db=db, search=None, in_stock=None, sort_by="name", order="asc",
+                            page=number, limit=args.limit, cursor=cursor)
+
+    # the cursor that points at the start of the deep page
+    _, deep_cursor = page(args.page - 1)
+
+    report = {
+        "books": args.books,
+        "page": args.page,
+        "offset_page_1": timed(lambda: page(1), args.repeat),
+        "offset_deep_page": timed(lambda: page(args.page), args.repeat),
+        "cursor_deep_page": timed(lambda: page(1, deep_cursor), args.repeat)
+    }
+    assert [b.id for b in page(args.page)[0]] == [b.id for b in page(1, deep_cursor)[0]]
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Refresh-token rotation latency as the refresh_tokens table grows.
+
+    python benchmarks/bench_refresh_tokens.py --sizes 10000 100000 500000
+
+For each size the table is filled with stale rows (mostly revoked or expired,
+like a table nobody ever purged) and POST /auth/refresh is timed through the
+controller. "scan" is the same lookup against an unindexed plaintext column,
+which is what the old schema did. A logout that revokes one token family is
+timed against the old one, which revoked every live token in the table.
+Finally the batched purge is timed.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text, update
+
+from common import make_engine, timed
+
+from app.controllers.auth_controller import refresh_access_token_user, revoke_token_family
+from app.core.token_purge import purge_refresh_tokens
+from app.models.refresh_token import RefreshToken
+from app.models.role import Role
+from app.models.user import User
+from app.schemas.auth import RefreshTokenRequest
+from app.utils.security import create_refresh_token, hash_refresh_token, refresh_token_expiry, new_token_id
+
+def fill(db, count: int, seed: int = 1, batch_size: int = 20000):
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows, legacy = [], []
+    for i in range(count):
+        token = f"{rng.getrandbits(256):064x}"
+        expired = rng.random() < 0.5
+        expires_at = now - timedelta(days=1) if expired else now + timedelta(days=7)
+        revoked = not expired and rng.random() < 0.9
+        rows.append({
+            "user_id": 1, "token_hash": hash_refresh_token(token), "expires_at": expires_at,
+            "family_id": f"{i // 10:032x}", "is_revoked": revoked, "revoked_at": now - timedelta(hours=1) if revoked else None
+        })
+        legacy.append({"token": token})
+        if len(rows) == batch_size:
+            db.execute(insert(RefreshToken), rows)
+            db.execute(text("INSERT INTO legacy_tokens (token) VALUES (:token)"), legacy)
+            rows, legacy = [], []
+    if rows:
+        db.execute(insert(RefreshToken), rows)
+        db.execute(text("INSERT INTO legacy_tokens (token) VALUES (:token)"), legacy)
+    db.commit()
+
+def run(size: int, repeat: int):
+    path = os.path.join(tempfile.gettempdir(), f"bench_refresh_{size}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine, Session = make_engine(path)
+    db = Session()
+    db.execute(text("CREATE TABLE legacy_tokens (id INTEGER PRIMARY KEY, token VARCHAR(500))"))
+    db.add(Role(name="Student"))
+    db.flush()
+    db.add(User(name="bench", email="bench@bench.io", password_hash="x", role_id=1, is_active=True))
+    db.commit()
+    fill(db, size)
+
+    token = create_refresh_token()
+    db.add(RefreshToken(user_id=1, token_hash=hash_refresh_token(token), expires_at=refresh_token_expiry()))
+    db.commit()
+
+    current = {"token": token}
+    def rotate():
+        result = refresh_access_token_user(RefreshTokenRequest(refresh_token=current["token"]), db)
+        current["token"] = result["refresh_token"]
+
+    probe = db.execute(text("SELECT token FROM legacy_tokens ORDER BY id DESC LIMIT 1")).scalar()
+    def scan():
+        db.execute(text("SELECT id FROM legacy_tokens WHERE token = :token"), {"token": probe}).first()
+
+    result = {
+        "rows": size,
+        "indexed_refresh": timed(rotate, repeat),
+        "scan_lookup": timed(scan, max(3, repeat // 10)),
+    }
+
+    # a session of ten rotations, nine of them used up
+    family = new_token_id()
+    db.execute(insert(RefreshToken), [
+        {"user_id": 1, "token_hash": hash_refresh_token(create_refresh_token()), "expires_at": refresh_token_expiry(),
+         "family_id": family, "access_jti": new_token_id(), "is_revoked": i < 9}
+        for i in range(10)
+    ])
+    db.commit()
+    record = db.execute(select(RefreshToken).where(RefreshToken.family_id == family, RefreshToken.is_revoked == False)).scalar_one()
+    start = time.perf_counter()
+    revoke_token_family(db, record)
+    db.commit()
+    result["family_logout_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    start = time.perf_counter()
+    rewritten = db.execute(update(RefreshToken).where(RefreshToken.is_revoked == False).values(is_revoked=True)).rowcount
+    result["global_logout"] = {"rows_rewritten": rewritten, "ms": round((time.perf_counter() - start) * 1000, 3)}
+    db.rollback()
+
+    start = time.perf_counter()
+    purged = purge_refresh_tokens(db)
+    result["purge"] = {"rows_removed": purged, "seconds": round(time.perf_counter() - start, 2)}
+    result["rows_left"] = db.execute(select(func.count(RefreshToken.id))).scalar()
+
+    db.close()
+    engine.dispose()
+    os.remove(path)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(json.dumps(run(size, args.repeat)))
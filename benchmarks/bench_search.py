@@ -0,0 +1,47 @@
+"""Compare the indexed catalog search against the old leading-wildcard ILIKE scan.
+
+    python benchmarks/bench_search.py --books 200000 --repeat 50
+"""
+import argparse
+import json
+
+from common import make_engine, seed_books, timed
+
+from app.core import search as search_module
+from app.core.search import rebuild_search_index
+from app.controllers.book_controller import search_books
+
+# "arbor" only matches inside a word, through the trigram tokens
+QUERIES = ["python", "dragon kingdom", "silent storm", "978000001", "memory harbor glass", "arbor"]
+
+def run(db, backend: str, repeat: int):
+    search_module.SEARCH_BACKEND = backend
+    results = {}
+    for q in QUERIES:
+        results[q] = timed(
+            lambda: search_books(db=db, search=q, in_stock=None, sort_by=None, order="asc", page=1, limit=10)[0],
+            repeat
+        )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--db", default=None, help="sqlite file path, in-memory when omitted")
+    args = parser.parse_args()
+
+    engine, Session = make_engine(args.db)
+    db = Session()
+    seed_books(db, args.books)
+    rebuild_search_index(db)
+
+    report = {
+        "books": args.books,
+        "ilike": run(db, "ilike", args.repeat),
+        "index": run(db, "index", args.repeat)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cost of turning a list of books into the response body.
+
+Compares the old per-row model_validate/model_dump plus JSONResponse path
+with list_response, fed ORM objects and fed plain column rows.
+
+    python benchmarks/bench_serialization.py --sizes 100 10000
+"""
+import argparse
+import json
+
+from common import make_engine, seed_books, timed
+
+from fastapi.responses import JSONResponse
+
+from app.core.response import list_response, response_columns
+from app.models.book import Book
+from app.schemas.book import BookResponse
+
+def old_response(rows):
+    return JSONResponse(content={
+        "success": True,
+        "message": "Success",
+        "data": [BookResponse.model_validate(i).model_dump(mode="json") for i in rows],
+        "error": None,
+        "next_cursor": None
+    })
+
+def new_response(rows):
+    return list_response(BookResponse, rows, next_cursor=None)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    engine, Session = make_engine()
+    db = Session()
+    seed_books(db, max(args.sizes))
+
+    report = {}
+    for size in args.sizes:
+        def orm_rows():
+            db.expunge_all()
+            return db.query(Book).order_by(Book.id).limit(size).all()
+
+        def column_rows():
+            return db.query(*response_columns(BookResponse, Book)).order_by(Book.id).limit(size).all()
+
+        objects = orm_rows()
+        tuples = column_rows()
+        assert json.loads(old_response(objects).body) == json.loads(new_response(tuples).body)
+
+        report[size] = {
+            # serialization alone, on rows that are already loaded
+            "serialize_old": timed(lambda: old_response(objects), args.repeat),
+            "serialize_new_orm": timed(lambda: new_response(objects), args.repeat),
+            "serialize_new_columns": timed(lambda: new_response(tuples), args.repeat),
+            # query plus serialization, what a list endpoint pays
+            "query_old": timed(lambda: old_response(orm_rows()), args.repeat),
+            "query_new_columns": timed(lambda: new_response(column_rows()), args.repeat)
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
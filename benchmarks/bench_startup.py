@@ -0,0 +1,96 @@
+"""Cold start: import time, time until /health answers and the first requests after it.
+
+Every run is a fresh process against an already migrated SQLite file, once
+as configured and once with WARMUP_CONNECTIONS and WARMUP_CACHES. It fails
+when the median time to ready of the default configuration is over the
+budget; warm-up moves the first requests' cost into the startup on purpose.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+from common import ROOT, PASSWORD, seed_library, percentiles
+
+def import_time(env: dict):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+def timed_request(url: str, data: bytes | None = None):
+    start = time.perf_counter()
+    urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30).read()
+    return (time.perf_counter() - start) * 1000
+
+def boot(env: dict, port: int):
+    # wall clock from the process start to the first /health answer, then
+    # the requests that pay for whatever the startup left cold
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("app exited during startup")
+            try:
+                urllib.request.urlopen(f"{base_url}/health", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.005)
+        ready_ms = (time.perf_counter() - start) * 1000
+        login = urllib.parse.urlencode({"username": "admin@bench.io", "password": PASSWORD}).encode()
+        return {
+            "ready_ms": ready_ms,
+            "first_books_ms": timed_request(f"{base_url}/books/"),
+            "first_login_ms": timed_request(f"{base_url}/auth/login", login)
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "2000")))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "startup.db")
+    seed_library(path, books=args.books)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{path}",
+        "RATE_LIMIT_ENABLED": "false",
+        "RATE_LIMIT_STORAGE_URI": "memory://"
+    }
+    # the first boot migrates the file, every measured one starts from the same schema
+    boot(env, args.port)
+
+    report = {"budget_ms": args.budget_ms, "import": percentiles([import_time(env) for _ in range(args.runs)])}
+    for name, extra in (("cold", {}), ("warm_up", {"WARMUP_CONNECTIONS": "5", "WARMUP_CACHES": "true"})):
+        runs = [boot({**env, **extra}, args.port) for _ in range(args.runs)]
+        report[name] = {key: percentiles([run[key] for run in runs]) for key in runs[0]}
+
+    report["within_budget"] = report["cold"]["ready_ms"]["p50_ms"] <= args.budget_ms
+    print(json.dumps(report, indent=2))
+    if not report["within_budget"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
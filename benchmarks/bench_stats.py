@@ -0,0 +1,66 @@
+"""Circulation reports from the summary tables versus group-bys over loans.
+
+    python benchmarks/bench_stats.py --loans 1000000
+"""
+import argparse
+import json
+from datetime import date, timedelta
+
+from common import make_engine, seed_books, timed
+from bench_overdue import seed_loans
+
+from sqlalchemy import func, insert, select
+
+from app.controllers.stats_controller import top_books_admin, circulation_summary_admin, daily_circulation_admin
+from app.core.circulation import rebuild_circulation_stats
+from app.models.loan import Loan
+from app.models.role import Role
+from app.models.user import User
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine, Session = make_engine()
+    db = Session()
+    db.add(Role(name="Student"))
+    db.flush()
+    db.execute(insert(User), [
+        {"name": f"u{i}", "email": f"u{i}@bench.io", "password_hash": "x", "role_id": 1} for i in range(args.users)
+    ])
+    db.commit()
+    seed_books(db, args.books)
+    seed_loans(db, args.loans, args.users, args.books, active_share=0.03)
+    rebuild_circulation_stats(db)
+
+    since = date.today() - timedelta(days=29)
+
+    def top_from_loans():
+        return db.execute(
+            select(Loan.book_id, func.count()).group_by(Loan.book_id).order_by(func.count().desc()).limit(10)
+        ).all()
+
+    def daily_from_loans():
+        return db.execute(
+            select(Loan.borrow_issue_date, func.count())
+            .where(Loan.borrow_issue_date >= since)
+            .group_by(Loan.borrow_issue_date)
+        ).all()
+
+    report = {
+        "loans": args.loans,
+        "top10_loans_table": timed(top_from_loans, args.repeat),
+        "top10_stats": timed(lambda: top_books_admin(db=db, limit=10), args.repeat),
+        "top10_last_30_days_stats": timed(lambda: top_books_admin(db=db, limit=10, days=30), args.repeat),
+        "daily_30_days_loans_table": timed(daily_from_loans, args.repeat),
+        "daily_30_days_stats": timed(lambda: daily_circulation_admin(db=db, days=30), args.repeat),
+        "summary_stats": timed(lambda: circulation_summary_admin(db=db), args.repeat)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import contextlib
+import os
+import random
+import string
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import book, loan, role, user, refresh_token, audit_log, book_search_token, catalog_version, circulation_stats
+from app.models.book import Book
+from app.models.role import Role
+from app.models.user import User
+from app.utils.security import hash_password
+
+PASSWORD = "bench-password"
+
+WORDS = [
+    "history", "python", "garden", "ocean", "mystery", "science", "kingdom", "shadow",
+    "winter", "river", "dragon", "empire", "silent", "machine", "theory", "journey",
+    "house", "night", "secret", "light", "stone", "world", "storm", "letters",
+    "algebra", "poetry", "castle", "forest", "engine", "memory", "harbor", "glass",
+]
+
+def make_vocabulary(size: int = 30000, seed: int = 7):
+    # a zipf-shaped vocabulary: a few very common words and a long tail,
+    # which is what real catalog titles look like
+    rng = random.Random(seed)
+    vocab = list(WORDS)
+    while len(vocab) < size:
+        vocab.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))))
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(vocab) + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return vocab, cum_weights
+
+def make_engine(path: str | None = None):
+    url = f"sqlite:///{path}" if path else "sqlite://"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def seed_books(db, count: int, seed: int = 42, batch_size: int = 5000):
+    rng = random.Random(seed)
+    vocab, cum_weights = make_vocabulary()
+    rows = []
+    for i in range(count):
+        title = " ".join(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(2, 6))).title()
+        rows.append({
+            "name": title[:200],
+            "isbn": f"978{i:010d}",
+            "stock": rng.randint(0, 10)
+        })
+        if len(rows) == batch_size:
+            db.execute(insert(Book), rows)
+            rows = []
+    if rows:
+        db.execute(insert(Book), rows)
+    db.commit()
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "mean_ms": round(sum(samples) / len(samples), 3)
+    }
+
+def seed_library(path: str, books: int = 10000, students: int = 50):
+    # roles, one admin (admin@bench.io) and studentN@bench.io, all with PASSWORD
+    if os.path.exists(path):
+        os.remove(path)
+    engine, Session = make_engine(path)
+    db = Session()
+    for name in ("Admin", "Librarian", "Student"):
+        db.add(Role(name=name))
+    db.flush()
+
+    password_hash = hash_password(PASSWORD)
+    users = [{"name": "admin", "email": "admin@bench.io", "password_hash": password_hash, "role_id": 1, "is_active": True}]
+    users += [
+        {"name": f"student{i}", "email": f"student{i}@bench.io", "password_hash": password_hash, "role_id": 3, "is_active": True}
+        for i in range(students)
+    ]
+    db.execute(insert(User), users)
+    db.commit()
+    seed_books(db, books)
+    db.close()
+    engine.dispose()
+
+@contextlib.contextmanager
+def serve_app(env: dict, port: int = 8765, workers: int = 1):
+    # boots app.main:app in a uvicorn subprocess and waits for /health
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                urllib.request.urlopen(f"{base_url}/health", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("app did not start")
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+    return {"count": len(samples), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
@@ -0,0 +1,116 @@
+"""Concurrency stress test for borrow/return stock accounting.
+
+    python benchmarks/stress_loans.py --students 500 --attempts 4 --stock 25
+
+Every student fires --attempts parallel borrows of the same title (so there
+are duplicate borrows as well as competition for the last copies), then each
+borrower fires two parallel returns of its loan. Exits non-zero unless:
+no 5xx, at most --stock loans granted, no user with two active loans, stock
+equal to --stock minus active loans after borrowing, and stock back at --stock
+after returning.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from common import seed_library, serve_app
+
+from app.utils.security import create_access_token
+
+BOOK_ID = 1
+
+def check(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        stock = conn.execute("SELECT stock FROM books WHERE id = ?", (BOOK_ID,)).fetchone()[0]
+        active = conn.execute("SELECT COUNT(*) FROM loans WHERE book_id = ? AND is_active = 1", (BOOK_ID,)).fetchone()[0]
+        doubled = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT user_id FROM loans WHERE book_id = ? AND is_active = 1 GROUP BY user_id HAVING COUNT(*) > 1)",
+            (BOOK_ID,)
+        ).fetchone()[0]
+    return stock, active, doubled
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=4, help="parallel borrows per student")
+    parser.add_argument("--stock", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    seed_library(path, books=10, students=args.students)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE books SET stock = ? WHERE id = ?", (args.stock, BOOK_ID))
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE email LIKE 'student%'")]
+
+    # tokens are minted here instead of logging in 500 times through bcrypt
+    headers = {
+        user_id: {"Authorization": "Bearer " + create_access_token({"sub": str(user_id), "role": "Student", "ver": 0})}
+        for user_id in user_ids
+    }
+    # SQLite has one writer at a time, the longer busy timeout keeps 64
+    # queued writers from failing with "database is locked"
+    env = {
+        "DATABASE_URL": f"sqlite:///{path}?timeout=60",
+        "RATE_LIMIT_ENABLED": "false",
+        "DB_POOL_SIZE": "40",
+    }
+
+    report = {}
+    failures = []
+    with serve_app(env) as base_url, httpx.Client(base_url=base_url, timeout=120,
+                                                  limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        def borrow(user_id):
+            r = client.post("/loans/borrow", json={"book_id": BOOK_ID, "due_date": "2030-01-01"}, headers=headers[user_id])
+            body = r.json()
+            code = "OK" if r.status_code == 200 else (body.get("error") or {}).get("code", r.status_code)
+            return user_id, r.status_code, code, (body.get("data") or {}).get("id")
+
+        jobs = [user_id for user_id in user_ids for _ in range(args.attempts)]
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            borrows = list(pool.map(borrow, jobs))
+
+        report["borrow_requests"] = len(borrows)
+        report["borrow_outcomes"] = dict(Counter(code for _, _, code, _ in borrows))
+        granted = [(user_id, loan_id) for user_id, _, code, loan_id in borrows if code == "OK"]
+
+        stock, active, doubled = check(path)
+        report["after_borrow"] = {"stock": stock, "active_loans": active, "users_with_two_active": doubled}
+        if any(status >= 500 for _, status, _, _ in borrows):
+            failures.append("server error during borrow")
+        if len(granted) > args.stock:
+            failures.append("oversold")
+        if len(granted) != active or stock != args.stock - active or doubled:
+            failures.append("stock and loans disagree after borrow")
+
+        def give_back(job):
+            user_id, loan_id = job
+            r = client.post(f"/loansreturn/{loan_id}", headers=headers[user_id])
+            return r.status_code
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            returns = list(pool.map(give_back, granted * 2))
+
+        report["return_outcomes"] = dict(Counter(returns))
+        stock, active, doubled = check(path)
+        report["after_return"] = {"stock": stock, "active_loans": active}
+        if any(status >= 500 for status in returns):
+            failures.append("server error during return")
+        if Counter(returns)[200] != len(granted):
+            failures.append("a loan was returned twice or not at all")
+        if stock != args.stock or active:
+            failures.append("lost or duplicated a copy on return")
+
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the whole session runs on one throwaway SQLite file, the routes in async
+# mode on aiosqlite. The modules copy their settings into constants when
+# they are imported, so the environment is set here, before any test module
+# imports the app, and the cached Settings of anything that read them
+# earlier is dropped.
+_DB_PATH = os.path.join(tempfile.mkdtemp(), "library.db")
+os.environ.update({
+    "DB_MODE": "async",
+    "DATABASE_URL": f"sqlite+pysqlite:///{_DB_PATH}",
+    "HASH_WORKERS": "0",
+    "RATE_LIMIT_ENABLED": "false",
+    "RATE_LIMIT_STORAGE_URI": "memory://",
+    "TOKEN_PURGE_ENABLED": "false",
+    "OVERDUE_SWEEP_ENABLED": "false",
+    "TOKEN_DENYLIST_SYNC_ENABLED": "false",
+    "PRINCIPAL_CACHE_SYNC_ENABLED": "false",
+    "WARMUP_CACHES": "false",
+})
+
+from app.core.config import get_settings
+
+get_settings.cache_clear()
+
+if "app.core.database" in sys.modules:
+    # too late: the engines and the module constants hold other settings
+    raise pytest.UsageError("app modules were imported before tests/conftest.py set the test environment")
+
+# every request is held to its ROUTE_BUDGETS entry, --query-budget=warn
+# only reports them. The app is imported by the fixtures below, after the
+# plugin has put the mode into the environment.
+pytest_plugins = ["app.core.query_budget_plugin"]
+
+PASSWORD = "pw"
+# (email, role id), roles are seeded as 1 Admin, 2 Librarian, 3 Student
+USERS = [
+    ("admin@x.io", 1),
+    ("librarian@x.io", 2),
+    ("student@x.io", 3),
+    ("student2@x.io", 3),
+]
+
+@pytest.fixture(scope = "session")
+def _app_client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # the lifespan creates the schema and runs the migrations, once
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope = "session")
+def _password_hash():
+    from app.utils.security import hash_password
+
+    # bcrypt once for the session, not per seeded user per test
+    return hash_password(PASSWORD)
+
+def reset_database(password_hash: str):
+    from app.core.catalog_cache import catalog_cache
+    from app.core.catalog_version import CATALOG_VERSION_SHARDS
+    from app.core.circulation import rebuild_circulation_totals
+    from app.core.database import Base, SessionLocal, get_engine
+    from app.core.principal_cache import principal_cache
+    from app.core.token_denylist import token_denylist
+    from app.core.token_versions import token_versions
+    from app.models.catalog_version import CatalogVersion
+    from app.models.role import Role
+    from app.models.user import User
+
+    engine = get_engine()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    with SessionLocal() as db:
+        # the rows the migrations seed
+        db.add_all([CatalogVersion(id = shard, version = 0) for shard in range(1, CATALOG_VERSION_SHARDS + 1)])
+        rebuild_circulation_totals(db)
+        db.add_all([Role(id = 1, name = "Admin"), Role(id = 2, name = "Librarian"), Role(id = 3, name = "Student")])
+        db.add_all([
+            User(name = email.split("@")[0], email = email, password_hash = password_hash, role_id = role_id)
+            for email, role_id in USERS
+        ])
+        db.commit()
+    for cache in (catalog_cache, principal_cache, token_versions, token_denylist):
+        cache.clear()
+
+@pytest.fixture
+def client(_app_client, _password_hash):
+    # every test starts from the seeded roles and users and cold caches
+    reset_database(_password_hash)
+    return _app_client
+
+@pytest.fixture
+def db(client):
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def login(client):
+    def login(email: str = "admin@x.io", password: str = PASSWORD):
+        response = client.post("/auth/login", data = {"username": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
+
+@pytest.fixture
+def create_book(client, login):
+    headers = login()
+    def create_book(name: str, isbn: str, stock: int = 1):
+        response = client.post("/books/", json = {"name": name, "isbn": isbn, "stock": stock}, headers = headers)
+        assert response.json()["success"], response.text
+        return response.json()["data"]
+    return create_book
@@ -0,0 +1,57 @@
+import pytest
+
+import app.core.audit as audit
+from app.core.audit import AuditWriter, log_audit, log_audit_many
+from app.models.audit_log import AuditLog
+from app.schemas.audit_logs import AuditAction
+
+@pytest.fixture
+def writer(client, monkeypatch):
+    writer = AuditWriter(queue_size = 100, batch_size = 10, flush_interval = 0.05, max_retries = 1)
+    monkeypatch.setattr(audit, "AUDIT_MODE", "async")
+    monkeypatch.setattr(audit, "audit_writer", writer)
+    writer.start()
+    yield writer
+    writer.stop()
+
+def actions(db):
+    db.expire_all()
+    return sorted(action for action, in db.query(AuditLog.action))
+
+def test_committed_events_are_written_in_batches(writer, db):
+    log_audit(db, action = AuditAction.LOAN_CREATED, entity = "Loan", entity_id = 1)
+    log_audit_many(db, [{"action": AuditAction.LOAN_RETURNED, "entity": "Loan", "entity_id": i} for i in range(25)])
+    # held by the session until it commits
+    assert writer.stats()["enqueued"] == 0
+    db.commit()
+    writer.stop()
+
+    assert actions(db) == ["LOAN_CREATED"] + ["LOAN_RETURNED"] * 25
+    stats = writer.stats()
+    assert stats["written"] == 26 and stats["batches"] >= 3 and stats["dropped"] == 0
+
+def test_rolled_back_events_are_dropped(writer, db):
+    log_audit(db, action = AuditAction.LOAN_CREATED, entity = "Loan", entity_id = 1)
+    log_audit_many(db, [{"action": AuditAction.LOAN_RETURNED, "entity": "Loan", "entity_id": 2}])
+    # durable ones go into the transaction itself, and out with it
+    log_audit(db, action = AuditAction.USER_DELETED, entity = "User", entity_id = 3)
+    db.rollback()
+
+    log_audit(db, action = AuditAction.USER_UPDATED, entity = "User", entity_id = 4)
+    db.commit()
+    writer.stop()
+
+    assert actions(db) == ["USER_UPDATED"]
+    assert writer.stats()["enqueued"] == 1
+
+def test_a_full_queue_writes_synchronously(writer, db):
+    writer.stop()
+    small = AuditWriter(queue_size = 1, batch_size = 10, flush_interval = 0.05, max_retries = 1)
+    audit.audit_writer = small
+    small._thread = object()  # running, but never draining
+
+    log_audit_many(db, [{"action": AuditAction.LOAN_RETURNED, "entity": "Loan", "entity_id": i} for i in range(3)])
+    db.commit()
+
+    assert actions(db) == ["LOAN_RETURNED"] * 2
+    assert small.stats()["sync_fallbacks"] == 2 and small.stats()["queue_depth"] == 1
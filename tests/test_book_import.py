@@ -0,0 +1,57 @@
+from app.models.book import Book
+from app.models.circulation_stats import CirculationTotals
+
+def upload(client, headers, content: bytes, filename = "books.csv", **params):
+    response = client.post("/books/import", files = {"file": (filename, content)}, params = params, headers = headers)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+def test_upsert_report(client, login, create_book):
+    headers = login()
+    create_book("Dune", "9780441013593", stock = 1)
+    feed = (
+        "name,isbn,stock\n"
+        "Dune (2nd ed.),9780441013593,4\n"
+        "Emma,9780141439587,2\n"
+        ",9780000000001,1\n"
+        "Hamlet,9780743477123,-1\n"
+        "Ulysses,9780199535675,x\n"
+        "Emma,9780141439587,3\n"
+    ).encode()
+
+    report = upload(client, headers, feed)
+    assert {k: report[k] for k in ("received", "inserted", "updated", "duplicates", "failed")} == \
+        {"received": 6, "inserted": 1, "updated": 1, "duplicates": 1, "failed": 3}
+    assert [error["row"] for error in report["errors"]] == [4, 5, 6]
+    assert report["errors_truncated"] is False
+
+    books = {b["isbn"]: (b["name"], b["stock"]) for b in client.get("/books/").json()["data"]}
+    # the later of two rows for one isbn wins
+    assert books == {"9780441013593": ("Dune (2nd ed.)", 4), "9780141439587": ("Emma", 3)}
+    assert [b["name"] for b in client.get("/books/", params = {"search": "emma"}).json()["data"]] == ["Emma"]
+
+    # the same feed again changes nothing
+    report = upload(client, headers, feed)
+    assert (report["inserted"], report["updated"]) == (0, 2)
+
+def test_ndjson_feed(client, login):
+    feed = b'{"name": "Emma", "isbn": "9780141439587", "stock": 2}\n\nnot json\n[1]\n'
+    report = upload(client, login(), feed, filename = "books.ndjson")
+    assert (report["received"], report["inserted"], report["failed"]) == (3, 1, 2)
+    assert [error["row"] for error in report["errors"]] == [3, 4]
+
+def test_stock_of_an_existing_book_leaves_out_its_loans(client, db, login, create_book):
+    admin = login()
+    book = create_book("Dune", "9780441013593", stock = 3)
+    for email in ("student@x.io", "student2@x.io"):
+        client.post("/loans/borrow", json = {"book_id": book["id"], "due_date": "2030-01-01"}, headers = login(email))
+
+    # the feed counts the copies owned, two of them are out
+    upload(client, admin, b"name,isbn,stock\nDune,9780441013593,5\n")
+    assert db.query(Book.stock).filter(Book.id == book["id"]).scalar() == 3
+    # fewer copies than loans, none on the shelf
+    upload(client, admin, b"name,isbn,stock\nDune,9780441013593,1\n")
+    assert db.query(Book.stock).filter(Book.id == book["id"]).scalar() == 0
+
+    totals = db.get(CirculationTotals, 1)
+    assert (totals.on_loan, totals.available) == (2, 0)
@@ -0,0 +1,82 @@
+import threading
+
+from app.core.catalog_cache import CatalogCache, LocalBackend, catalog_cache
+from app.core.catalog_version import get_catalog_version
+from app.controllers.book_controller import search_cache_params
+from app.models.book import Book
+
+def listing(client, **params):
+    return client.get("/books/", params = params).json()["data"]
+
+def test_repeated_reads_are_served_from_the_cache(client, create_book, query_budget):
+    book = create_book("Dune", "9780441013593")
+    listing(client, search = "dune")
+    client.get(f"/books/{book['id']}", params = {"bookid": book["id"]})
+    before = catalog_cache.stats()
+
+    # the version read is all that is left of each
+    with query_budget(2):
+        assert [b["name"] for b in listing(client, search = "DUNE ")] == ["Dune"]
+        assert client.get(f"/books/{book['id']}", params = {"bookid": book["id"]}).json()["data"]["name"] == "Dune"
+    assert catalog_cache.stats()["hits"] == before["hits"] + 2
+
+def test_writes_move_the_keys_on(client, db, login, create_book):
+    admin = login()
+    book = create_book("Dune", "9780441013593", stock = 1)
+    url = f"/books/{book['id']}"
+    params = search_cache_params(search = "dune", in_stock = None, sort_by = None, order = "asc", page = 1, limit = 10, cursor = None)
+
+    def keys():
+        # the versions the next request will read
+        db.rollback()
+        book_version = db.query(Book.version).filter(Book.id == book["id"]).scalar()
+        return catalog_cache.search_key(get_catalog_version(db), params), catalog_cache.book_key(book["id"], book_version)
+
+    def reads():
+        return listing(client, search = "dune")[0]["stock"], client.get(url, params = {"bookid": book["id"]}).json()["data"]["stock"]
+
+    assert reads() == (1, 1)
+    seen = {keys()}
+
+    client.put(url, params = {"bookid": book["id"]}, json = {"stock": 2}, headers = admin)
+    assert keys() not in seen and reads() == (2, 2)
+    seen.add(keys())
+
+    loan = client.post("/loans/borrow", json = {"book_id": book["id"], "due_date": "2030-01-01"}, headers = admin).json()["data"]
+    assert keys() not in seen and reads() == (1, 1)
+    seen.add(keys())
+
+    client.post(f"/loansreturn/{loan['id']}", headers = admin)
+    assert keys() not in seen and reads() == (2, 2)
+    seen.add(keys())
+
+    # another book moves the listings on, this book's entry stays
+    search_key, book_key = keys()
+    create_book("Emma", "9780141439587")
+    assert keys()[0] != search_key and keys()[1] == book_key
+
+def test_equivalent_searches_share_a_key():
+    def key(search):
+        return catalog_cache.search_key(1, search_cache_params(search = search, in_stock = None, sort_by = None,
+                                                               order = "asc", page = 1, limit = 10, cursor = None))
+    assert key("Dune messiah") == key("messiah  DUNE") != key("dune")
+    assert catalog_cache.search_key(None, {}) is None and catalog_cache.book_key(1, None) is None
+
+def test_concurrent_misses_load_once():
+    cache = CatalogCache(LocalBackend(10), ttl = 30)
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        release.wait(1)
+        return {"value": 1}
+
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and results == [{"value": 1}] * 8
@@ -0,0 +1,39 @@
+from app.core.circulation import rebuild_circulation_stats
+from app.models.circulation_stats import CirculationTotals
+
+DUE = "2030-01-01"
+
+def totals(db):
+    db.expire_all()
+    row = db.get(CirculationTotals, 1)
+    return row.on_loan, row.available
+
+def test_totals_follow_borrows_and_returns(client, db, login, create_book):
+    admin = login()
+    student = login("student@x.io")
+    dune = create_book("Dune", "9780441013593", stock = 3)
+    emma = create_book("Emma", "9780141439587", stock = 1)
+    assert totals(db) == (0, 4)
+
+    loan = client.post("/loans/borrow", json = {"book_id": dune["id"], "due_date": DUE}, headers = student).json()["data"]
+    assert totals(db) == (1, 3)
+    client.post("/loans/borrow/batch", json = {"book_ids": [dune["id"], emma["id"]], "due_date": DUE}, headers = login("student2@x.io"))
+    assert totals(db) == (3, 1)
+
+    # a borrow that fails moves nothing
+    failed = client.post("/loans/borrow", json = {"book_id": emma["id"], "due_date": DUE}, headers = admin)
+    assert failed.json()["error"]["code"] == "BOOK_OUT_OF_STOCK"
+    assert totals(db) == (3, 1)
+
+    client.post(f"/loansreturn/{loan['id']}", headers = student)
+    assert totals(db) == (2, 2)
+    # restocking changes what is on the shelf only
+    client.put(f"/books/{dune['id']}", params = {"bookid": dune["id"]}, json = {"stock": 5}, headers = admin)
+    assert totals(db) == (2, 5)
+
+    summary = client.get("/stats/summary", headers = admin).json()["data"]
+    assert summary == {"on_loan": 2, "available": 5, "utilization": round(2 / 7, 4), "borrows_today": 3, "returns_today": 1}
+
+    # counting it all again from the loans and books gives the same row
+    rebuild_circulation_stats(db)
+    assert totals(db) == (2, 5)
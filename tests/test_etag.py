@@ -0,0 +1,55 @@
+import pytest
+
+def get(client, url, etag = None, **params):
+    return client.get(url, params = params, headers = {"If-None-Match": etag} if etag else {})
+
+def test_listing_revalidates_with_a_304(client, create_book, query_budget):
+    create_book("Dune", "9780441013593")
+    first = get(client, "/books/", search = "dune")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+
+    # only the catalog version is read
+    with query_budget(1):
+        again = get(client, "/books/", etag, search = "dune")
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+
+    assert get(client, "/books/", f"W/{etag}", search = "dune").status_code == 304
+    assert get(client, "/books/", f'"other", {etag}', search = "dune").status_code == 304
+
+@pytest.mark.parametrize("header", ["*", '"c0-0000000000000000"', "garbage"])
+def test_other_tags_get_the_body(client, create_book, header):
+    create_book("Dune", "9780441013593")
+    assert get(client, "/books/", header).status_code == 200
+
+def test_listing_etag_follows_the_query_and_the_catalog(client, login, create_book):
+    book = create_book("Dune", "9780441013593")
+    etag = get(client, "/books/", search = "dune").headers["ETag"]
+
+    assert get(client, "/books/", etag, search = "emma").status_code == 200
+    assert get(client, "/books/", etag, search = "dune", limit = 5).status_code == 200
+
+    client.put(f"/books/{book['id']}", params = {"bookid": book["id"]}, json = {"stock": 3}, headers = login())
+    response = get(client, "/books/", etag, search = "dune")
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert response.json()["data"][0]["stock"] == 3
+
+def test_book_etag_changes_only_with_that_book(client, login, create_book):
+    admin = login()
+    dune = create_book("Dune", "9780441013593")
+    emma = create_book("Emma", "9780141439587")
+    url = f"/books/{dune['id']}"
+    etag = get(client, url, bookid = dune["id"]).headers["ETag"]
+    assert get(client, url, etag, bookid = dune["id"]).status_code == 304
+
+    client.put(f"/books/{emma['id']}", params = {"bookid": emma["id"]}, json = {"stock": 3}, headers = admin)
+    assert get(client, url, etag, bookid = dune["id"]).status_code == 304
+
+    client.put(url, params = {"bookid": dune["id"]}, json = {"stock": 3}, headers = admin)
+    response = get(client, url, etag, bookid = dune["id"])
+    assert response.status_code == 200 and response.json()["data"]["stock"] == 3
+
+def test_missing_book_has_no_etag(client):
+    response = get(client, "/books/999", '"b999-0"', bookid = 999)
+    assert response.status_code == 404 and "ETag" not in response.headers
@@ -0,0 +1,14 @@
+import asyncio
+import threading
+
+from app.utils.hash_executor import HashExecutor
+
+def test_inline_mode_keeps_hashing_off_the_event_loop():
+    executor = HashExecutor(workers = 0, queue_size = 0)
+
+    async def main():
+        return threading.get_ident(), await executor.run_async(threading.get_ident)
+
+    loop_thread, hash_thread = asyncio.run(main())
+    assert hash_thread != loop_thread
+    assert executor.run(threading.get_ident) == threading.get_ident()
@@ -0,0 +1,120 @@
+from sqlalchemy import update
+
+import app.controllers.loan_controller as loan_controller
+from app.core.database import SessionLocal
+from app.core.query_budget import ROUTE_BUDGETS
+from app.models.book import Book
+from app.models.loan import Loan
+
+DUE = "2030-01-01"
+
+def outcomes(results, key):
+    return [(item[key], item["success"] or item["error"]["code"]) for item in results]
+
+def messages(results):
+    return [item["error"]["message"] for item in results if not item["success"]]
+
+def stocks(db, *books):
+    db.expire_all()
+    return [db.query(Book.stock).filter(Book.id == book["id"]).scalar() for book in books]
+
+def borrow_batch(client, headers, book_ids):
+    response = client.post("/loans/borrow/batch", json = {"book_ids": book_ids, "due_date": DUE}, headers = headers)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+def return_batch(client, headers, loan_ids):
+    response = client.post("/loans/return/batch", json = {"loan_ids": loan_ids}, headers = headers)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+def test_borrow_batch_reports_each_book(client, db, login, create_book):
+    student = login("student@x.io")
+    dune = create_book("Dune", "9780441013593", stock = 2)
+    emma = create_book("Emma", "9780141439587", stock = 0)
+    held = create_book("Hamlet", "9780743477123", stock = 2)
+    client.post("/loans/borrow", json = {"book_id": held["id"], "due_date": DUE}, headers = student)
+
+    results = borrow_batch(client, student, [dune["id"], emma["id"], 999, held["id"], dune["id"]])
+    assert outcomes(results, "book_id") == [
+        (dune["id"], True),
+        (emma["id"], "BOOK_OUT_OF_STOCK"),
+        (999, "BOOK_NOT_FOUND"),
+        (held["id"], "ALREADY_BORROWED"),
+        (dune["id"], "ALREADY_BORROWED"),
+    ]
+    assert messages(results)[-1] == "Book appears more than once in the batch!"
+    assert results[0]["loan"]["book_id"] == dune["id"]
+    assert stocks(db, dune, emma, held) == [1, 0, 1]
+    assert db.query(Loan).filter(Loan.is_active == True).count() == 2
+
+def test_return_batch_reports_each_loan(client, db, login, create_book):
+    student = login("student@x.io")
+    other = login("student2@x.io")
+    dune = create_book("Dune", "9780441013593", stock = 2)
+    emma = create_book("Emma", "9780141439587", stock = 1)
+    mine = [item["loan"]["id"] for item in borrow_batch(client, student, [dune["id"], emma["id"]])]
+    theirs = borrow_batch(client, other, [dune["id"]])[0]["loan"]["id"]
+    return_batch(client, student, [mine[1]])
+
+    results = return_batch(client, student, [mine[0], theirs, 999, mine[1], mine[0]])
+    assert outcomes(results, "loan_id") == [
+        (mine[0], True),
+        (theirs, "ALREADY_BORROWED"),
+        (999, "LOAN_NOT_FOUND"),
+        (mine[1], "LOAN_NOT_FOUND"),
+        (mine[0], "ALREADY_BORROWED"),
+    ]
+    # InvalidLoanOperation has always answered with the ALREADY_BORROWED code
+    assert messages(results)[0] == "You can not return this book!"
+    assert messages(results)[-1] == "Loan appears more than once in the batch!"
+    assert stocks(db, dune, emma) == [1, 1]
+    assert [loan_id for loan_id, in db.query(Loan.id).filter(Loan.is_active == True)] == [theirs]
+
+def test_borrow_batch_survives_a_copy_taken_in_between(client, db, login, create_book, monkeypatch):
+    student = login("student@x.io")
+    dune = create_book("Dune", "9780441013593", stock = 1)
+    emma = create_book("Emma", "9780141439587", stock = 1)
+    borrow_all = loan_controller._borrow_all
+
+    def racing_borrow_all(*args):
+        # another request takes the last copy of Dune after the batch read it
+        with SessionLocal() as other:
+            other.execute(update(Book).where(Book.id == dune["id"]).values(stock = 0))
+            other.commit()
+        return borrow_all(*args)
+
+    monkeypatch.setattr(loan_controller, "_borrow_all", racing_borrow_all)
+    # the item by item redo is the rare path, the budget is for the usual one
+    monkeypatch.setitem(ROUTE_BUDGETS, ("POST", "/loans/borrow/batch"), 30)
+
+    results = borrow_batch(client, student, [dune["id"], emma["id"]])
+    assert outcomes(results, "book_id") == [(dune["id"], "BOOK_OUT_OF_STOCK"), (emma["id"], True)]
+    assert stocks(db, dune, emma) == [0, 0]
+    assert [book_id for book_id, in db.query(Loan.book_id).filter(Loan.is_active == True)] == [emma["id"]]
+
+def test_return_batch_survives_a_loan_returned_in_between(client, db, login, create_book, monkeypatch):
+    student = login("student@x.io")
+    dune = create_book("Dune", "9780441013593", stock = 1)
+    emma = create_book("Emma", "9780141439587", stock = 1)
+    loans = [item["loan"]["id"] for item in borrow_batch(client, student, [dune["id"], emma["id"]])]
+    returned = []
+
+    def racing_update(entity):
+        # the batch read both loans as active, then Dune's is returned by
+        # another request before the batch closes them
+        if entity is Loan and not returned:
+            with SessionLocal() as other:
+                other.execute(update(Loan).where(Loan.id == loans[0]).values(is_active = False, active_marker = None))
+                other.execute(update(Book).where(Book.id == dune["id"]).values(stock = Book.stock + 1))
+                other.commit()
+            returned.append(loans[0])
+        return update(entity)
+
+    monkeypatch.setattr(loan_controller, "update", racing_update)
+    monkeypatch.setitem(ROUTE_BUDGETS, ("POST", "/loans/return/batch"), 30)
+
+    results = return_batch(client, student, loans)
+    assert outcomes(results, "loan_id") == [(loans[0], "LOAN_NOT_FOUND"), (loans[1], True)]
+    # each copy came back once
+    assert stocks(db, dune, emma) == [1, 1]
@@ -0,0 +1,35 @@
+import os
+
+from sqlalchemy import create_engine, text
+
+import app.core.metrics as metrics
+from app.core.metrics import register_engine, registry
+
+def sample(name: str):
+    for line in registry.render().splitlines():
+        if line.startswith(f'{name}{{engine="test"}} '):
+            return float(line.split()[-1])
+    return None
+
+def test_pool_metrics_follow_checkouts_and_checkins(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "_engines", {})
+    engine = create_engine(f"sqlite+pysqlite:///{os.path.join(tmp_path, 'pool.db')}", pool_size = 2, max_overflow = 1)
+    register_engine("test", engine)
+    held = sample("library_db_pool_hold_seconds_count") or 0
+
+    first, second = engine.connect(), engine.connect()
+    first.execute(text("SELECT 1"))
+    assert sample("library_db_pool_checked_out") == 2
+    assert sample("library_db_pool_size") == 2
+    first.close()
+    second.close()
+    assert sample("library_db_pool_checked_out") == 0
+    assert sample("library_db_pool_checked_in") == 2
+    assert sample("library_db_pool_hold_seconds_count") == held + 2
+
+    # the pool dispose() swaps in is still counted
+    engine.dispose()
+    with engine.connect():
+        assert sample("library_db_pool_checked_out") == 1
+    assert sample("library_db_pool_hold_seconds_count") == held + 3
+    engine.dispose()
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import app.core.jobs as jobs
+from app.core.jobs import PeriodicJob
+from app.core.overdue import FinePolicy, loan_fine, sweep_overdue_loans
+from app.models.loan import Loan
+
+TODAY = date.today()
+
+@pytest.mark.parametrize("days, fine", [(-3, 0), (0, 0), (2, 0), (3, 25), (10, 200), (100, 1000)])
+def test_fine_policy(days, fine):
+    policy = FinePolicy.parse("25,1000,2")
+    assert policy == FinePolicy(daily_cents = 25, cap_cents = 1000, grace_days = 2)
+    assert policy.fine(days) == fine
+
+@pytest.mark.parametrize("role, fine", [("Student", 250), ("Librarian", 100), ("Admin", 0), ("Unknown", 250)])
+def test_loan_fine_follows_the_role(role, fine):
+    assert loan_fine(role, TODAY - timedelta(days = 10), TODAY) == fine
+
+def borrow(client, db, headers, book, due_in_days):
+    loan = client.post("/loans/borrow", json = {"book_id": book["id"], "due_date": "2030-01-01"}, headers = headers).json()["data"]
+    db.execute(update(Loan).where(Loan.id == loan["id"]).values(due_date = TODAY + timedelta(days = due_in_days)))
+    db.commit()
+    return loan["id"]
+
+def fines(db):
+    db.expire_all()
+    return {loan.id: (loan.is_overdue, loan.fine_cents) for loan in db.query(Loan)}
+
+def test_sweep_assesses_active_overdue_loans(client, db, login, create_book):
+    book = create_book("Dune", "9780441013593", stock = 5)
+    student = borrow(client, db, login("student@x.io"), book, -10)
+    librarian = borrow(client, db, login("librarian@x.io"), book, -100)
+    on_time = borrow(client, db, login("student2@x.io"), book, 3)
+    admin = login()
+    returned = borrow(client, db, admin, book, -5)
+    client.post(f"/loansreturn/{returned}", headers = admin)
+
+    # one loan a batch, the keyset walks them all
+    assert sweep_overdue_loans(db, batch_size = 1, today = TODAY) == (2, 2)
+    assert fines(db) == {student: (True, 250), librarian: (True, 500), on_time: (False, 0), returned: (False, 0)}
+
+    # nothing moved, nothing written
+    assert sweep_overdue_loans(db, today = TODAY) == (2, 0)
+    # a day on the student owes more, the librarian is at the cap
+    assert sweep_overdue_loans(db, today = TODAY + timedelta(days = 1)) == (2, 1)
+    assert fines(db)[student] == (True, 275) and fines(db)[librarian] == (True, 500)
+
+def test_overdue_listing_works_out_the_fine(client, db, login, create_book):
+    book = create_book("Dune", "9780441013593", stock = 5)
+    student = borrow(client, db, login("student@x.io"), book, -4)
+    borrow(client, db, login("student2@x.io"), book, 1)
+
+    # the sweeper has not run, the listing does not wait for it
+    response = client.get("/loans/overdue", headers = login("librarian@x.io"))
+    assert response.status_code == 200
+    assert [(loan["id"], loan["is_overdue"], loan["fine_cents"]) for loan in response.json()["data"]] == [(student, True, 100)]
+
+class HeldLock:
+    def __init__(self, engine, name, timeout = None):
+        self.acquired = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def test_a_locked_job_skips_its_turn_while_another_worker_runs_it(monkeypatch):
+    runs = []
+    job = PeriodicJob("sweep", 60, lambda: runs.append(1), lock = "library_test_job")
+    # SQLite has no named locks, every worker gets it
+    assert job.run_once() is True and runs == [1]
+
+    monkeypatch.setattr(jobs, "DatabaseLock", HeldLock)
+    assert job.run_once() is False and runs == [1]
+    # a job without a lock runs regardless
+    assert PeriodicJob("sync", 60, lambda: runs.append(2)).run_once() is True and runs == [1, 2]
@@ -0,0 +1,75 @@
+import base64
+import json
+
+import pytest
+
+def walk(client, url, headers = None, **params):
+    # every page of a listing by its cursors, the items in order
+    items = []
+    cursor = None
+    while True:
+        body = client.get(url, params = {**params, **({"cursor": cursor} if cursor else {})}, headers = headers).json()
+        assert body["success"], body
+        items += body["data"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+def tamper(cursor, values):
+    raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    raw["v"] = values
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip("=")
+
+@pytest.fixture
+def books(create_book):
+    # stocks repeat so the (stock, id) keyset has ties to break
+    return [create_book(f"Book {i:02d}", f"97800000000{i:02d}", stock = i % 3) for i in range(12)]
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"sort_by": "stock", "order": "desc"},
+    {"in_stock": True},
+    {"search": "book"},
+])
+def test_book_cursors_walk_every_book_once(client, books, params):
+    everything = client.get("/books/", params = {**params, "limit": 100}).json()["data"]
+    assert [b["id"] for b in walk(client, "/books/", limit = 5, **params)] == [b["id"] for b in everything]
+    expected = [b for b in books if b["stock"] > 0] if params.get("in_stock") else books
+    assert len(everything) == len(expected)
+
+def test_user_cursors_walk_every_user_once(client, login):
+    headers = login()
+    users = walk(client, "/users/", headers, limit = 3)
+    assert sorted(u["email"] for u in users) == ["admin@x.io", "librarian@x.io", "student2@x.io", "student@x.io"]
+    assert len({u["id"] for u in users}) == len(users)
+
+def test_a_cursor_only_pages_the_listing_it_came_from(client, books, login):
+    cursor = client.get("/books/", params = {"limit": 5}).json()["next_cursor"]
+    assert client.get("/books/", params = {"limit": 5, "cursor": cursor}).status_code == 200
+
+    for params in ({"sort_by": "stock"}, {"order": "desc"}, {"search": "book"}, {"in_stock": True}):
+        response = client.get("/books/", params = {"limit": 5, "cursor": cursor, **params})
+        assert response.status_code == 400
+        assert response.json()["error"]["code"] == "INVALID_CURSOR"
+    response = client.get("/users/", params = {"cursor": cursor}, headers = login())
+    assert response.json()["error"]["code"] == "INVALID_CURSOR"
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    "e30",  # {}
+])
+def test_malformed_cursors_are_refused(client, books, cursor):
+    response = client.get("/books/", params = {"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "INVALID_CURSOR"
+
+def test_tampered_cursor_values_are_refused(client, books):
+    cursor = client.get("/books/", params = {"limit": 5}).json()["next_cursor"]
+    for values in (["Book 04"], ["Book 04", "5"], ["Book 04", None], [["x"], 5], ["Book 04", 5, 6]):
+        response = client.get("/books/", params = {"limit": 5, "cursor": tamper(cursor, values)})
+        assert response.status_code == 400, values
+        assert response.json()["error"]["code"] == "INVALID_CURSOR"
+    # well-formed values are a position like any other
+    page = client.get("/books/", params = {"limit": 5, "cursor": tamper(cursor, ["Book 09", books[9]["id"]])}).json()["data"]
+    assert [b["name"] for b in page] == ["Book 10", "Book 11"]
@@ -0,0 +1,81 @@
+from datetime import datetime
+import time
+
+from app.core.principal_cache import Principal, PrincipalCache, principal_cache, principal_sync
+from app.models.user import User
+
+def me(client, headers):
+    return client.get("/auth/me", headers = headers)
+
+def test_profile_update_is_seen_at_once(client, login):
+    headers = login("student@x.io")
+    assert me(client, headers).json()["data"]["name"] == "student"
+    assert principal_cache.stats()["size"] == 1
+
+    client.put("/users/me", json = {"name": "Stu"}, headers = headers)
+    assert me(client, headers).json()["data"]["name"] == "Stu"
+
+    admin = login()
+    user_id = me(client, headers).json()["data"]["id"]
+    client.put(f"/users/{user_id}", json = {"name": "Stuart"}, headers = admin)
+    assert me(client, headers).json()["data"]["name"] == "Stuart"
+
+def test_deleted_users_lose_their_cached_principal(client, login):
+    headers = login("student@x.io")
+    user_id = me(client, headers).json()["data"]["id"]
+
+    client.delete(f"/users/{user_id}", headers = login())
+    assert me(client, headers).status_code == 401
+
+    headers = login("student2@x.io")
+    me(client, headers)
+    client.delete("/users/me", headers = headers)
+    assert me(client, headers).status_code == 401
+
+def test_changes_made_by_another_worker_are_picked_up_by_the_sync(client, db, login):
+    # the rows are changed behind the app's back, as another worker would
+    headers = login("student@x.io")
+    other = login("student2@x.io")
+    principal_sync.run()
+    assert me(client, headers).json()["data"]["name"] == "student"
+    me(client, other)
+
+    db.query(User).filter(User.email == "student@x.io").update({"name": "Stu", "updated_at": datetime.now()})
+    db.query(User).filter(User.email == "student2@x.io").update({"is_active": False, "deleted_at": datetime.now()})
+    db.commit()
+    # still cached
+    assert me(client, headers).json()["data"]["name"] == "student"
+    assert me(client, other).status_code == 200
+
+    assert principal_sync.run() == 2
+    assert me(client, headers).json()["data"]["name"] == "Stu"
+    assert me(client, other).status_code == 401
+    assert principal_sync.run() == 2  # the overlap reads them again
+    principal_sync.watermark = datetime.now().replace(year = 2100)
+    assert principal_sync.run() == 0
+
+def test_a_principal_loaded_before_an_invalidation_is_not_stored():
+    cache = PrincipalCache(maxsize = 10, ttl = 60)
+    principal = Principal(id = 1, name = "a", email = "a@x.io", role_id = 3, role_name = "Student", is_active = True)
+
+    generation = cache.generation(1)
+    cache.invalidate_user(1)
+    cache.put(1, "token", principal, generation)
+    assert cache.get(1, "token") is None
+
+    cache.put(1, "token", principal, cache.generation(1))
+    assert cache.get(1, "token") == principal
+
+def test_generations_are_forgotten_after_a_ttl():
+    cache = PrincipalCache(maxsize = 10, ttl = 0.05)
+    for user_id in range(100):
+        cache.invalidate_user(user_id)
+    old = cache.generation(5)
+    time.sleep(0.1)
+    cache.invalidate_user(1000)
+    assert list(cache._generations) == [1000]
+
+    # a load that read a forgotten generation still finds it changed
+    principal = Principal(id = 5, name = "a", email = "a@x.io", role_id = 3, role_name = "Student", is_active = True)
+    cache.put(5, "token", principal, old)
+    assert cache.get(5, "token") is None
@@ -0,0 +1,76 @@
+from app.main import app
+from app.core.catalog_cache import catalog_cache
+from app.core.principal_cache import principal_cache
+from app.core.query_budget import QueryBudget, ROUTE_BUDGETS, unbudgeted_routes
+from app.core.token_versions import token_versions
+
+def test_every_route_has_a_budget():
+    assert unbudgeted_routes(app) == []
+
+def test_routes_stay_within_their_budgets(client, login, create_book):
+    # every route once, each request with the caches cold as the budgets
+    # assume, and counted whatever --query-budget says
+    book = create_book("Dune", "9780441013593", stock = 5)
+    other = create_book("Emma", "9780141439587", stock = 5)
+    admin = login()
+    student = login("student@x.io")
+    refresh_token = client.post("/auth/login", data = {"username": "student2@x.io", "password": "pw"}).json()["refresh_token"]
+    due = "2030-01-01"
+    csv = b"name,isbn,stock\nDune,9780441013593,5\nHamlet,9780743477123,2\n"
+
+    def call(method, route, url, headers = None, **kwargs):
+        catalog_cache.clear()
+        principal_cache.clear()
+        token_versions.clear()
+        with QueryBudget(ROUTE_BUDGETS[(method, route)], name = f"{method} {route}", mode = "raise", all_threads = True):
+            response = client.request(method, url, headers = headers, **kwargs)
+        assert response.status_code < 400, (method, url, response.text)
+        exercised.add((method, route))
+        return response
+
+    exercised = set()
+    call("GET", "/", "/")
+    call("GET", "/health", "/health")
+    call("GET", "/metrics", "/metrics")
+
+    call("POST", "/auth/login", "/auth/login", data = {"username": "student@x.io", "password": "pw"})
+    call("GET", "/auth/me", "/auth/me", student)
+    refresh_token = call("POST", "/auth/refresh", "/auth/refresh", json = {"refresh_token": refresh_token}).json()["data"]["refresh_token"]
+
+    call("POST", "/books/", "/books/", admin, json = {"name": "Ulysses", "isbn": "9780199535675", "stock": 1})
+    call("POST", "/books/import", "/books/import", admin, files = {"file": ("books.csv", csv)})
+    call("GET", "/books/", "/books/", params = {"search": "dune"})
+    call("GET", "/books/{book_id}", f"/books/{book['id']}", params = {"bookid": book["id"]})
+    call("PUT", "/books/{book_id}", f"/books/{book['id']}", admin, params = {"bookid": book["id"]},
+         json = {"name": "Dune Messiah", "stock": 6})
+
+    loan = call("POST", "/loans/borrow", "/loans/borrow", student, json = {"book_id": book["id"], "due_date": due}).json()["data"]
+    call("POST", "/loansreturn/{loan_id}", f"/loansreturn/{loan['id']}", student)
+    loans = call("POST", "/loans/borrow/batch", "/loans/borrow/batch", student,
+                 json = {"book_ids": [book["id"], other["id"]], "due_date": due}).json()["data"]
+    call("POST", "/loans/return/batch", "/loans/return/batch", student, json = {"loan_ids": [item["loan"]["id"] for item in loans]})
+    call("GET", "/loans/me", "/loans/me", student)
+    call("GET", "/loans/history", "/loans/history", student)
+    call("GET", "/loans/user/{user_id}", f"/loans/user/{loan['user_id']}", admin)
+    call("GET", "/loans/overdue", "/loans/overdue", admin)
+
+    call("GET", "/stats/summary", "/stats/summary", admin)
+    call("GET", "/stats/daily", "/stats/daily", admin)
+    call("GET", "/stats/books/top", "/stats/books/top", admin)
+    call("GET", "/stats/books/{book_id}", f"/stats/books/{book['id']}", admin)
+
+    call("GET", "/users/audit-logs", "/users/audit-logs", admin)
+    call("GET", "/users/audit-logs/export", "/users/audit-logs/export", admin)
+    call("GET", "/users/me", "/users/me", student)
+    call("PUT", "/users/me", "/users/me", student, json = {"name": "Stu"})
+    created = call("POST", "/users/", "/users/", admin,
+                   json = {"name": "new", "email": "new@x.io", "password": "pw", "role_id": 3}).json()["data"]
+    call("GET", "/users/", "/users/", admin)
+    call("GET", "/users/{userid}", f"/users/{created['id']}", admin)
+    call("PUT", "/users/{userid}", f"/users/{created['id']}", admin, json = {"name": "renamed"})
+    call("DELETE", "/users/{userid}", f"/users/{created['id']}", admin)
+    call("POST", "/auth/logout", "/auth/logout", login("student2@x.io"), json = {"refresh_token": refresh_token})
+    call("DELETE", "/users/me", "/users/me", login("student2@x.io"))
+    call("DELETE", "/books/{book_id}", f"/books/{other['id']}", admin, params = {"bookid": other["id"]})
+
+    assert exercised == set(ROUTE_BUDGETS)
@@ -0,0 +1,72 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from jose import jwt
+from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
+from slowapi.middleware import SlowAPIMiddleware
+import pytest
+
+import app.core.rate_limiter as rate_limiter
+from app.core.rate_limiter import catalog_quota, rate_limit_key
+from app.main import app as main_app
+from app.utils.security import create_access_token
+
+def token(user_id: int, role: str):
+    return create_access_token({"sub": str(user_id), "role": role, "ver": 0})
+
+def request(authorization: str | None = None, address: str = "10.0.0.1"):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "method": "GET", "path": "/books/", "headers": headers, "client": (address, 1234)})
+
+@pytest.mark.parametrize("authorization, key", [
+    (None, "ip:10.0.0.1"),
+    (f"Bearer {token(7, 'Student')}", "user:7:Student"),
+    (f"bearer {token(8, 'Admin')}", "user:8:Admin"),
+    ("Bearer not-a-token", "ip:10.0.0.1"),
+    # signed with another key: it may not pick its own bucket
+    ("Bearer " + jwt.encode({"sub": "1", "role": "Admin"}, "other secret", algorithm = "HS256"), "ip:10.0.0.1"),
+    (f"Basic {token(7, 'Student')}", "ip:10.0.0.1"),
+])
+def test_rate_limit_key(authorization, key):
+    assert rate_limit_key(request(authorization)) == key
+
+def test_the_key_is_worked_out_once_per_request():
+    scoped = request(f"Bearer {token(7, 'Student')}")
+    rate_limit_key(scoped)
+    scoped.scope["headers"] = []
+    assert rate_limit_key(scoped) == "user:7:Student"
+
+def test_catalog_quota_by_role(monkeypatch):
+    monkeypatch.setitem(rate_limiter.CATALOG_QUOTAS, "Student", "5/minute")
+    monkeypatch.setattr(rate_limiter, "CATALOG_ANONYMOUS_QUOTA", "1/minute")
+    assert catalog_quota("user:7:Student") == "5/minute"
+    assert catalog_quota("user:7:Unknown") == "1/minute"
+    assert catalog_quota("ip:10.0.0.1") == "1/minute"
+
+def test_each_identity_gets_its_own_bucket(monkeypatch):
+    monkeypatch.setitem(rate_limiter.CATALOG_QUOTAS, "Student", "3/minute")
+    monkeypatch.setitem(rate_limiter.CATALOG_QUOTAS, "Admin", "3/minute")
+    monkeypatch.setattr(rate_limiter, "CATALOG_ANONYMOUS_QUOTA", "1/minute")
+    limiter = Limiter(key_func = rate_limit_key, storage_uri = "memory://")
+    app = FastAPI(exception_handlers = {RateLimitExceeded: main_app.exception_handlers[RateLimitExceeded]})
+    app.state.limiter = limiter
+    app.add_middleware(SlowAPIMiddleware)
+
+    @app.get("/books/")
+    @limiter.limit(catalog_quota)
+    async def books(request: Request):
+        return {}
+
+    def statuses(headers, count):
+        return [client.get("/books/", headers = headers).status_code for _ in range(count)]
+
+    with TestClient(app) as client:
+        first = {"Authorization": f"Bearer {token(1, 'Student')}"}
+        second = {"Authorization": f"Bearer {token(2, 'Student')}"}
+        assert statuses(first, 4) == [200, 200, 200, 429]
+        # another student, and the same student with a new token
+        assert statuses(second, 3) == [200, 200, 200]
+        assert statuses({"Authorization": f"Bearer {token(1, 'Student')}"}, 1) == [429]
+        # a bad token counts against the address, not a user
+        assert statuses({"Authorization": "Bearer nope"}, 2) == [200, 429]
+        assert statuses({}, 1) == [429]
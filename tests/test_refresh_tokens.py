@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from app.core.token_purge import purge_refresh_tokens
+from app.models.audit_log import AuditLog
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.utils.security import hash_refresh_token
+
+def start_session(client, email = "student@x.io"):
+    response = client.post("/auth/login", data = {"username": email, "password": "pw"})
+    return response.json()["refresh_token"]
+
+def refresh(client, token):
+    return client.post("/auth/refresh", json = {"refresh_token": token})
+
+def test_only_the_hash_of_a_refresh_token_is_stored(client, db):
+    token = start_session(client)
+    stored = db.query(RefreshToken.token_hash).scalar()
+    assert stored == hash_refresh_token(token) and stored != token
+
+def test_rotation_hands_out_a_new_token_once(client):
+    token = start_session(client)
+    rotated = refresh(client, token)
+    assert rotated.status_code == 200
+    assert refresh(client, rotated.json()["data"]["refresh_token"]).status_code == 200
+    assert refresh(client, "not a token").status_code == 401
+
+def test_replaying_a_rotated_token_revokes_its_session_only(client, db):
+    token = start_session(client)
+    other_session = start_session(client)
+    current = refresh(client, token).json()["data"]["refresh_token"]
+
+    assert refresh(client, token).status_code == 401
+    # whoever holds the newest token of the session is logged out too
+    assert refresh(client, current).status_code == 401
+    assert refresh(client, other_session).status_code == 200
+
+    assert db.query(AuditLog).filter(AuditLog.action == "TOKEN_REVOKED").count() == 1
+    family = db.query(RefreshToken.family_id).filter(RefreshToken.token_hash == hash_refresh_token(token)).scalar()
+    assert all(revoked_at is not None for revoked_at, in
+               db.query(RefreshToken.revoked_at).filter(RefreshToken.family_id == family))
+
+def test_purge_keeps_what_reuse_detection_and_the_denylist_still_need(client, db):
+    now = datetime.now()
+    user_id = db.query(User.id).filter(User.email == "student@x.io").scalar()
+    tokens = {
+        "expired": dict(expires_at = now - timedelta(seconds = 1)),
+        "revoked long ago": dict(expires_at = now + timedelta(days = 1), is_revoked = True, revoked_at = now - timedelta(days = 1)),
+        "revoked just now": dict(expires_at = now + timedelta(days = 1), is_revoked = True, revoked_at = now),
+        "rotated": dict(expires_at = now + timedelta(days = 1), is_revoked = True),
+        "live": dict(expires_at = now + timedelta(days = 1)),
+    }
+    db.add_all([RefreshToken(user_id = user_id, token_hash = hash_refresh_token(name), **fields)
+                for name, fields in tokens.items()])
+    db.add_all([RefreshToken(user_id = user_id, token_hash = hash_refresh_token(f"expired {i}"), expires_at = now - timedelta(days = 1))
+                for i in range(4)])
+    db.commit()
+
+    assert purge_refresh_tokens(db, batch_size = 2, now = now) == 6
+    left = {token_hash for token_hash, in db.query(RefreshToken.token_hash)}
+    assert left == {hash_refresh_token(name) for name in ("revoked just now", "rotated", "live")}
+    assert purge_refresh_tokens(db, batch_size = 2, now = now) == 0
@@ -0,0 +1,70 @@
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+import app.core.dependencies as dependencies
+from app.core.dependencies import require_roles_async
+from app.core.roles import Roles
+from app.core.token_versions import TokenVersionCache, token_versions
+from app.main import app as main_app
+from app.utils.security import create_access_token
+
+@pytest.fixture
+def claims_client(client, monkeypatch):
+    # ROLE_CLAIMS_MODE is read when the route dependencies are built, the
+    # app's own routers were built before the test could set it
+    monkeypatch.setattr(dependencies, "ROLE_CLAIMS_MODE", True)
+    app = FastAPI(exception_handlers = main_app.exception_handlers)
+
+    @app.get("/admin-only")
+    async def admin_only(claims = Depends(require_roles_async(Roles.ADMIN, Roles.LIBRARIAN))):
+        return {"id": claims.id, "role": claims.role_name}
+
+    with TestClient(app) as claims_client:
+        yield claims_client
+
+def test_roles_come_from_the_token(claims_client, login, query_budget):
+    admin = login()
+    librarian = login("librarian@x.io")
+    student = login("student@x.io")
+    token_versions.clear()
+
+    # the version is read once per user, then the check needs no query
+    assert claims_client.get("/admin-only", headers = admin).json()["role"] == "Admin"
+    claims_client.get("/admin-only", headers = librarian)
+    claims_client.get("/admin-only", headers = student)
+    with query_budget(0):
+        assert claims_client.get("/admin-only", headers = admin).status_code == 200
+        assert claims_client.get("/admin-only", headers = librarian).status_code == 200
+        response = claims_client.get("/admin-only", headers = student)
+    assert response.status_code == 403
+
+def test_tokens_of_a_deleted_user_are_refused(client, claims_client, login):
+    librarian = login("librarian@x.io")
+    user_id = claims_client.get("/admin-only", headers = librarian).json()["id"]
+
+    client.delete(f"/users/{user_id}", headers = login())
+    assert claims_client.get("/admin-only", headers = librarian).status_code == 401
+
+def test_tokens_without_role_claims_are_refused(claims_client, login):
+    user_id = claims_client.get("/admin-only", headers = login()).json()["id"]
+    legacy = create_access_token({"sub": str(user_id)})
+    assert claims_client.get("/admin-only", headers = {"Authorization": f"Bearer {legacy}"}).status_code == 401
+
+def test_token_version_cache_is_a_bounded_lru():
+    cache = TokenVersionCache(maxsize = 2, ttl = 60)
+    cache.put(1, 0)
+    cache.put(2, 0)
+    cache.get(1)
+    cache.put(3, 0)
+    assert (cache.get(1), cache.get(2), cache.get(3)) == (0, None, 0)
+
+def test_token_versions_expire():
+    cache = TokenVersionCache(maxsize = 2, ttl = 0.05)
+    cache.put(1, 4)
+    assert cache.get(1) == 4
+    time.sleep(0.1)
+    assert cache.get(1) is None
+    assert not cache._versions
@@ -0,0 +1,55 @@
+import pytest
+
+from app.core.search import book_tokens, query_words
+
+def search(client, text, **params):
+    response = client.get("/books/", params = {"search": text, **params})
+    assert response.status_code == 200, response.text
+    return [book["name"] for book in response.json()["data"]]
+
+@pytest.mark.parametrize("text, words", [
+    ("978-0-441-01359-3", ["9780441013593"]),
+    ("0 441 01359 X", ["044101359x"]),
+    ("Dune  MESSIAH dune", ["dune", "messiah"]),
+    ("a dune", ["dune"]),
+])
+def test_query_words(text, words):
+    assert query_words(text) == words
+
+def test_book_tokens_weights():
+    tokens = book_tokens("Oceanography", "978-0-13")
+    assert tokens["w:oceanography"] > tokens["p:ocean"] > tokens["t:phy"]
+    assert "w:978013" in tokens and "t:801" in tokens
+
+def test_whole_words_rank_above_prefixes_and_infixes(client, create_book):
+    create_book("Oceanography", "9780000000011")
+    create_book("Graphs", "9780000000028")
+    create_book("Graphy", "9780000000035")
+
+    assert search(client, "graphy") == ["Graphy", "Oceanography"]
+    assert search(client, "graph") == ["Graphs", "Graphy", "Oceanography"]
+
+def test_infix_needs_the_whole_word_in_the_title(client, create_book):
+    # every trigram of "graphy" is in the tokens of "Graph Physics", in two words
+    create_book("Graph Physics", "9780000000042")
+    create_book("Oceanography", "9780000000011")
+
+    assert search(client, "graphy") == ["Oceanography"]
+    assert search(client, "ocean graphy") == ["Oceanography"]
+    assert search(client, "phys") == ["Graph Physics"]
+
+def test_isbn_search_ignores_separators(client, create_book):
+    create_book("Dune", "978-0-441-01359-3")
+    create_book("Emma", "9780141439587")
+
+    assert search(client, "9780441013593") == ["Dune"]
+    assert search(client, "978 0441 013593") == ["Dune"]
+    assert search(client, "0441013") == ["Dune"]
+    assert search(client, "978") == ["Dune", "Emma"]
+
+def test_search_follows_renames(client, login, create_book):
+    book = create_book("Oceanography", "9780000000011")
+    client.put(f"/books/{book['id']}", params = {"bookid": book["id"]}, json = {"name": "Geology"}, headers = login())
+
+    assert search(client, "graphy") == []
+    assert search(client, "olog") == ["Geology"]
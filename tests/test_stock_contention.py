@@ -0,0 +1,55 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from app.models.book import Book
+from app.models.loan import Loan
+from app.models.user import User
+from app.utils.security import create_access_token
+
+# benchmarks/stress_loans.py at test size: every student races ATTEMPTS
+# borrows of the same title for STOCK copies, then returns its loan twice
+STUDENTS = 12
+ATTEMPTS = 3
+STOCK = 4
+
+def test_racing_borrows_and_returns_keep_stock_consistent(client, db, create_book, _password_hash):
+    book_id = create_book("Dune", "9780441013593", stock = STOCK)["id"]
+    students = [User(name = f"s{i}", email = f"s{i}@x.io", password_hash = _password_hash, role_id = 3) for i in range(STUDENTS)]
+    db.add_all(students)
+    db.commit()
+    # tokens are minted here instead of logging in through bcrypt per student
+    headers = {
+        user.id: {"Authorization": "Bearer " + create_access_token({"sub": str(user.id), "role": "Student", "ver": 0})}
+        for user in students
+    }
+
+    def borrow(user_id):
+        response = client.post("/loans/borrow", json = {"book_id": book_id, "due_date": "2030-01-01"}, headers = headers[user_id])
+        return user_id, response.status_code, response.json()
+
+    with ThreadPoolExecutor(16) as pool:
+        borrows = list(pool.map(borrow, [user_id for user_id in headers for _ in range(ATTEMPTS)]))
+
+    assert all(status < 500 for _, status, _ in borrows)
+    granted = [(user_id, body["data"]["id"]) for user_id, status, body in borrows if status == 200]
+    assert 0 < len(granted) <= STOCK
+    assert len({user_id for user_id, _ in granted}) == len(granted)
+
+    active = db.query(Loan.user_id).filter(Loan.book_id == book_id, Loan.is_active == True).all()
+    assert len(active) == len(granted)
+    assert max(Counter(user_id for user_id, in active).values()) == 1
+    assert db.query(Book.stock).filter(Book.id == book_id).scalar() == STOCK - len(granted)
+
+    def give_back(job):
+        user_id, loan_id = job
+        return client.post(f"/loansreturn/{loan_id}", headers = headers[user_id]).status_code
+
+    with ThreadPoolExecutor(16) as pool:
+        returns = Counter(pool.map(give_back, granted * 2))
+
+    assert returns[200] == len(granted) and not any(status >= 500 for status in returns)
+    db.expire_all()
+    assert db.query(func.count(Loan.id)).filter(Loan.book_id == book_id, Loan.is_active == True).scalar() == 0
+    assert db.query(Book.stock).filter(Book.id == book_id).scalar() == STOCK
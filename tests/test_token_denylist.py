@@ -0,0 +1,43 @@
+import time
+
+from app.core.token_denylist import DenylistSync, TokenDenylist, token_denylist
+
+def login(client, email = "student@x.io"):
+    tokens = client.post("/auth/login", data = {"username": email, "password": "pw"}).json()
+    return {"Authorization": f"Bearer {tokens['access_token']}"}, tokens["refresh_token"]
+
+def me(client, headers):
+    return client.get("/users/me", headers = headers).status_code
+
+def test_logout_denies_the_access_token_of_that_session(client):
+    headers, refresh_token = login(client)
+    other_headers, _ = login(client)
+    assert me(client, headers) == 200
+
+    assert client.post("/auth/logout", json = {"refresh_token": refresh_token}, headers = headers).status_code == 200
+    assert me(client, headers) == 401
+    assert client.post("/auth/refresh", json = {"refresh_token": refresh_token}).status_code == 401
+    # the user's other session is untouched
+    assert me(client, other_headers) == 200
+
+def test_a_logout_on_another_worker_arrives_with_the_sync(client):
+    headers, refresh_token = login(client)
+    client.post("/auth/logout", json = {"refresh_token": refresh_token}, headers = headers)
+    # as if the logout had been served by another worker: only the database knows
+    token_denylist.clear()
+    assert me(client, headers) == 200
+
+    # a fresh worker looks back one access token lifetime
+    assert DenylistSync().run() == 1
+    assert me(client, headers) == 401
+
+def test_denylist_keeps_only_live_tokens():
+    denylist = TokenDenylist(capacity = 4, error_rate = 0.01, sweep_interval = 3600)
+    now = time.time()
+    denylist.add("expired", now - 1)
+    denylist.add_many([(f"live-{i}", now + 60) for i in range(10)])
+
+    assert not denylist.is_denied("expired") and not denylist.is_denied("never") and not denylist.is_denied(None)
+    # past its capacity the filter was rebuilt larger, nothing was lost
+    assert all(denylist.is_denied(f"live-{i}") for i in range(10))
+    assert denylist.stats()["size"] == 10 and denylist.capacity >= 10